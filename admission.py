@@ -0,0 +1,161 @@
+"""
+Admission control for webhook updates
+Checked before any matching, rendering or sending, so a flood costs only
+the JSON decode. An update is shed when:
+
+- its sender has used up their flood allowance (a token bucket per user),
+- its chat has used up its allowance (a token bucket per chat), or
+- outbound sends are backed up (too many waiting or in flight, or they
+  have recently taken too long) and the update is low priority: anything
+  but a private message or a /command.
+
+Shed updates are still answered 200, so Telegram doesn't redeliver them,
+and counted in bert_admission_shed_total by reason.
+"""
+
+import os
+import threading
+import time
+
+from metrics import ADMISSION_SHED
+from rate_limiter import TokenBucket
+
+
+class LoadGauge:
+    """Outbound sends waiting or in flight, and how long sends are taking"""
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.depth = 0
+        self.latency = 0.0
+        self._started_total = 0.0
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.depth = 0
+        self._started_total = 0.0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        """Count a send in; returns its start time for leave()"""
+        started = time.perf_counter()
+        with self._lock:
+            self.depth += 1
+            self._started_total += started
+        return started
+
+    def leave(self, started):
+        """Count a send out, folding its time (queueing included) into the moving average"""
+        took = time.perf_counter() - started
+        with self._lock:
+            self.depth -= 1
+            self._started_total -= started
+            self.latency += self.smoothing * (took - self.latency)
+
+    def reading(self):
+        """(depth, seconds): the moving average, or the pending sends' mean age if longer"""
+        with self._lock:
+            depth, started_total = self.depth, self._started_total
+        if not depth:
+            return 0, self.latency
+        # Sends stuck behind a flood limit raise this long before they finish
+        waiting = time.perf_counter() - started_total / depth
+        return depth, max(self.latency, waiting)
+
+
+def update_origin(update):
+    """(chat id, user id, high priority) for an update; ids are None when it has none"""
+    for key, value in update.items():
+        if key != 'update_id' and isinstance(value, dict):
+            break
+    else:
+        return None, None, False
+    # callback_query and the like carry the chat on the message they refer to
+    chat = value.get('chat') or (value.get('message') or {}).get('chat') or {}
+    user = value.get('from') or {}
+    text = value.get('text') or ''
+    high = key == 'message' and (chat.get('type') == 'private' or text.startswith('/'))
+    return chat.get('id'), user.get('id'), high
+
+
+class AdmissionControl:
+    """Per-user and per-chat flood thresholds plus load shedding; thread-safe"""
+
+    def __init__(self, user_rate=1.0, user_burst=5, chat_rate=1.0, chat_burst=5,
+                 max_backlog=64, max_latency=1.0, load=None, max_keys=10000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_backlog = max_backlog
+        self.max_latency = max_latency
+        # Callable returning (sends waiting or in flight, their average seconds)
+        self.load = load
+        self.max_keys = max_keys
+        self._users = {}
+        self._chats = {}
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def _conforms(self, buckets, key, rate, burst, now):
+        """Take a token from key's bucket if one is free; False (nothing taken) if not"""
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self.max_keys:
+                # Buckets that have refilled are no different from new ones
+                for idle in [k for k, b in buckets.items() if b.idle(now)]:
+                    del buckets[idle]
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        if bucket.earliest(now) > now:
+            return False
+        bucket.take(now)
+        return True
+
+    def overloaded(self):
+        """True while outbound sends are backed up past the limits"""
+        if self.load is None:
+            return False
+        depth, latency = self.load()
+        if self.max_backlog and depth > self.max_backlog:
+            return True
+        # With nothing pending there is no backlog, however slow the last sends were
+        return bool(self.max_latency and depth and latency > self.max_latency)
+
+    def check(self, update):
+        """None to admit the update, or why it is shed ('user_flood', 'chat_flood', 'overload')"""
+        if not isinstance(update, dict):
+            return None
+        chat_id, user_id, high = update_origin(update)
+        reason = None
+        now = time.monotonic()
+        with self._lock:
+            if user_id is not None and self.user_rate > 0 and not self._conforms(
+                    self._users, user_id, self.user_rate, self.user_burst, now):
+                reason = 'user_flood'
+            elif chat_id is not None and self.chat_rate > 0 and not self._conforms(
+                    self._chats, chat_id, self.chat_rate, self.chat_burst, now):
+                reason = 'chat_flood'
+        if reason is None and not high and self.overloaded():
+            reason = 'overload'
+        if reason is not None:
+            ADMISSION_SHED.labels(reason).inc()
+        return reason
+
+
+def open_admission(load=None, setting=os.environ.get):
+    """AdmissionControl from the ADMIT_* settings; setting(name, default) looks them up"""
+    return AdmissionControl(
+        user_rate=float(setting('ADMIT_USER_PER_SEC', 1)),
+        user_burst=int(setting('ADMIT_USER_BURST', 5)),
+        chat_rate=float(setting('ADMIT_CHAT_PER_SEC', 1)),
+        chat_burst=int(setting('ADMIT_CHAT_BURST', 5)),
+        max_backlog=int(setting('ADMIT_MAX_BACKLOG', 64)),
+        max_latency=float(setting('ADMIT_MAX_LATENCY', 1)),
+        load=load,
+    )
@@ -0,0 +1,75 @@
+"""
+Aho-Corasick multi-keyword automaton
+Finds every occurrence of any number of keywords in one left-to-right pass
+over the text, so the per-message cost depends on the message length and
+not on how many keywords there are.
+"""
+
+
+class AhoCorasick:
+    """Keyword automaton built once from (keyword, value) pairs"""
+
+    def __init__(self, items):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self.size = 0
+
+        for keyword, value in items:
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += ((len(keyword), value),)
+            self.size += 1
+
+        self._link()
+
+    def _link(self):
+        """Breadth-first pass that sets failure links and merges outputs"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = link
+                self._out[nxt] += self._out[link]
+
+    def finditer(self, text):
+        """Yield (start, end, value) for every keyword occurrence"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, ch in enumerate(text, 1):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            for length, value in out[state]:
+                yield end - length, end, value
+
+    def values_in(self, text):
+        """Set of values whose keywords occur anywhere in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                found.update(value for _, value in out[state])
+        return found
@@ -0,0 +1,218 @@
+"""
+ASGI entry point for the Chicken Bert webhook
+Serves the same /, /metrics and /webhook routes as app.py, with the same
+status codes, bodies and content types, but outbound sends are awaited on
+the event loop through AsyncTelegramSender's shared connection pool. A slow
+Bot API call parks a coroutine instead of a whole sync worker, so one
+process can hold thousands of in-flight sends.
+
+    uvicorn app_asgi:app --host 0.0.0.0 --port 8080
+    gunicorn app_asgi:app -k uvicorn.workers.UvicornWorker
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+
+from admission import open_admission
+from app import (
+    CHAT_STATE, COALESCE_WINDOW, DEDUPER, INDEX_TEXT, PERSONAS, REPLY_IN_WEBHOOK, TOKEN,
+    rate_limiter, reply_text,
+)
+from async_sender import AsyncTelegramSender
+from coalescer import GROUP_CHAT_TYPES, AsyncReplyCoalescer
+from metrics import CONTENT_TYPE, REGISTRY, UPDATES_SKIPPED, WEBHOOK_SECONDS
+from sender import API_BASE, message_payloads
+from log_pipeline import log_scope
+from tracing import trace
+from update_filter import MAX_UPDATE_BYTES, SECRET_HEADER
+from webhook import RESPONSES, accept_update
+
+logger = logging.getLogger(__name__)
+
+# Content types Flask gives the same responses
+HTML = 'text/html; charset=utf-8'
+JSON = 'application/json'
+
+sender = AsyncTelegramSender(
+    TOKEN,
+    api_base=os.environ.get('TELEGRAM_API_BASE', API_BASE),
+    pool_size=int(os.environ.get('SEND_POOL_SIZE', 100)),
+    timeout=float(os.environ.get('SEND_TIMEOUT', 5)),
+    limiter=rate_limiter,
+)
+
+# Shed by how backed up this sender is, not app.py's (unused here) one
+ADMISSION = open_admission(sender.load.reading)
+
+# personas.json is looked at by a background task instead of on access, so
+# neither the stat nor a reload runs on the event loop
+PERSONA_CHECK_INTERVAL = PERSONAS.check_interval
+PERSONAS.check_interval = 0
+
+# Replies that can block on SQLite (CHAT_STATE_DB) are worked out on the
+# default executor instead of the event loop
+BLOCKING_REPLIES = CHAT_STATE.backing is not None
+
+# The task running watch_personas, while the app is up
+persona_watcher = None
+
+
+async def watch_personas():
+    """Check personas.json every PERSONA_CHECK_INTERVAL seconds on the default executor"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(PERSONA_CHECK_INTERVAL)
+        await loop.run_in_executor(None, PERSONAS.check)
+
+
+async def deliver_coalesced(chat_id, text):
+    await sender.send_payloads(chat_id, message_payloads(chat_id, text), retry_count=2)
+
+
+coalescer = AsyncReplyCoalescer(deliver_coalesced, window=COALESCE_WINDOW) if COALESCE_WINDOW > 0 else None
+
+
+def _is_json(headers):
+    """Same test as Flask's request.is_json"""
+    mimetype = headers.get(b'content-type', b'').split(b';')[0].strip().lower()
+    return mimetype == b'application/json' or (
+        mimetype.startswith(b'application/') and mimetype.endswith(b'+json'))
+
+
+def _jsonify(**kwargs):
+    """Byte-for-byte what flask.jsonify produces outside debug mode"""
+    return json.dumps(kwargs, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n'
+
+
+async def index(headers, body):
+    return 200, HTML, INDEX_TEXT
+
+
+async def metrics(headers, body):
+    return 200, CONTENT_TYPE, REGISTRY.render()
+
+
+async def webhook(headers, body):
+    with WEBHOOK_SECONDS.time(), trace('app_asgi.webhook'), log_scope():
+        try:
+            data, outcome = accept_update(
+                headers.get(SECRET_HEADER.lower().encode(), b'').decode('latin-1'), _is_json(headers),
+                lambda: body, DEDUPER, ADMISSION)
+            if outcome:
+                text, status = RESPONSES[outcome]
+                return status, HTML, text
+            if BLOCKING_REPLIES:
+                # The copied context carries the trace and log fields into the worker thread
+                reply, error = await asyncio.get_running_loop().run_in_executor(
+                    None, contextvars.copy_context().run, reply_text, data)
+            else:
+                reply, error = reply_text(data)
+            if error:
+                return error[1], HTML, error[0]
+            chat, text = reply
+
+            # Busy groups get one merged message per window; Telegram only needs the 200
+            if coalescer is not None and chat.get('type') in GROUP_CHAT_TYPES:
+                coalescer.add(chat['id'], text)
+                return 200, HTML, 'OK'
+
+            payloads = message_payloads(chat['id'], text)
+
+            # One method call can ride back on the webhook response itself, if
+            # the flood limits let it go now; otherwise it is paced as usual
+            if REPLY_IN_WEBHOOK and len(payloads) == 1 and sender.reserve_inline(chat['id']):
+                return 200, JSON, _jsonify(method='sendMessage', **payloads[0])
+
+            # Send response with retry
+            if await sender.send_payloads(payloads[0]['chat_id'], payloads, retry_count=2):
+                return 200, HTML, 'OK'
+            else:
+                return 500, HTML, 'Failed to send message'
+
+        except Exception as e:
+            logger.error(f"Error in webhook: {e}")
+            return 500, HTML, 'Error processing message'
+
+
+ROUTES = {
+    '/': (('GET', 'HEAD'), index),
+    '/metrics': (('GET', 'HEAD'), metrics),
+    '/webhook': (('POST',), webhook),
+}
+
+
+async def _read_body(receive, limit):
+    """The request body, or None as soon as it runs over limit bytes"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, content_type, text, head=False, extra_headers=()):
+    body = text.encode('utf-8')
+    headers = [(b'content-type', content_type.encode()),
+               (b'content-length', str(len(body)).encode())]
+    headers.extend(extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+async def _lifespan(receive, send):
+    global persona_watcher
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if PERSONA_CHECK_INTERVAL > 0:
+                persona_watcher = asyncio.create_task(watch_personas())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if persona_watcher is not None:
+                persona_watcher.cancel()
+                persona_watcher = None
+            if coalescer is not None:
+                await coalescer.aclose()
+            await sender.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        return await _respond(send, 404, HTML, 'Not Found')
+    methods, handler = route
+    method = scope['method']
+    if method not in methods:
+        allow = ', '.join(sorted(set(methods) | {'OPTIONS'}))
+        status = 200 if method == 'OPTIONS' else 405
+        return await _respond(send, status, HTML, '' if status == 200 else 'Method Not Allowed',
+                              extra_headers=[(b'allow', allow.encode())])
+
+    headers = dict(scope['headers'])
+    # As Flask's MAX_CONTENT_LENGTH: refused before (or while) it is read
+    length = headers.get(b'content-length', b'')
+    body = None if length.isdigit() and int(length) > MAX_UPDATE_BYTES else (
+        await _read_body(receive, MAX_UPDATE_BYTES))
+    if body is None:
+        UPDATES_SKIPPED.labels('too_large').inc()
+        text, status = RESPONSES['too_large']
+        return await _respond(send, status, HTML, text)
+    status, content_type, text = await handler(headers, body)
+    await _respond(send, status, content_type, text, head=method == 'HEAD')
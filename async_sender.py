@@ -0,0 +1,163 @@
+"""
+Asyncio Telegram Bot API sender
+The asyncio counterpart of sender.TelegramSender for app_asgi: one shared
+aiohttp connection pool for the whole process, sends to different chats
+overlap freely and sends to the same chat go out in arrival order. An
+in-flight send is a suspended coroutine, not a parked thread, so thousands
+of them fit in one worker; sends beyond the pool size queue inside the
+connector until a keep-alive connection frees up.
+"""
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from admission import LoadGauge
+from metrics import SEND_FAILURES, SEND_QUEUE_WAIT_SECONDS, SEND_SECONDS
+from rate_limiter import SendRetries, retry_after_from
+from sender import API_BASE, message_payloads
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatLane:
+    """asyncio.Lock (which wakes waiters in FIFO order) plus a user count"""
+
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class AsyncTelegramSender:
+    """Event-loop sender with a shared connection pool and per-chat ordering"""
+
+    def __init__(self, token, api_base=API_BASE, pool_size=100, timeout=5,
+                 limiter=None, max_throttle_retries=3):
+        self.token = token
+        self.api_base = api_base.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_throttle_retries = max_throttle_retries
+
+        # aiohttp sessions belong to an event loop, so this is opened on first use
+        self._session = None
+
+        # Lanes exist only while a chat has sends queued or in flight; the
+        # event loop is single-threaded so the dict needs no lock
+        self._lanes = {}
+
+        # How backed up sends are, for admission control
+        self.load = LoadGauge()
+
+    def method_url(self, method):
+        """Full Bot API URL for a method"""
+        return f"{self.api_base}/bot{self.token}/{method}"
+
+    def session(self):
+        """The shared ClientSession, opened on first use"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                # Like requests' timeout: connect and per-read, not time spent
+                # queued for a pooled connection
+                timeout=aiohttp.ClientTimeout(
+                    total=None, sock_connect=self.timeout, sock_read=self.timeout),
+            )
+        return self._session
+
+    async def call(self, method, payload, retry_count=1):
+        """
+        Call a Bot API method. Timeouts are retried up to retry_count times;
+        429s are retried after Telegram's retry_after, pausing only the
+        affected chat. Returns True on success.
+        """
+        url = self.method_url(method)
+        chat_id = payload.get('chat_id')
+        session = self.session()
+        latency = SEND_SECONDS.labels(method)
+        retries = SendRetries(self.limiter, chat_id, self.max_throttle_retries, retry_count)
+        while True:
+            if self.limiter is not None:
+                with span('rate_wait'):
+                    admitted = await self.limiter.acquire_async(chat_id, retries.max_delay)
+                if not admitted:
+                    logger.error(f"Rate limit backlog too long for chat {chat_id}, dropping message")
+                    SEND_FAILURES.inc()
+                    return False
+            started = time.perf_counter()
+            try:
+                # One span per attempt, so retries show up as repeated 'http' stages
+                with span('http', method=method, attempt=retries.attempt) as stage:
+                    async with session.post(url, json=payload) as response:
+                        status = response.status
+                        body = await response.read()
+                    stage.set(status=status)
+                latency.observe(time.perf_counter() - started)
+                if status == 429:
+                    wait = retries.after_throttle(retry_after_from(body))
+                    if wait is not None:
+                        await asyncio.sleep(wait)
+                        continue
+                if status >= 400:
+                    logger.error(f"Failed to send message: HTTP {status}")
+                    SEND_FAILURES.inc()
+                    return False
+                return True
+            except asyncio.TimeoutError:
+                latency.observe(time.perf_counter() - started)
+                if not retries.after_timeout():
+                    SEND_FAILURES.inc()
+                    return False
+            except Exception as e:
+                logger.error(f"Failed to send message: {e}")
+                SEND_FAILURES.inc()
+                return False
+
+    def reserve_inline(self, chat_id):
+        """Same as TelegramSender.reserve_inline"""
+        if chat_id in self._lanes:
+            return False
+        return self.limiter is None or self.limiter.try_acquire(chat_id)
+
+    async def send_message(self, chat_id, text, retry_count=1, parse_mode='HTML'):
+        """Send a text message, keeping per-chat order"""
+        return await self.send_payloads(
+            chat_id, message_payloads(chat_id, text, parse_mode), retry_count=retry_count
+        )
+
+    async def send_payloads(self, chat_id, payloads, retry_count=1):
+        """Send prepared sendMessage payloads to one chat, stopping at the first failure"""
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _ChatLane()
+        lane.users += 1
+        started = self.load.enter()
+        try:
+            with span('send', messages=len(payloads)):
+                with span('lane_wait'):
+                    await lane.lock.acquire()
+                try:
+                    SEND_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+                    for payload in payloads:
+                        if not await self.call('sendMessage', payload, retry_count=retry_count):
+                            return False
+                    return True
+                finally:
+                    lane.lock.release()
+        finally:
+            self.load.leave(started)
+            lane.users -= 1
+            if lane.users == 0:
+                del self._lanes[chat_id]
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
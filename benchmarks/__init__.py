@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Bert bots
+Run from the repository root, e.g. `python -m benchmarks.bench_matcher`.
+"""
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Spam wave benchmark for admission control
+Runs app.py under gunicorn against the fake Bot API with Telegram's real
+flood limits, then floods it: a few accounts spam one group at 50 updates
+a second over 40 connections (as many as Telegram opens) while ordinary
+users each send a private message a second. Runs once with admission
+control off and once on, and reports the ordinary users' webhook latency
+and timeouts, the spam shed and the sends made.
+
+    python -m benchmarks.bench_admission [--seconds 20] [--spam-rate 50] [--spam-threads 40]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.bench_webhook import bot_env, free_port, percentile, server_poster
+from fake_bot_api import FakeBotAPI
+
+# Admission control off: no flood thresholds, never overloaded
+DISABLED = {
+    'ADMIT_USER_PER_SEC': '0',
+    'ADMIT_CHAT_PER_SEC': '0',
+    'ADMIT_MAX_BACKLOG': '0',
+    'ADMIT_MAX_LATENCY': '0',
+}
+
+SPAM_CHAT = -1000000000001
+
+
+def message(update_id, chat, user_id, text):
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 1700000000, "chat": chat, "text": text,
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        },
+    })
+
+
+def timed_post(post, body):
+    """post() that counts a timed-out request as taking the full timeout"""
+    try:
+        return post(body)[0]
+    except requests.RequestException:
+        return None
+
+
+def spam(post, stop, spammers, first_id, interval, counts):
+    group = {"id": SPAM_CHAT, "type": "supergroup", "title": "raided coop"}
+    n = 0
+    while not stop.is_set():
+        n += 1
+        started = time.perf_counter()
+        timed_post(post, message(first_id + n, group, 900000 + n % spammers, "wen moon ser wen moon"))
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    counts.append(n)
+
+
+def ordinary(post, stop, users, first_id, latencies, failures):
+    """Users in turn, so each one sends about one private message a second"""
+    n = 0
+    while not stop.is_set():
+        n += 1
+        user_id = 100000 + n % users
+        chat = {"id": user_id, "type": "private", "first_name": f"user{user_id}"}
+        elapsed = timed_post(post, message(first_id + n, chat, user_id, "who is bert"))
+        if elapsed is None:
+            failures.append(n)
+            continue
+        latencies.append(elapsed * 1000)
+        time.sleep(max(0.0, 1.0 / users - elapsed))
+
+
+def shed_counts(port):
+    """bert_admission_shed_total by reason, from the server's /metrics"""
+    text = requests.get(f'http://127.0.0.1:{port}/metrics', timeout=60).text
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith('bert_admission_shed_total{'):
+            labels, value = line.rsplit(' ', 1)
+            counts[labels.split('"')[1]] = int(float(value))
+    return counts
+
+
+def run(label, env, args, fake_api):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}', '--workers', '1',
+               '--threads', str(args.threads), '--log-level', 'warning', 'app:app']
+    post, stop_server = server_poster(command, port, env)
+    fake_api.reset()
+    stop = threading.Event()
+    latencies, failures, spam_counts = [], [], []
+    interval = args.spam_threads / args.spam_rate
+    threads = [threading.Thread(target=ordinary, args=(post, stop, args.users, 1, latencies, failures))]
+    threads += [threading.Thread(target=spam, args=(post, stop, args.spammers, (i + 1) * 10_000_000,
+                                                    interval, spam_counts))
+                for i in range(args.spam_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    shed = shed_counts(port)
+    stop_server()
+    latencies.sort()
+    sends = fake_api.stats()['calls'].get('sendMessage', 0)
+    print(f"{label:<10} {len(latencies):>8} {len(failures):>8} {percentile(latencies, 50):>8.1f} "
+          f"{percentile(latencies, 99):>9.1f} {sum(spam_counts):>6} {sum(shed.values()):>6} {sends:>6}   {shed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--users', type=int, default=20, help='ordinary users, one message a second each')
+    parser.add_argument('--spammers', type=int, default=5, help='accounts spamming the group')
+    parser.add_argument('--spam-rate', type=float, default=50, help='spam updates a second, at most')
+    parser.add_argument('--spam-threads', type=int, default=40, help='concurrent spam connections (Telegram opens up to 40)')
+    parser.add_argument('--threads', type=int, default=16, help='gunicorn threads')
+    parser.add_argument('--api-latency', default='fixed:50')
+    args = parser.parse_args()
+
+    fake_api = FakeBotAPI(latency=args.api_latency).start()
+    try:
+        print(f"{'admission':<10} {'replies':>8} {'timeouts':>8} {'p50 ms':>8} {'p99 ms':>9} "
+              f"{'spam':>6} {'shed':>6} {'sends':>6}")
+        base = bot_env(fake_api.url, telegram_limits=True)
+        run('off', {**base, **DISABLED}, args, fake_api)
+        run('on', base, args, fake_api)
+    finally:
+        fake_api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-chat state memory benchmark
+Fills a ChatStateStore with synthetic chats, each drawing from a few phrase
+lists like real traffic, and reports resident memory per chat, the cost of
+a draw for a known and a new chat, and that a capacity cap keeps memory
+flat when more chats arrive than it holds. With --db it also times writing
+every record to SQLite and loading them back.
+
+    python -m benchmarks.bench_chat_state [--chats 1000000] [--categories 2] [--phrases 6]
+"""
+
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+
+from chat_state import ChatStateStore
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:')) / 1024
+
+
+def fill(store, chats, categories, phrases, first_chat=0):
+    """Seconds taken for every chat to draw once from each category"""
+    started = time.perf_counter()
+    for chat in range(first_chat, first_chat + chats):
+        for category in range(categories):
+            store.draw(chat, category, phrases)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chats', type=int, default=1_000_000)
+    parser.add_argument('--categories', type=int, default=2, help='phrase lists each chat draws from')
+    parser.add_argument('--phrases', type=int, default=6, help='phrases per list')
+    parser.add_argument('--db', action='store_true', help='also time the SQLite backing')
+    args = parser.parse_args()
+
+    gc.collect()
+    before = rss_mb()
+    store = ChatStateStore(capacity=args.chats, rng=random.Random(0))
+    seconds = fill(store, args.chats, args.categories, args.phrases)
+    gc.collect()
+    used = rss_mb() - before
+    print(f"{args.chats} chats x {args.categories} lists of {args.phrases}: "
+          f"{used:.0f} MB RSS, {used * 1024 * 1024 / args.chats:.0f} bytes per chat")
+    print(f"new chat draw   {seconds / (args.chats * args.categories) * 1e6:.2f} us")
+
+    rng = random.Random(1)
+    sample = [rng.randrange(args.chats) for _ in range(200_000)]
+    started = time.perf_counter()
+    for chat in sample:
+        store.draw(chat, 0, args.phrases)
+    print(f"known chat draw {(time.perf_counter() - started) / len(sample) * 1e6:.2f} us")
+    del store
+    gc.collect()
+
+    # Ten times more chats than the cap: memory should match a tenth of the run above
+    capped = args.chats // 10
+    before = rss_mb()
+    store = ChatStateStore(capacity=capped, rng=random.Random(0))
+    fill(store, args.chats, args.categories, args.phrases)
+    gc.collect()
+    print(f"capacity {capped}, {args.chats} chats seen: {len(store)} kept, "
+          f"{rss_mb() - before:.0f} MB RSS")
+    del store
+    gc.collect()
+
+    if args.db:
+        chats = min(args.chats, 100_000)
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'chat_state.db')
+            store = ChatStateStore(capacity=chats, path=path, flush_interval=3600)
+            fill(store, chats, args.categories, args.phrases)
+            started = time.perf_counter()
+            store.flush()
+            print(f"SQLite: wrote {chats} chats in {time.perf_counter() - started:.2f} s, "
+                  f"{os.path.getsize(path) / chats:.0f} bytes per chat on disk")
+            reloaded = ChatStateStore(capacity=chats, path=path, flush_interval=3600)
+            started = time.perf_counter()
+            fill(reloaded, chats, 1, args.phrases)
+            print(f"SQLite: first draw after restart {(time.perf_counter() - started) / chats * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Lambda cold-start report
+Starts a fresh interpreter per run, as Lambda does for a cold container, and
+times interpreter start, importing the handler module, the first invocation
+and a warm one. Runs both a plain text update (the raw-HTTP fast path) and
+an edited message (which needs the full PTB application), with the Bot API
+served by fake_bot_api. Then lists the slowest imports from -X importtime.
+
+    python -m benchmarks.bench_coldstart [--runs 20] [--module lambda_function] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_webhook import ROOT, percentile
+from benchmarks.updates import generate_updates
+from fake_bot_api import FakeBotAPI
+
+# Runs inside the fresh interpreter: argv is module, handler, event body
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+handler = getattr(module, sys.argv[2])
+event = {"body": sys.argv[3]}
+handler(event, None)
+first = time.perf_counter()
+handler(event, None)
+warm = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_ms": (first - imported) * 1000,
+    "warm_ms": (warm - first) * 1000,
+}))
+"""
+
+
+def events():
+    """One plain text update and the same message as an edit"""
+    update = generate_updates(1, seed=7, chats=1, group_ratio=0.0, command_ratio=0.0,
+                              long_ratio=0.0, emoji_ratio=0.0)[0]
+    edited = {"update_id": update["update_id"] + 1, "edited_message": update["message"]}
+    return {'text': json.dumps(update), 'edited': json.dumps(edited)}
+
+
+def cold_run(module, handler, body, env):
+    started = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, module, handler, body],
+        cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    sample = json.loads(output.decode().strip().splitlines()[-1])
+    sample['process_ms'] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def import_profile(module, env, top):
+    """(cumulative_us, self_us, name) for the slowest imports"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='lambda_function')
+    parser.add_argument('--handler', default='lambda_handler')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--api-latency', default='fixed:0',
+                        help='fake Bot API latency distribution in ms (see fake_bot_api.py)')
+    args = parser.parse_args()
+
+    fake_api = FakeBotAPI(latency=args.api_latency).start()
+    env = {**os.environ, 'TELEGRAM_BOT_TOKEN': '123456:bench', 'TELEGRAM_API_BASE': fake_api.url}
+    try:
+        print(f"{'update':<8} {'phase':<10} {'p50 ms':>9} {'p99 ms':>9}")
+        for kind, body in events().items():
+            samples = [cold_run(args.module, args.handler, body, env) for _ in range(args.runs)]
+            for phase in ('process', 'import', 'first', 'warm'):
+                values = sorted(sample[f'{phase}_ms'] for sample in samples)
+                print(f"{kind:<8} {phase:<10} {percentile(values, 50):>9.1f} "
+                      f"{percentile(values, 99):>9.1f}")
+
+        print(f"\nslowest imports (python -X importtime -c 'import {args.module}')")
+        print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+        for cumulative_us, self_us, name in import_profile(args.module, env, args.top):
+            print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+    finally:
+        fake_api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Webhook update decode micro-benchmark
+Time per update for thebertcoin's webhook to get from the raw body to what
+it hands the bot: before, json.loads and Update.de_json for every update;
+now, update_filter.read_update screening edits, joins and stickers out of
+the raw bytes and building Updates only for text messages, with the json
+and orjson decoders. Run at several shares of non-text updates.
+
+    python -m benchmarks.bench_decode [--updates 5000] [--non-text 0,0.5,0.8]
+"""
+
+import argparse
+import json
+import time
+
+from telegram import Bot, Update
+
+import update_filter
+from benchmarks.updates import generate_updates
+
+
+def per_update_us(handle, bodies, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            handle(body)
+        best = min(best, time.perf_counter() - start)
+    return best / len(bodies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--non-text', default='0,0.5,0.8', help='shares of non-text updates to run at')
+    args = parser.parse_args()
+
+    bot = Bot('123:abc')
+
+    def before(body):
+        return Update.de_json(json.loads(body), bot)
+
+    def screened(body):
+        data, skipped = update_filter.read_update(body)
+        return None if skipped else Update.de_json(data, bot)
+
+    decoders = [('json', json.loads)]
+    if update_filter.orjson is not None:
+        decoders.append(('orjson', update_filter.orjson.loads))
+
+    print(f"{'non-text':>8} {'skipped':>8} {'before us':>10}" +
+          ''.join(f" {name + ' us':>10}" for name, _ in decoders))
+    for share in (float(value) for value in args.non_text.split(',')):
+        # As Telegram sends them: compact, UTF-8
+        bodies = [json.dumps(update, ensure_ascii=False, separators=(',', ':')).encode()
+                  for update in generate_updates(args.updates, seed=7, non_text_ratio=share)]
+        skipped = sum(1 for body in bodies if update_filter.read_update(body)[1])
+        row = f"{share:>8.0%} {skipped / len(bodies):>8.0%} {per_update_us(before, bodies):>10.1f}"
+        for _, loads in decoders:
+            update_filter.loads = loads
+            row += f" {per_update_us(screened, bodies):>10.1f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Logging cost during an outage
+Request threads log what the sender logs while Telegram is down, a
+timeout warning and a failure error per send, into a slow sink (a write
+takes --sink-ms, like a congested pipe or log shipper). Compares
+logging.basicConfig with log_pipeline.configure_logging: time a request
+thread spends per log call, and how many lines reach the sink.
+
+    python -m benchmarks.bench_logging [--threads 16] [--sends 500] [--sink-ms 0.5]
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from benchmarks.bench_webhook import percentile
+from log_pipeline import bind, configure_logging, log_scope
+
+
+class SlowSink:
+    """A stream whose every write takes a while; counts lines"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        time.sleep(self.seconds)
+        with self._lock:
+            self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+
+def outage(threads, sends):
+    """Per-call latencies (us) of request threads logging failed sends"""
+    logger = logging.getLogger('sender')
+    latencies = []
+
+    def request_thread(worker):
+        for n in range(sends):
+            with log_scope():
+                bind(update_id=worker * sends + n, chat_id=worker)
+                started = time.perf_counter()
+                logger.warning("Timeout attempt 1/2")
+                logger.error(f"Failed to send message: 502 Server Error for chat {worker}")
+                latencies.append((time.perf_counter() - started) / 2 * 1e6)
+
+    workers = [threading.Thread(target=request_thread, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(latencies), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sends', type=int, default=500, help='failed sends per thread')
+    parser.add_argument('--sink-ms', type=float, default=0.5, help='time one write to the sink takes')
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    print(f"{args.threads * args.sends * 2} records from {args.threads} threads, {args.sink_ms} ms per sink write\n")
+    print(f"{'setup':<18} {'p50 us':>8} {'p99 us':>9} {'wall s':>7} {'lines':>7}")
+    for label in ('basicConfig', 'log_pipeline'):
+        sink = SlowSink(args.sink_ms / 1000)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        if label == 'basicConfig':
+            logging.basicConfig(stream=sink, level=logging.INFO,
+                                format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        else:
+            handler = configure_logging(stream=sink)
+        latencies, wall = outage(args.threads, args.sends)
+        if label == 'log_pipeline':
+            handler.flush()
+        print(f"{label:<18} {percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>9.1f} "
+              f"{wall:>7.2f} {sink.lines:>7}")
+
+
+if __name__ == '__main__':
+    main()
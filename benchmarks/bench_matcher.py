@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Q&A matcher micro-benchmark
+Compares the per-message cost of scanning every Q&A regex in personas.json in
+turn with QAMatcher's single pass, as synthetic patterns are added to the table.
+
+    python -m benchmarks.bench_matcher [--messages 2000] [--sizes 0,35,100,300,1000]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from persona_data import DEFAULT_SOURCE, load
+from qa_matcher import QAMatcher
+
+WORDS = (
+    "gm frens the chart looks bullish today what do you think about this coin "
+    "wen moon ser i just aped in again lol hodl the dip is real fud everywhere "
+    "my wife says sell but i am based and rich in spirit 🚀 🐔 🥚"
+).split()
+
+
+def synthetic_patterns(count, rng):
+    """Extra patterns shaped like the real ones: keyword alternations and 'a.*b' pairs"""
+    patterns = []
+    for i in range(count):
+        a = ''.join(rng.choice('bcdfghjklmnpqrstvwxz') for _ in range(5))
+        b = ''.join(rng.choice('bcdfghjklmnpqrstvwxz') for _ in range(4))
+        patterns.append(f"{a}{i}|{b}.*{a}" if i % 2 else f"wen.*{a}|{a}{i}")
+    return patterns
+
+
+def synthetic_messages(count, rng):
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25))) for _ in range(count)]
+
+
+def naive_matcher(keys):
+    """The obvious approach: search each compiled pattern until one matches"""
+    compiled = [(key, re.compile(key, re.IGNORECASE)) for key in keys]
+
+    def match(text):
+        for key, pattern in compiled:
+            if pattern.search(text):
+                return key
+        return None
+    return match
+
+
+def per_message_us(match, messages, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in messages:
+            match(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--sizes', default='0,35,100,300,1000',
+                        help="synthetic patterns to add on top of Chicken Bert's")
+    args = parser.parse_args()
+
+    qa = load(DEFAULT_SOURCE).chicken.qa
+    rng = random.Random(42)
+    messages = synthetic_messages(args.messages, rng)
+
+    print(f"{'patterns':>9} {'naive us/msg':>13} {'matcher us/msg':>15} {'speedup':>8}")
+    for extra in (int(size) for size in args.sizes.split(',')):
+        keys = list(qa) + synthetic_patterns(extra, rng)
+        naive = naive_matcher(keys)
+        matcher = QAMatcher(keys)
+        assert all(naive(text) == matcher.match(text) for text in messages)
+
+        naive_us = per_message_us(naive, messages)
+        matcher_us = per_message_us(matcher.match, messages)
+        print(f"{len(keys):>9} {naive_us:>13.1f} {matcher_us:>15.1f} {naive_us / matcher_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
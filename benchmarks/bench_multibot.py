@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Multi-bot memory report
+Starts a fresh interpreter per case and measures its resident memory after
+it has answered the same synthetic updates: app.py alone, thebertcoin_bot.py
+alone, and multibot.py hosting 1..N bots (alternating the two personas),
+with the Bot API served by fake_bot_api. Reports what one process for both
+bots saves over two, and the marginal memory of each extra hosted bot.
+
+    python -m benchmarks.bench_multibot [--counts 1 2 10 50 100] [--updates 200]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_webhook import ROOT, UNLIMITED
+from benchmarks.updates import generate_updates
+from fake_bot_api import FakeBotAPI
+
+# Runs inside the fresh interpreter: argv is the module, stdin JSON
+# {"paths": [...], "bodies": [...]}; every body is posted to every path
+PROBE = """
+import json, sys
+module = __import__(sys.argv[1])
+client = module.app.test_client()
+posts = json.load(sys.stdin)
+for path in posts['paths']:
+    for body in posts['bodies']:
+        client.post(path, data=body, content_type='application/json')
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({"rss_mb": rss / 1024}))
+"""
+
+
+def measure(module, paths, bodies, env):
+    """RSS in MB of a fresh interpreter after posting every body to every path of module.app"""
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, module],
+        input=json.dumps({'paths': paths, 'bodies': bodies}).encode(),
+        cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])['rss_mb']
+
+
+def multibot_env(base, count):
+    """BOTS spec and tokens for count bots, alternating personas"""
+    personas = ('chicken', 'bertcoin')
+    bot_ids = [f'bot{i}' for i in range(count)]
+    env = dict(base, BOTS=','.join(f'{bot_id}={personas[i % 2]}' for i, bot_id in enumerate(bot_ids)))
+    for i, bot_id in enumerate(bot_ids):
+        env[f'TELEGRAM_BOT_TOKEN_{bot_id.upper()}'] = f'{100000 + i}:bench'
+    return env, bot_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--counts', nargs='+', type=int, default=[1, 2, 10, 50, 100],
+                        help='numbers of bots to host in multibot.py')
+    parser.add_argument('--updates', type=int, default=200, help='updates posted to each bot')
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=3, help='runs per case (the median is reported)')
+    args = parser.parse_args()
+
+    bodies = [json.dumps(update) for update in generate_updates(args.updates, chats=args.chats)]
+    fake_api = FakeBotAPI().start()
+    base = {**os.environ, 'TELEGRAM_BOT_TOKEN': '123456:bench', 'TELEGRAM_API_BASE': fake_api.url,
+            **UNLIMITED}
+
+    def median(module, paths, env):
+        return sorted(measure(module, paths, bodies, env) for _ in range(args.runs))[args.runs // 2]
+
+    try:
+        single = {
+            'app': median('app', ['/webhook'], base),
+            'thebertcoin_bot': median('thebertcoin_bot', ['/webhook'], base),
+        }
+        print(f"{'process':<24} {'RSS MB':>8}")
+        for module, rss in single.items():
+            print(f"{module + ' alone':<24} {rss:>8.1f}")
+        print(f"{'both, two processes':<24} {sum(single.values()):>8.1f}")
+
+        hosted = {}
+        for count in args.counts:
+            env, bot_ids = multibot_env(base, count)
+            hosted[count] = median('multibot', [f'/webhook/{bot_id}' for bot_id in bot_ids], env)
+            print(f"{f'multibot, {count} bots':<24} {hosted[count]:>8.1f}")
+    finally:
+        fake_api.stop()
+
+    counts = sorted(hosted)
+    if len(counts) > 1:
+        low, high = counts[0], counts[-1]
+        per_bot = (hosted[high] - hosted[low]) / (high - low) * 1024
+        print(f"\nmarginal memory per hosted bot: {per_bot:.0f} kB "
+              f"({low} -> {high} bots, {args.updates} updates each)")
+
+
+if __name__ == '__main__':
+    main()
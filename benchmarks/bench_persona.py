@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Persona transform benchmark
+Compares the original per-function transforms (rebuilding their tables and
+re-splitting the text on every call, reproduced below) with the persona
+engines: ns per message and peak transient bytes allocated per message.
+Also checks that both produce identical replies from the same seed.
+
+    python -m benchmarks.bench_persona [--messages 5000]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from persona import BertcoinPersona, ChickenPersona
+
+WELCOME = (
+    "*EXCITED CHICKEN NOISES* BAWK BAWK FRENS! 🐔\n\n"
+    "I'm Bert, your favorite schizophrenic crypto chicken! Ready to share some EGGSCLUSIVE alpha from the coop! 🥚\n\n"
+    "The pigeons might be watching... but I'll still tell you about the MASSIVE GAINS ahead! 👁️\n\n"
+    "What's clucking, fren? Let's talk crypto, gains, and why Ernie is definitely a FED! 💫"
+)
+
+SHORT = "Have you checked the charts? We're already mooning! Just zoom out... way out... keep going... 📈"
+
+
+# --- Original implementations (app.py / thebertcoin_bot.py before the engines) ---
+
+def legacy_transform(text, rng):
+    roll = rng.random()
+    if roll < 0.4:
+        text = text.lower()
+    elif roll < 0.7:
+        text = text.upper()
+    elif roll < 0.9:
+        words = text.split()
+        text = ' '.join(w.upper() if rng.random() < 0.5 else w.lower() for w in words)
+
+    MISSPELLINGS = {
+        'friend': 'fren', 'friends': 'frens', 'more': 'moar', 'eggs': 'egggs',
+        'hold': 'hodl', 'holding': 'hodling', 'going': 'goin', 'what': 'wut', 'the': 'da',
+    }
+    words = text.split()
+    for i, word in enumerate(words):
+        if rng.random() < 0.3:
+            words[i] = MISSPELLINGS.get(word.lower(), word)
+    if rng.random() < 0.2:
+        cluck = rng.choice(['CLUCK!', 'SQUAWK!', '*clucks nervously*', '*squawks intensely*'])
+        words.insert(rng.randint(0, len(words)), cluck)
+    text = ' '.join(words)
+
+    if rng.random() < 0.15:
+        PARANOID_TANGENTS = [
+            "...the pigeons are watching...", "ERNIE'S A FED!",
+            "...whales lurking in the shadows...", "*whispers* foxes everywhere...",
+            "they don't want you to know about the eggs...", "the coop has eyes...",
+            "...binary code in the chicken feed...", "*adjusts tinfoil hat*",
+        ]
+        text += f" {rng.choice(PARANOID_TANGENTS)}"
+
+    if rng.random() < 0.05:
+        if rng.random() < 0.5:
+            code = ''.join(rng.choice('01') for _ in range(8))
+            text += f" [BINARY:{code}]"
+        else:
+            # The original used secrets.token_hex(4), which can't be seeded
+            text += f" [HEX:{rng.getrandbits(32):08X}]"
+
+    if rng.random() < 0.9 and not text.endswith('!'):
+        text += '!' * rng.randint(1, 3)
+    CHICKEN_EMOJIS = ['🐔', '🐓', '🥚', '🍗']
+    CRYPTO_EMOJIS = ['🚀', '🌕', '💎', '📈']
+    PARANOID_EMOJIS = ['😵‍💫', '👁️', '🤪', '💫']
+    if rng.random() < 0.4:
+        emoji_count = rng.randint(1, 3)
+        emojis = rng.sample(CHICKEN_EMOJIS + CRYPTO_EMOJIS + PARANOID_EMOJIS, k=emoji_count)
+        text += ' ' + ''.join(emojis)
+    return text
+
+
+def legacy_bertcoin_style(text, rng):
+    if rng.random() < 0.1:
+        text = text.upper()
+    if rng.random() < 0.15:
+        append_phrases = ["You too?", "Berthrens know dis", "//END TRANSMISSION", "BERT out"]
+        text += f" {rng.choice(append_phrases)}"
+    if rng.random() < 0.08:
+        BINARY_STRINGS = ["01010010", "10101100", "11001010", "00110101", "11100011"]
+        HEX_STRINGS = ["0x1A2B3C", "0xDEADBEEF", "0xCAFEBABE", "0xF00DBAR", "0xBERT123"]
+        if rng.random() < 0.5:
+            text += f" {rng.choice(BINARY_STRINGS)}"
+        else:
+            text += f" {rng.choice(HEX_STRINGS)}"
+    return text
+
+
+# --- Measurement ---
+
+def ns_per_call(func, text, count, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            func(text)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / count
+
+
+def peak_bytes_per_call(func, text, count):
+    tracemalloc.start()
+    total = 0
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(text)
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return total / count
+
+
+def check_same_output(legacy, engine_cls, method, text, count):
+    engine = engine_cls(random.Random(7))
+    rng = random.Random(7)
+    for _ in range(count):
+        assert legacy(text, rng) == getattr(engine, method)(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=5000)
+    args = parser.parse_args()
+
+    check_same_output(legacy_transform, ChickenPersona, 'transform', WELCOME, args.messages)
+    check_same_output(legacy_bertcoin_style, BertcoinPersona, 'style', SHORT, args.messages)
+    print("seeded output identical: yes")
+
+    chicken = ChickenPersona(random.Random(1))
+    bertcoin = BertcoinPersona(random.Random(1))
+    legacy_rng = random.Random(1)
+    cases = [
+        ("chicken welcome", WELCOME, lambda t: legacy_transform(t, legacy_rng), chicken.transform),
+        ("chicken short", SHORT, lambda t: legacy_transform(t, legacy_rng), chicken.transform),
+        ("bertcoin style", SHORT, lambda t: legacy_bertcoin_style(t, legacy_rng), bertcoin.style),
+    ]
+
+    print(f"{'case':<16} {'before ns':>10} {'after ns':>10} {'before B':>9} {'after B':>8}")
+    for name, text, before, after in cases:
+        print(f"{name:<16} {ns_per_call(before, text, args.messages):>10.0f} "
+              f"{ns_per_call(after, text, args.messages):>10.0f} "
+              f"{peak_bytes_per_call(before, text, args.messages // 5):>9.0f} "
+              f"{peak_bytes_per_call(after, text, args.messages // 5):>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Persona data startup and reload benchmark
+Startup: a fresh interpreter per run loads personas.json either from the
+prebuilt cache or by building the tables from the source, as a worker or a
+cold Lambda does. Reload: the time to rebuild and swap in the tables after
+an edit, then threads replying against the store while the source is
+rewritten over and over, with reply latency and failures (there should be
+none) compared to a run without edits.
+
+    python -m benchmarks.bench_personas [--runs 20] [--threads 4] [--reloads 50]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_webhook import ROOT, percentile
+from persona_data import DEFAULT_SOURCE, PersonaStore
+
+# Runs inside the fresh interpreter: argv is the source and whether to use its cache
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import persona_data
+imported = time.perf_counter()
+persona_data.load(sys.argv[1], persona_data.cache_path(sys.argv[1]) if sys.argv[2] == '1' else None)
+loaded = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "load_ms": (loaded - imported) * 1000}))
+"""
+
+MESSAGES = ["wen moon ser", "is bert a chicken or an egg", "gm frens", "who are you",
+            "what about the pigeons", "hodl the dip", "random chatter with no match"]
+
+
+def cold_load(source, cached, env):
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, source, '1' if cached else '0'],
+        cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def edited(data, generation):
+    """The source with one extra Q&A pattern, so each rewrite really changes it"""
+    qa = {f'reload marker {generation}': [f'generation {generation}'], **data['chicken']['qa']}
+    return dict(data, chicken=dict(data['chicken'], qa=qa))
+
+
+def reply(store, rng, text):
+    """What a handler does with the tables: match, then pick a reply"""
+    chicken = store.current.chicken
+    key = chicken.matcher.match(text)
+    return rng.choice(chicken.qa[key]) if key is not None else chicken.welcome
+
+
+def hammer(store, stop, latencies, failures, seed):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        text = rng.choice(MESSAGES)
+        started = time.perf_counter()
+        try:
+            reply(store, rng, text)
+        except Exception:
+            failures.append(text)
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+
+def run_load(store, seconds, threads, churn=None):
+    """Reply latencies (us) and failures from `threads` threads for `seconds`, while churn() runs"""
+    stop = threading.Event()
+    latencies, failures = [], []
+    workers = [threading.Thread(target=hammer, args=(store, stop, latencies, failures, seed))
+               for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    if churn is not None:
+        churn()
+    else:
+        time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sorted(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20, help='fresh interpreters per startup case')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--reloads', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.02, help='seconds between rewrites')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='personas-bench-')
+    source = os.path.join(workdir, 'personas.json')
+    shutil.copy(DEFAULT_SOURCE, source)
+    with open(source, encoding='utf-8') as f:
+        data = json.load(f)
+    env = {**os.environ, 'PYTHONPATH': ROOT}
+    try:
+        print(f"{'load':<16} {'p50 ms':>8} {'p99 ms':>8}")
+        PersonaStore(source, check_interval=0)  # writes the cache
+        for label, cached in (('from cache', True), ('from source', False)):
+            samples = [cold_load(source, cached, env) for _ in range(args.runs)]
+            loads = sorted(sample['load_ms'] for sample in samples)
+            print(f"{label:<16} {percentile(loads, 50):>8.2f} {percentile(loads, 99):>8.2f}")
+
+        def rewrite(generation):
+            with open(source + '.new', 'w', encoding='utf-8') as f:
+                json.dump(edited(data, generation), f)
+            os.replace(source + '.new', source)
+
+        # What one reload costs the request that notices the change
+        store = PersonaStore(source, check_interval=0)
+        reload_ms = []
+        for generation in range(args.reloads):
+            rewrite(generation)
+            started = time.perf_counter()
+            store.reload()
+            reload_ms.append((time.perf_counter() - started) * 1000)
+        reload_ms.sort()
+        print(f"{'reload':<16} {percentile(reload_ms, 50):>8.2f} {percentile(reload_ms, 99):>8.2f}")
+
+        # Replies keep flowing while the file changes under them
+        store = PersonaStore(source, check_interval=args.interval / 4)
+        swaps = []
+        store.subscribe(swaps.append)
+        quiet, quiet_failures = run_load(store, args.reloads * args.interval, args.threads)
+
+        def churn():
+            for generation in range(args.reloads, 2 * args.reloads):
+                rewrite(generation)
+                time.sleep(args.interval)
+
+        busy, busy_failures = run_load(store, 0, args.threads, churn)
+        print(f"\n{args.threads} threads replying, {len(swaps)} reloads swapped in during the second run")
+        print(f"{'replies':<16} {'count':>8} {'p50 us':>8} {'p99 us':>8} {'failed':>7}")
+        for label, latencies, failures in (('no reloads', quiet, quiet_failures),
+                                           ('reloading', busy, busy_failures)):
+            print(f"{label:<16} {len(latencies):>8} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 99):>8.1f} {len(failures):>7}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
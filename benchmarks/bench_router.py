@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Keyword router micro-benchmark
+Compares the old chained `any(word in message ...)` scans with KeywordRouter
+as the keyword lists grow to thousands of entries.
+
+    python -m benchmarks.bench_router [--messages 2000] [--sizes 0,100,1000,5000]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from keyword_router import KeywordRouter
+from persona_data import DEFAULT_SOURCE
+
+# thebertcoin's keyword categories, in priority order, as personas.json has them
+with open(DEFAULT_SOURCE, encoding='utf-8') as f:
+    CATEGORIES = [(tuple(category['phrases']), category['keywords'])
+                  for category in json.load(f)['bertcoin']['categories']]
+
+WORDS = (
+    "this chart is wild ser token go up soon lol anyone here trading today "
+    "bert is the chosen one but my boss wants the project done gn frens 🚀"
+).split()
+
+
+def chained_router(categories):
+    """The original if/elif chain of substring scans"""
+    def route(text):
+        text = text.lower()
+        for phrases, keywords in categories:
+            if any(word in text for word in keywords):
+                return phrases
+        return None
+    return route
+
+
+def grown(categories, extra, rng):
+    """Spread extra made-up keywords across the categories"""
+    lists = [list(keywords) for _, keywords in categories]
+    for i in range(extra):
+        word = ''.join(rng.choice('bcdfghjklmnpqrstvwxz') for _ in range(6))
+        lists[i % len(lists)].append(word)
+    return [(phrases, keywords) for (phrases, _), keywords in zip(categories, lists)]
+
+
+def per_message_us(route, messages, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in messages:
+            route(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--sizes', default='0,100,1000,5000',
+                        help='extra keywords to add across the categories')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    messages = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+                for _ in range(args.messages)]
+
+    print(f"{'keywords':>9} {'chained us/msg':>15} {'router us/msg':>14}")
+    for extra in (int(size) for size in args.sizes.split(',')):
+        categories = grown(CATEGORIES, extra, rng)
+        total = sum(len(keywords) for _, keywords in categories)
+        chained = chained_router(categories)
+        router = KeywordRouter(categories)
+        print(f"{total:>9} {per_message_us(chained, messages):>15.1f} "
+              f"{per_message_us(router.route, messages):>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Worker-model benchmark matrix
+Starts serve.py for each bot and worker model on this box in turn and
+drives the same synthetic updates through it, with the Bot API served by
+fake_bot_api. Reports throughput, latency, outbound calls per update and
+the server's proportional memory (PSS, which counts pages shared
+copy-on-write between workers once), and saves the matrix as JSON.
+
+    python -m benchmarks.bench_serve [--bots app thebertcoin] [--models sync threaded async]
+    python -m benchmarks.bench_serve --workers 4 --concurrency 64 --api-latency fixed:100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.bench_webhook import (
+    RESULTS_DIR, bot_env, drive, free_port, git_commit, server_poster, summarize,
+)
+from benchmarks.updates import generate_updates
+from fake_bot_api import FakeBotAPI
+from serve import BOT_MODULES, MODELS, default_workers
+from worker_models import available_cpus
+
+
+def pss_mb(pid):
+    """Proportional set size of pid and its children in MB (Linux only, else None)"""
+    pids = [pid]
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+        total = 0
+        for p in pids:
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        return round(total / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def run_cell(bot, model, args, bodies, warmup):
+    fake_api = FakeBotAPI(latency=args.api_latency, seed=args.seed).start()
+    env = bot_env(fake_api.url, args.telegram_limits)
+    workers = args.workers or default_workers(model)
+    port = free_port()
+    command = [sys.executable, 'serve.py', bot, '--model', model, '--workers', str(workers),
+               '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}']
+    if args.no_preload:
+        command.append('--no-preload')
+    post, stop = server_poster(command, port, env)
+    try:
+        drive(post, warmup, args.concurrency)
+        time.sleep(args.settle)
+        fake_api.reset()
+        samples, duration = drive(post, bodies, args.concurrency)
+        time.sleep(args.settle)
+        memory = pss_mb(post.pid)
+    finally:
+        stop()
+        fake_api.stop()
+    return {
+        "bot": bot,
+        "model": model,
+        "workers": workers,
+        "threads": args.threads if model == 'threaded' else None,
+        **summarize(samples, duration, fake_api, len(bodies)),
+        "server_pss_mb": memory,
+        "server_peak_rss_mb": post.peak_rss_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bots', nargs='+', choices=sorted(BOT_MODULES), default=sorted(BOT_MODULES))
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS))
+    parser.add_argument('--workers', type=int, default=0,
+                        help="workers per server (default: serve.py's size for each model)")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--no-preload', action='store_true')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--api-latency', default='fixed:20',
+                        help='fake Bot API latency distribution in ms (see fake_bot_api.py)')
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="keep Telegram's flood limits on (lifted by default)")
+    parser.add_argument('--settle', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    updates = generate_updates(args.updates, seed=args.seed, chats=args.chats)
+    bodies = [json.dumps(update).encode() for update in updates]
+    warmup = [json.dumps(update).encode() for update in
+              generate_updates(args.warmup, seed=args.seed + 1, chats=args.chats, start_id=10_000_000)]
+
+    cells = []
+    print(f"{'bot':<12} {'model':<9} {'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'out/upd':>7} {'PSS MB':>7}")
+    for bot in args.bots:
+        for model in args.models:
+            if model not in BOT_MODULES[bot]:
+                continue
+            cell = run_cell(bot, model, args, bodies, warmup)
+            cells.append(cell)
+            lat = cell['latency_ms']
+            print(f"{bot:<12} {model:<9} {cell['workers']:>7} {cell['rps']:>8} {lat['p50']:>8} "
+                  f"{lat['p99']:>8} {cell['outbound_per_update']:>7} {cell['server_pss_mb'] or '-':>7}")
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "cpus": available_cpus(),
+        "config": {key: value for key, value in vars(args).items() if key != 'output'},
+        "cells": cells,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"serve-matrix-{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {output}")
+
+
+if __name__ == '__main__':
+    main()
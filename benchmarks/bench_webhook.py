@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+End-to-end webhook benchmark
+Drives synthetic Telegram updates through app.webhook, its ASGI twin
+app_asgi or thebertcoin_bot.webhook, either in-process (Flask test client /
+ASGI transport) or through a real gunicorn server, with outbound Bot API calls going to the bundled fake
+Bot API server (fake_bot_api.py), optionally with injected faults.
+Reports p50/p95/p99 latency, requests per second and outbound calls per
+update, and saves the result as JSON so runs can be compared across commits.
+
+    python -m benchmarks.bench_webhook run --bot app --mode gunicorn --concurrency 16
+    python -m benchmarks.bench_webhook run --bot app_asgi --mode gunicorn --concurrency 16
+    python -m benchmarks.bench_webhook compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.updates import generate_updates
+from fake_bot_api import FakeBotAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'bench_results')
+
+# asgi targets run under uvicorn's gunicorn worker unless --worker-class says otherwise
+Target = namedtuple('Target', 'module wsgi asgi')
+
+TARGETS = {
+    'app': Target('app', 'app:app', False),
+    'app_asgi': Target('app_asgi', 'app_asgi:app', True),
+    'thebertcoin': Target('thebertcoin_bot', 'thebertcoin_bot:app', False),
+}
+
+# Telegram's flood limits would dominate every number, so they're lifted
+# unless --telegram-limits is passed
+UNLIMITED = {
+    'RATE_LIMIT_GLOBAL_PER_SEC': '1000000',
+    'RATE_LIMIT_PRIVATE_PER_SEC': '1000000',
+    'RATE_LIMIT_GROUP_PER_MIN': '60000000',
+}
+
+
+def bot_env(api_base, telegram_limits, extra=()):
+    env = {'TELEGRAM_BOT_TOKEN': '123456:bench', 'TELEGRAM_API_BASE': api_base}
+    if not telegram_limits:
+        env.update(UNLIMITED)
+    env.update(extra)
+    return env
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def drive(post, bodies, concurrency):
+    """Send every body through post() from `concurrency` threads; returns samples and wall time"""
+    samples = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for sample in pool.map(post, bodies):
+            samples.append(sample)
+    return samples, time.perf_counter() - start
+
+
+def inprocess_poster(target, env):
+    """post() that calls the Flask app through its test client"""
+    os.environ.update(env)
+    module = importlib.import_module(target.module)
+    local = threading.local()
+
+    def post(body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = module.app.test_client()
+        started = time.perf_counter()
+        response = client.post('/webhook', data=body, content_type='application/json')
+        elapsed = time.perf_counter() - started
+        inline = response.is_json and bool((response.get_json(silent=True) or {}).get('method'))
+        return elapsed, response.status_code, inline
+
+    return post, None
+
+
+def asgi_inprocess_poster(target, env):
+    """post() that calls the ASGI app on an event loop thread, without a server"""
+    import httpx
+
+    os.environ.update(env)
+    module = importlib.import_module(target.module)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def make_client():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app),
+                                 base_url='http://bench')
+
+    client = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+
+    async def timed_post(body):
+        started = time.perf_counter()
+        response = await client.post('/webhook', content=body,
+                                     headers={'Content-Type': 'application/json'})
+        elapsed = time.perf_counter() - started
+        inline = response.headers.get('content-type', '').startswith('application/json') and \
+            b'"method"' in response.content
+        return elapsed, response.status_code, inline
+
+    def post(body):
+        return asyncio.run_coroutine_threadsafe(timed_post(body), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        # ASGITransport skips lifespan, so close the app's send pool here
+        asyncio.run_coroutine_threadsafe(module.sender.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return post, stop
+
+
+def peak_rss_mb(pid):
+    """Peak resident memory of pid and its children in MB (Linux only, else None)"""
+    pids = [pid]
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+        total = 0
+        for p in pids:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        return round(total / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def gunicorn_poster(target, env, workers, threads, worker_class, extra_args):
+    """Start gunicorn on a free port and return a post() that hits it over HTTP"""
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning']
+    if worker_class is None and target.asgi:
+        worker_class = 'uvicorn.workers.UvicornWorker'
+    if worker_class:
+        command += ['--worker-class', worker_class]
+    command += list(extra_args) + [target.wsgi]
+    return server_poster(command, port, env)
+
+
+def server_poster(command, port, env):
+    """Run a server command listening on port and return a post() that hits it over HTTP"""
+    proc = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while True:
+        try:
+            requests.get(url + '/', timeout=1)
+            break
+        except requests.exceptions.RequestException:
+            if proc.poll() is not None or time.time() > deadline:
+                proc.kill()
+                raise RuntimeError(f"server did not start: {' '.join(command)}")
+            time.sleep(0.1)
+
+    local = threading.local()
+
+    def post(body):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.post(url + '/webhook', data=body,
+                                headers={'Content-Type': 'application/json'}, timeout=60)
+        elapsed = time.perf_counter() - started
+        inline = response.headers.get('Content-Type', '').startswith('application/json') and \
+            b'"method"' in response.content
+        return elapsed, response.status_code, inline
+
+    post.pid = proc.pid
+
+    def stop():
+        post.peak_rss_mb = peak_rss_mb(proc.pid)
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    return post, stop
+
+
+def summarize(samples, duration, fake_api, updates_sent):
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    calls = dict(fake_api.calls)
+    outbound = sum(calls.values())
+    return {
+        "updates": updates_sent,
+        "duration_s": round(duration, 3),
+        "rps": round(updates_sent / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "status_codes": {str(code): n for code, n in sorted(Counter(s[1] for s in samples).items())},
+        "inline_replies": sum(1 for sample in samples if sample[2]),
+        "outbound_calls": calls,
+        "injected_faults": dict(fake_api.faults),
+        "outbound_per_update": round(outbound / updates_sent, 3) if updates_sent else 0.0,
+    }
+
+
+def run(args):
+    target = TARGETS[args.bot]
+    fake_api = FakeBotAPI(latency=args.api_latency, rate_429=args.rate_429,
+                      retry_after=args.retry_after, rate_5xx=args.rate_5xx,
+                      seed=args.seed).start()
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    env = bot_env(fake_api.url, args.telegram_limits, extra_env)
+
+    warmup = generate_updates(args.warmup, seed=args.seed + 1, chats=args.chats,
+                              start_id=10_000_000)
+    updates = generate_updates(args.updates, seed=args.seed, chats=args.chats,
+                               group_ratio=args.group_ratio, command_ratio=args.command_ratio,
+                               long_ratio=args.long_ratio, emoji_ratio=args.emoji_ratio,
+                               non_text_ratio=args.non_text_ratio)
+    bodies = [json.dumps(update).encode() for update in updates]
+
+    if args.mode == 'inprocess' and target.asgi:
+        post, stop = asgi_inprocess_poster(target, env)
+    elif args.mode == 'inprocess':
+        post, stop = inprocess_poster(target, env)
+    else:
+        post, stop = gunicorn_poster(target, env, args.workers, args.threads,
+                                     args.worker_class, args.gunicorn_arg)
+    try:
+        drive(post, [json.dumps(u).encode() for u in warmup], args.concurrency)
+        time.sleep(args.settle)
+        fake_api.reset()
+        samples, duration = drive(post, bodies, args.concurrency)
+        # Let sends that outlive the webhook response reach the fake API
+        time.sleep(args.settle)
+    finally:
+        if stop:
+            stop()
+        fake_api.stop()
+
+    result = {
+        "bot": args.bot,
+        "mode": args.mode,
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "config": {
+            "concurrency": args.concurrency,
+            "workers": args.workers if args.mode == 'gunicorn' else None,
+            "threads": args.threads if args.mode == 'gunicorn' else None,
+            "worker_class": args.worker_class or (
+                'uvicorn.workers.UvicornWorker' if target.asgi and args.mode == 'gunicorn' else None),
+            "chats": args.chats,
+            "group_ratio": args.group_ratio,
+            "non_text_ratio": args.non_text_ratio,
+            "api_latency": args.api_latency,
+            "rate_429": args.rate_429,
+            "rate_5xx": args.rate_5xx,
+            "telegram_limits": args.telegram_limits,
+            "env": extra_env,
+            "seed": args.seed,
+        },
+        **summarize(samples, duration, fake_api, len(bodies)),
+        "server_peak_rss_mb": getattr(post, 'peak_rss_mb', None),
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"webhook-{args.bot}-{args.mode}-{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    lat = result['latency_ms']
+    print(f"{args.bot} {args.mode}: {result['rps']} req/s  p50 {lat['p50']}ms  "
+          f"p95 {lat['p95']}ms  p99 {lat['p99']}ms  "
+          f"outbound/update {result['outbound_per_update']}  status {result['status_codes']}")
+    if result['server_peak_rss_mb'] is not None:
+        print(f"server peak RSS {result['server_peak_rss_mb']} MB")
+    print(f"saved {output}")
+    return result
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows = [('rps', before['rps'], after['rps'])]
+    rows += [(f'{key} ms', before['latency_ms'][key], after['latency_ms'][key])
+             for key in ('p50', 'p95', 'p99', 'max')]
+    rows.append(('outbound/update', before['outbound_per_update'], after['outbound_per_update']))
+    if before.get('server_peak_rss_mb') and after.get('server_peak_rss_mb'):
+        rows.append(('peak RSS MB', before['server_peak_rss_mb'], after['server_peak_rss_mb']))
+
+    # Label columns by bot too, so app vs app_asgi on one commit reads sensibly
+    labels = [f"{result['bot']}@{result['commit']}" for result in (before, after)]
+    width = max(12, *(len(label) for label in labels))
+    print(f"{'metric':<16} {labels[0]:>{width}} {labels[1]:>{width}} {'change':>9}")
+    for name, old, new in rows:
+        change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+        print(f"{name:<16} {old:>{width}} {new:>{width}} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run one benchmark and save the result')
+    run_parser.add_argument('--bot', choices=sorted(TARGETS), default='app')
+    run_parser.add_argument('--mode', choices=('inprocess', 'gunicorn'), default='inprocess')
+    run_parser.add_argument('--updates', type=int, default=2000)
+    run_parser.add_argument('--warmup', type=int, default=100)
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--workers', type=int, default=1)
+    run_parser.add_argument('--threads', type=int, default=8)
+    run_parser.add_argument('--worker-class', default=None)
+    run_parser.add_argument('--gunicorn-arg', action='append', default=[],
+                            help='extra argument passed to gunicorn (repeatable)')
+    run_parser.add_argument('--chats', type=int, default=500)
+    run_parser.add_argument('--group-ratio', type=float, default=0.5)
+    run_parser.add_argument('--command-ratio', type=float, default=0.05)
+    run_parser.add_argument('--long-ratio', type=float, default=0.05)
+    run_parser.add_argument('--emoji-ratio', type=float, default=0.3)
+    run_parser.add_argument('--non-text-ratio', type=float, default=0.0)
+    run_parser.add_argument('--api-latency', default='fixed:20',
+                            help='fake Bot API latency distribution in ms (see fake_bot_api.py)')
+    run_parser.add_argument('--rate-429', type=float, default=0.0,
+                            help='fraction of Bot API calls answered with 429')
+    run_parser.add_argument('--retry-after', type=int, default=1)
+    run_parser.add_argument('--rate-5xx', type=float, default=0.0,
+                            help='fraction of Bot API calls answered with 502')
+    run_parser.add_argument('--telegram-limits', action='store_true',
+                            help="keep Telegram's real flood limits in the rate limiter")
+    run_parser.add_argument('--env', action='append', default=[],
+                            help='extra KEY=VALUE for the bot process (repeatable)')
+    run_parser.add_argument('--settle', type=float, default=0.5)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default=None)
+
+    compare_parser = commands.add_parser('compare', help='compare two saved results')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Synthetic Telegram updates for benchmarks
+Private chats and groups, commands, short chatter, long texts and emoji,
+plus the non-text updates (edits, joins, stickers) real groups are full of.
+"""
+
+import random
+
+WORDS = (
+    "gm frens wen moon ser the chart looks bullish today hodl the dip fud "
+    "aped in again lol who is bert what is the plan for this coin any alpha "
+    "my wife says sell but i am based rich bear market cope ngmi wagmi bye gn"
+).split()
+
+EMOJI = ['🚀', '🐔', '🥚', '📈', '💎', '😂', '🔥', '👀', '🌕', '🤝']
+
+COMMANDS = ['/start', '/help']
+
+
+def _text(rng, long_ratio, emoji_ratio):
+    if rng.random() < long_ratio:
+        length = rng.randint(80, 600)
+    else:
+        length = rng.randint(1, 15)
+    words = [rng.choice(WORDS) for _ in range(length)]
+    if rng.random() < emoji_ratio:
+        for _ in range(rng.randint(1, 4)):
+            words.insert(rng.randint(0, len(words)), rng.choice(EMOJI))
+    return ' '.join(words)
+
+
+def _chat(rng, chat_id):
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+    return {"id": chat_id, "type": "supergroup", "title": f"coop {-chat_id}"}
+
+
+def generate_updates(count, seed=0, chats=100, group_ratio=0.5, command_ratio=0.05,
+                     long_ratio=0.05, emoji_ratio=0.3, non_text_ratio=0.0, start_id=1):
+    """
+    Build count update dicts spread over `chats` chats. group_ratio of the
+    chats are groups (negative ids); non_text_ratio of the updates are
+    edits, member joins or stickers instead of new text messages.
+    """
+    rng = random.Random(seed)
+    chat_ids = [
+        -(1000000000000 + i) if rng.random() < group_ratio else 100000 + i
+        for i in range(max(1, chats))
+    ]
+
+    updates = []
+    for n in range(count):
+        update_id = start_id + n
+        chat_id = rng.choice(chat_ids)
+        user_id = chat_id if chat_id > 0 else rng.randint(100000, 199999)
+        message = {
+            "message_id": n + 1,
+            "date": 1700000000 + n,
+            "chat": _chat(rng, chat_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        }
+
+        roll = rng.random()
+        if roll < non_text_ratio:
+            kind = rng.choice(('edited_message', 'new_chat_members', 'sticker'))
+            if kind == 'edited_message':
+                message["text"] = _text(rng, long_ratio, emoji_ratio)
+                message["edit_date"] = message["date"] + 5
+                updates.append({"update_id": update_id, "edited_message": message})
+                continue
+            if kind == 'new_chat_members':
+                message["new_chat_members"] = [dict(message["from"])]
+            else:
+                message["sticker"] = {"file_id": "CAAC", "file_unique_id": "AgAD",
+                                      "width": 512, "height": 512, "is_animated": False,
+                                      "is_video": False, "type": "regular"}
+        elif rng.random() < command_ratio:
+            command = rng.choice(COMMANDS)
+            message["text"] = command
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        else:
+            message["text"] = _text(rng, long_ratio, emoji_ratio)
+
+        updates.append({"update_id": update_id, "message": message})
+    return updates
@@ -0,0 +1,262 @@
+"""
+Per-chat state with bounded memory
+Replies used to be a plain random.choice, so a chat could get the same
+phrase twice in a row. ChatStateStore keeps a small record per chat and
+uses it for shuffle-bag draws: each phrase list is dealt out in a random
+order without repeats until it runs out, and the next round never starts
+with the phrase that ended the last.
+
+A record is a single array of 16-bit words, about a hundred bytes for a chat
+that has drawn from two short lists: when the chat was last active, then
+for each phrase list it has drawn from the list's id, its length, how many
+phrases are left this round and the dealing order. List keys (category
+names, Q&A patterns) are mapped to ids once per store.
+
+Memory stays bounded two ways: at most `capacity` chats are kept (the least
+recently active are evicted first) and a chat idle for `ttl` seconds starts
+over. With `path` set, records are also kept in SQLite, written in batches
+every few seconds, when evicted and at exit, so bags survive restarts and
+evictions.
+"""
+
+import atexit
+import collections
+import logging
+import marshal
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+
+from metrics import CHAT_STATE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Words before the first bag: last-active time in seconds, high then low half
+HEADER = 2
+# Words before a bag's dealing order: list id, length, phrases left this round
+BAG_HEADER = 3
+# Phrase lists are indexed with 16-bit words
+MAX_PHRASES = 0xFFFF
+
+
+def new_record(touched):
+    return array('H', (touched >> 16, touched & 0xFFFF))
+
+
+def touched_at(record):
+    return record[0] << 16 | record[1]
+
+
+def find_bag(record, list_id):
+    """Offset of the list's bag in the record, or None"""
+    at = HEADER
+    end = len(record)
+    while at < end:
+        if record[at] == list_id:
+            return at
+        at += BAG_HEADER + record[at + 1]
+    return None
+
+
+def draw(record, at, rng):
+    """Next phrase index from the bag at record[at], in O(1)"""
+    count = record[at + 1]
+    left = at + 2
+    first = left + 1
+    remaining = record[left]
+    if remaining == 0:
+        # The phrase drawn last sits first; park it at the end so it can't come straight back
+        last = left + count
+        record[first], record[last] = record[last], record[first]
+        pick = rng.randrange(count - 1) if count > 1 else 0
+        remaining = count
+    else:
+        pick = rng.randrange(remaining)
+    chosen, end = first + pick, left + remaining
+    record[chosen], record[end] = record[end], record[chosen]
+    record[left] = remaining - 1
+    return record[end]
+
+
+class SqliteBacking:
+    """Chat records in a SQLite file, keyed by repr(chat)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS chat_state '
+                         '(chat TEXT PRIMARY KEY, touched REAL, bags BLOB)')
+        self._lock = threading.Lock()
+
+    def reopen(self):
+        """New connection (a SQLite connection must not cross a fork)"""
+        self._open()
+
+    def load(self, chat):
+        """(touched, blob) for the chat, or None"""
+        with self._lock:
+            return self._db.execute('SELECT touched, bags FROM chat_state WHERE chat = ?',
+                                    (repr(chat),)).fetchone()
+
+    def save(self, rows, expire_before=None):
+        """Write (chat, touched, blob) rows in one transaction, dropping expired ones"""
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT OR REPLACE INTO chat_state VALUES (?, ?, ?)',
+                                     [(repr(chat), touched, blob) for chat, touched, blob in rows])
+                if expire_before is not None:
+                    self._db.execute('DELETE FROM chat_state WHERE touched < ?', (expire_before,))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+
+class ChatStateStore:
+    """Per-chat records with an LRU cap and an idle TTL; thread-safe"""
+
+    def __init__(self, capacity=100000, ttl=86400, path=None, flush_interval=5.0, rng=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.rng = rng if rng is not None else random.Random()
+        self._chats = collections.OrderedDict()
+        self._list_ids = {}
+        self._list_keys = []
+        self._lock = threading.Lock()
+        self.backing = SqliteBacking(path) if path else None
+        self._dirty = set()
+        self._evicted = []
+        self._next_flush = time.monotonic() + flush_interval
+        if self.backing is not None:
+            atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if self.backing is not None:
+            self.backing.reopen()
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _list_id(self, key):
+        list_id = self._list_ids.get(key)
+        if list_id is None:
+            list_id = self._list_ids[key] = len(self._list_keys)
+            self._list_keys.append(key)
+        return list_id
+
+    def _encode(self, record):
+        """Record as {list key: bag words} bytes, independent of this store's list ids"""
+        bags = {}
+        at = HEADER
+        while at < len(record):
+            end = at + BAG_HEADER + record[at + 1]
+            bags[self._list_keys[record[at]]] = record[at + 1:end].tobytes()
+            at = end
+        return marshal.dumps(bags)
+
+    def _decode(self, touched, blob):
+        record = new_record(int(touched))
+        for key, words in marshal.loads(blob).items():
+            record.append(self._list_id(key))
+            record.frombytes(words)
+        return record
+
+    def _record(self, chat, now):
+        """The chat's live record, loading or creating it; caller holds the lock"""
+        chats = self._chats
+        record = chats.get(chat)
+        if record is not None:
+            chats.move_to_end(chat)
+            if now - touched_at(record) > self.ttl:
+                del record[HEADER:]
+                CHAT_STATE_EVENTS.labels('expired').inc()
+        else:
+            if self.backing is not None:
+                row = self.backing.load(chat)
+                if row is not None and now - row[0] <= self.ttl:
+                    record = self._decode(*row)
+            CHAT_STATE_EVENTS.labels('miss' if record is None else 'loaded').inc()
+            if record is None:
+                record = new_record(now)
+            chats[chat] = record
+            self._evict(now)
+        record[0], record[1] = now >> 16, now & 0xFFFF
+        return record
+
+    def _evict(self, now):
+        chats = self._chats
+        # Least recently active first: over capacity, or idle past the TTL
+        while chats:
+            chat, record = next(iter(chats.items()))
+            if len(chats) <= self.capacity and now - touched_at(record) <= self.ttl:
+                break
+            del chats[chat]
+            CHAT_STATE_EVENTS.labels('evicted').inc()
+            if chat in self._dirty:
+                self._dirty.discard(chat)
+                self._evicted.append((chat, touched_at(record), self._encode(record)))
+
+    def draw(self, chat, key, count):
+        """Index into the chat's `count`-long phrase list `key`, without repeats until it is used up"""
+        if count <= 1:
+            return 0
+        if count > MAX_PHRASES:
+            return self.rng.randrange(count)
+        now = int(time.time())
+        with self._lock:
+            record = self._record(chat, now)
+            list_id = self._list_id(key)
+            at = find_bag(record, list_id)
+            # A reload can change the list under a bag; deal it afresh then
+            if at is not None and record[at + 1] != count:
+                del record[at:at + BAG_HEADER + record[at + 1]]
+                at = None
+            if at is None:
+                at = len(record)
+                record.extend((list_id, count, count))
+                record.extend(range(count))
+            index = draw(record, at, self.rng)
+            if self.backing is not None:
+                self._dirty.add(chat)
+        if self.backing is not None and time.monotonic() >= self._next_flush:
+            self.flush()
+        return index
+
+    def flush(self):
+        """Write changed and evicted records to the backing file now"""
+        if self.backing is None:
+            return
+        with self._lock:
+            self._next_flush = time.monotonic() + self.flush_interval
+            rows = self._evicted
+            self._evicted = []
+            for chat in self._dirty:
+                record = self._chats.get(chat)
+                if record is not None:
+                    rows.append((chat, touched_at(record), self._encode(record)))
+            self._dirty.clear()
+        try:
+            self.backing.save(rows, expire_before=time.time() - self.ttl)
+        except sqlite3.Error as e:
+            logger.error(f"Could not save chat state to {self.backing.path}: {e}")
+
+
+def open_chat_state():
+    """ChatStateStore from CHAT_STATE_CAPACITY, CHAT_STATE_TTL and CHAT_STATE_DB"""
+    return ChatStateStore(
+        capacity=int(os.environ.get('CHAT_STATE_CAPACITY', 100000)),
+        ttl=int(os.environ.get('CHAT_STATE_TTL', 86400)),
+        path=os.environ.get('CHAT_STATE_DB') or None,
+    )
@@ -0,0 +1,153 @@
+"""
+Per-chat reply coalescing
+In a busy group every incoming message would get its own sendMessage, which
+burns through Telegram's per-group limit (20 a minute) and floods the chat.
+A coalescer holds replies for a chat for a short window after the first one
+and then delivers them as a single message, joined and capped at Telegram's
+length limit; replies that don't fit are dropped. ReplyCoalescer flushes on
+a background thread for the sync sender, AsyncReplyCoalescer flushes with
+loop timers for the asyncio one.
+"""
+
+import asyncio
+import atexit
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REPLIES_COALESCED
+from sender import MAX_MESSAGE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# Chat types whose replies are worth holding back; private chats stay immediate
+GROUP_CHAT_TYPES = ('group', 'supergroup')
+
+
+def merge_replies(texts, max_length=MAX_MESSAGE_LENGTH, separator='\n\n'):
+    """Join replies in order, stopping before the first that would pass max_length"""
+    merged = texts[0]
+    kept = 1
+    for text in texts[1:]:
+        if len(merged) + len(separator) + len(text) > max_length:
+            break
+        merged += separator + text
+        kept += 1
+    REPLIES_COALESCED.labels('merged').inc(kept - 1)
+    REPLIES_COALESCED.labels('dropped').inc(len(texts) - kept)
+    return merged
+
+
+class ReplyCoalescer:
+    """
+    Holds replies per chat for `window` seconds, then hands the merged text to
+    deliver(chat_id, text) on a small worker pool, so a send waiting on the
+    rate limiter doesn't hold up other chats' flushes.
+    """
+
+    def __init__(self, deliver, window=1.0, max_length=MAX_MESSAGE_LENGTH,
+                 separator='\n\n', workers=4):
+        self.deliver = deliver
+        self.window = window
+        self.max_length = max_length
+        self.separator = separator
+        self.workers = workers
+        self._pending = {}
+        self._deadlines = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        # A forked worker inherits pending replies but not the threads
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_threads)
+        atexit.register(self.flush)
+
+    def _forget_threads(self):
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    def add(self, chat_id, text):
+        """Queue a reply; the chat's window starts with its first pending reply"""
+        with self._cond:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='coalescer-send')
+                self._thread = threading.Thread(target=self._run, name='coalescer', daemon=True)
+                self._thread.start()
+            texts = self._pending.get(chat_id)
+            if texts is None:
+                self._pending[chat_id] = [text]
+                heapq.heappush(self._deadlines, (time.monotonic() + self.window, chat_id))
+                self._cond.notify()
+            else:
+                texts.append(text)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                while not self._deadlines or self._deadlines[0][0] > now:
+                    self._cond.wait(self._deadlines[0][0] - now if self._deadlines else None)
+                    now = time.monotonic()
+                _, chat_id = heapq.heappop(self._deadlines)
+                texts = self._pending.pop(chat_id, None)
+            if texts:
+                self._executor.submit(self._deliver, chat_id, texts)
+
+    def _deliver(self, chat_id, texts):
+        try:
+            self.deliver(chat_id, merge_replies(texts, self.max_length, self.separator))
+        except Exception as e:
+            logger.error(f"Failed to deliver coalesced reply to chat {chat_id}: {e!r}")
+
+    def flush(self):
+        """Deliver everything pending now, on the calling thread"""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+            self._deadlines = []
+        for chat_id, texts in pending.items():
+            self._deliver(chat_id, texts)
+
+
+class AsyncReplyCoalescer:
+    """ReplyCoalescer for an event loop: deliver is a coroutine function"""
+
+    def __init__(self, deliver, window=1.0, max_length=MAX_MESSAGE_LENGTH, separator='\n\n'):
+        self.deliver = deliver
+        self.window = window
+        self.max_length = max_length
+        self.separator = separator
+        self._pending = {}
+        self._tasks = set()
+
+    def add(self, chat_id, text):
+        """Queue a reply; must be called on the loop"""
+        texts = self._pending.get(chat_id)
+        if texts is None:
+            self._pending[chat_id] = [text]
+            asyncio.get_running_loop().call_later(self.window, self._flush_chat, chat_id)
+        else:
+            texts.append(text)
+
+    def _flush_chat(self, chat_id):
+        texts = self._pending.pop(chat_id, None)
+        if texts:
+            task = asyncio.ensure_future(self._deliver(chat_id, texts))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, chat_id, texts):
+        try:
+            await self.deliver(chat_id, merge_replies(texts, self.max_length, self.separator))
+        except Exception as e:
+            logger.error(f"Failed to deliver coalesced reply to chat {chat_id}: {e!r}")
+
+    async def aclose(self):
+        """Deliver everything pending and wait for in-flight deliveries"""
+        for chat_id in list(self._pending):
+            self._flush_chat(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,45 @@
+"""
+update_id deduplication for webhook redeliveries
+Telegram redelivers an update when the webhook is slow or answers non-200.
+UpdateDeduper remembers the most recent update_ids in a fixed-size ring
+buffer backed by a set, so checking one costs O(1) and memory never grows;
+the oldest id is forgotten as each new one arrives. The cache is per
+process: with several workers a redelivery can land on one that hasn't
+seen the update.
+"""
+
+import threading
+
+from metrics import UPDATES_DEDUPED
+
+
+class UpdateDeduper:
+    """Thread-safe record of the last `capacity` update_ids; a capacity of 0 turns it off"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = max(0, capacity)
+        self._ring = [None] * self.capacity
+        self._pos = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def seen(self, update_id):
+        """Record update_id; True if it was already recorded. None is never a duplicate."""
+        if update_id is None or not self.capacity:
+            return False
+        with self._lock:
+            if update_id in self._seen:
+                duplicate = True
+            else:
+                duplicate = False
+                oldest = self._ring[self._pos]
+                if oldest is not None:
+                    self._seen.discard(oldest)
+                self._ring[self._pos] = update_id
+                self._seen.add(update_id)
+                self._pos = (self._pos + 1) % self.capacity
+        UPDATES_DEDUPED.labels('hit' if duplicate else 'miss').inc()
+        return duplicate
+
+    def __len__(self):
+        return len(self._seen)
@@ -21,6 +21,18 @@ def create_deployment_package():
         # Copy required files
         files_to_include = [
             'lambda_function.py',
+            'personas.json',
+            'persona_data.py',
+            'qa_matcher.py',
+            'keyword_router.py',
+            'aho_corasick.py',
+            'persona.py',
+            'dedupe.py',
+            'chat_state.py',
+            'metrics.py',
+            'replies.py',
+            'response_pool.py',
+            'tracing.py',
             'requirements.txt'
         ]
         
@@ -28,6 +40,9 @@ def create_deployment_package():
             if os.path.exists(file):
                 shutil.copy2(file, temp_dir)
         
+        # Ship the persona tables prebuilt; the package is read-only at runtime
+        os.system(f"python3 persona_data.py {os.path.join(temp_dir, 'personas.json')}")
+        
         # Install dependencies
         os.system(f"pip3 install -r requirements.txt -t {temp_dir}")
         
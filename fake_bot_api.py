@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API server
+A local stand-in for api.telegram.org for load and fault testing. Implements
+sendMessage, getUpdates, setWebhook, deleteWebhook, getWebhookInfo,
+answerInlineQuery and getMe, with configurable latency, injected 429s
+(with retry_after), 5xx errors, timeouts and connection resets, and a
+delivery log per chat.
+
+Point a bot at it with TELEGRAM_API_BASE=http://127.0.0.1:8081.
+
+Control endpoints (not part of the Bot API):
+    GET  /_fake/stats            call counts and injected faults
+    GET  /_fake/chats/<chat_id>  messages delivered to a chat, in order
+    POST /_fake/updates          queue updates (a JSON object or list) for
+                                 getUpdates, or push them to the webhook if set
+    POST /_fake/reset            clear logs, counters and queued updates
+
+    python fake_bot_api.py --port 8081 --latency uniform:20:80 --rate-429 0.02 --retry-after 2
+"""
+
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+
+
+def parse_latency(spec):
+    """
+    Latency distribution in milliseconds from a spec string:
+    'fixed:20', 'uniform:10:50', 'normal:30:10', 'exp:25' or 'lognormal:3:0.5'.
+    Returns a function rng -> seconds.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(':') if v]
+    if kind == 'fixed':
+        return lambda rng: values[0] / 1000
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == 'exp':
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(values[0], values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class _Server(ThreadingHTTPServer):
+    # The stdlib backlog of 5 resets connections when a load test opens
+    # hundreds at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeBotAPI:
+    """In-memory Bot API with fault injection, served on a threaded HTTP server"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0', rate_429=0.0,
+                 retry_after=1, rate_5xx=0.0, rate_timeout=0.0, timeout_delay=10.0,
+                 rate_reset=0.0, seed=None):
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_5xx = rate_5xx
+        self.rate_timeout = rate_timeout
+        self.timeout_delay = timeout_delay
+        self.rate_reset = rate_reset
+        self.rng = random.Random(seed)
+
+        self.calls = Counter()
+        self.faults = Counter()
+        self.chats = defaultdict(list)
+        self.webhook = {}
+        self._updates = deque()
+        self._next_update_id = 1
+        self._message_ids = Counter()
+        self._lock = threading.Lock()
+        self._updates_ready = threading.Condition(self._lock)
+
+        self.server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.faults.clear()
+            self.chats.clear()
+            self._updates.clear()
+
+    # --- Fault injection ---
+
+    def _draw_fault(self, method):
+        """Pick the fault (if any) for this call; getUpdates is never faulted"""
+        if method == 'getUpdates':
+            return None
+        with self._lock:
+            roll = self.rng.random()
+            delay = self.latency(self.rng)
+        for fault, rate in (('reset', self.rate_reset), ('timeout', self.rate_timeout),
+                            ('429', self.rate_429), ('5xx', self.rate_5xx)):
+            if roll < rate:
+                return fault, delay
+            roll -= rate
+        return None, delay
+
+    # --- Bot API methods ---
+
+    def send_message(self, params):
+        chat_id = params.get('chat_id')
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        with self._lock:
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+            date = int(time.time())
+            self.chats[chat_id].append({
+                "message_id": message_id,
+                "date": date,
+                "text": params.get('text', ''),
+                "received_at": time.time(),
+            })
+        chat_type = 'private' if isinstance(chat_id, int) and chat_id > 0 else 'supergroup'
+        return {
+            "message_id": message_id,
+            "date": date,
+            "chat": {"id": chat_id, "type": chat_type},
+            "from": {"id": 1, "is_bot": True, "first_name": "Bert", "username": "bert_bot"},
+            "text": params.get('text', ''),
+        }
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = max(1, min(100, int(params.get('limit') or 100)))
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self._updates_ready:
+            while True:
+                if offset < 0:
+                    # Negative offsets count back from the newest update
+                    keep = list(self._updates)[offset:]
+                    self._updates = deque(keep)
+                    offset = keep[0]['update_id'] if keep else 0
+                while self._updates and self._updates[0]['update_id'] < offset:
+                    self._updates.popleft()
+                if self._updates:
+                    return [u for _, u in zip(range(limit), self._updates)]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._updates_ready.wait(remaining)
+
+    def set_webhook(self, params):
+        with self._lock:
+            if params.get('drop_pending_updates'):
+                self._updates.clear()
+            self.webhook = {key: value for key, value in params.items() if value is not None}
+        return True
+
+    def delete_webhook(self, params):
+        with self._lock:
+            if params.get('drop_pending_updates'):
+                self._updates.clear()
+            self.webhook = {}
+        return True
+
+    def get_webhook_info(self, params):
+        with self._lock:
+            info = {
+                "url": self.webhook.get('url', ''),
+                "has_custom_certificate": False,
+                "pending_update_count": len(self._updates),
+            }
+            for key in ('max_connections', 'allowed_updates', 'ip_address'):
+                if key in self.webhook:
+                    info[key] = self.webhook[key]
+        return info
+
+    def answer_inline_query(self, params):
+        return True
+
+    def get_me(self, params):
+        return {"id": 1, "is_bot": True, "first_name": "Bert", "username": "bert_bot",
+                "can_join_groups": True, "can_read_all_group_messages": False,
+                "supports_inline_queries": True}
+
+    METHODS = {
+        'sendmessage': send_message,
+        'getupdates': get_updates,
+        'setwebhook': set_webhook,
+        'deletewebhook': delete_webhook,
+        'getwebhookinfo': get_webhook_info,
+        'answerinlinequery': answer_inline_query,
+        'getme': get_me,
+    }
+
+    # --- Control endpoints ---
+
+    def queue_updates(self, updates):
+        """Queue updates for getUpdates, or deliver them to the webhook if one is set"""
+        with self._updates_ready:
+            for update in updates:
+                update.setdefault('update_id', self._next_update_id)
+                self._next_update_id = max(self._next_update_id, update['update_id']) + 1
+            webhook = dict(self.webhook)
+            if not webhook.get('url'):
+                self._updates.extend(updates)
+                self._updates_ready.notify_all()
+        if webhook.get('url'):
+            threading.Thread(target=self._deliver, args=(webhook, updates), daemon=True).start()
+        return len(updates)
+
+    def _deliver(self, webhook, updates):
+        headers = {}
+        if webhook.get('secret_token'):
+            headers['X-Telegram-Bot-Api-Secret-Token'] = webhook['secret_token']
+        session = requests.Session()
+        for update in updates:
+            try:
+                session.post(webhook['url'], json=update, headers=headers, timeout=60)
+            except requests.exceptions.RequestException:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "faults": dict(self.faults),
+                "chats": len(self.chats),
+                "messages": sum(len(log) for log in self.chats.values()),
+                "pending_updates": len(self._updates),
+            }
+
+    # --- HTTP plumbing ---
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _params(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                params = dict(parse_qsl(urlparse(self.path).query))
+                content_type = self.headers.get('Content-Type', '')
+                if body and content_type.startswith('application/json'):
+                    params.update(json.loads(body))
+                elif body:
+                    # PTB posts form fields whose values are JSON-encoded
+                    for key, value in parse_qsl(body.decode()):
+                        try:
+                            params[key] = json.loads(value)
+                        except ValueError:
+                            params[key] = value
+                return params
+
+            def _reply(self, status, payload):
+                out = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _reset_connection(self):
+                # SO_LINGER with a zero timeout makes close() send an RST
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                           struct.pack('ii', 1, 0))
+                self.close_connection = True
+
+            def _control(self, path):
+                if path == '/_fake/stats':
+                    return self._reply(200, api.stats())
+                if path.startswith('/_fake/chats/'):
+                    chat = path.rsplit('/', 1)[-1]
+                    with api._lock:
+                        log = list(api.chats.get(int(chat) if chat.lstrip('-').isdigit() else chat, []))
+                    return self._reply(200, log)
+                if path == '/_fake/updates' and self.command == 'POST':
+                    length = int(self.headers.get('Content-Length') or 0)
+                    payload = json.loads(self.rfile.read(length) or b'[]')
+                    updates = payload if isinstance(payload, list) else [payload]
+                    return self._reply(200, {"queued": api.queue_updates(updates)})
+                if path == '/_fake/reset' and self.command == 'POST':
+                    api.reset()
+                    return self._reply(200, {"ok": True})
+                return self._reply(404, {"error": "unknown control endpoint"})
+
+            def handle_request(self):
+                path = urlparse(self.path).path
+                if path.startswith('/_fake/'):
+                    return self._control(path)
+
+                # /bot<token>/<method>
+                parts = path.strip('/').split('/')
+                if len(parts) != 2 or not parts[0].startswith('bot'):
+                    return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+                method = parts[1]
+                params = self._params()
+
+                with api._lock:
+                    api.calls[method] += 1
+
+                handler = api.METHODS.get(method.lower())
+                if handler is None:
+                    return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"})
+
+                fault, delay = api._draw_fault(method) or (None, 0.0)
+                if fault:
+                    with api._lock:
+                        api.faults[fault] += 1
+                if fault == 'reset':
+                    return self._reset_connection()
+                if fault == 'timeout':
+                    time.sleep(api.timeout_delay)
+                    self.close_connection = True
+                    return None
+                if delay:
+                    time.sleep(delay)
+                if fault == '429':
+                    return self._reply(429, {
+                        "ok": False, "error_code": 429,
+                        "description": f"Too Many Requests: retry after {api.retry_after}",
+                        "parameters": {"retry_after": api.retry_after},
+                    })
+                if fault == '5xx':
+                    return self._reply(502, {"ok": False, "error_code": 502, "description": "Bad Gateway"})
+
+                return self._reply(200, {"ok": True, "result": handler(api, params)})
+
+            do_GET = handle_request
+            do_POST = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server for load and fault testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', default='fixed:0',
+                        help="ms distribution: fixed:N, uniform:A:B, normal:MU:SIGMA, exp:MEAN, lognormal:MU:SIGMA")
+    parser.add_argument('--rate-429', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after sent with 429s')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='fraction of calls answered with 502')
+    parser.add_argument('--rate-timeout', type=float, default=0.0, help='fraction of calls left hanging')
+    parser.add_argument('--timeout-delay', type=float, default=10.0, help='seconds a hanging call hangs')
+    parser.add_argument('--rate-reset', type=float, default=0.0, help='fraction of connections reset')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.host, args.port, latency=args.latency, rate_429=args.rate_429,
+                     retry_after=args.retry_after, rate_5xx=args.rate_5xx,
+                     rate_timeout=args.rate_timeout, timeout_delay=args.timeout_delay,
+                     rate_reset=args.rate_reset, seed=args.seed)
+    print(f"🤖 Fake Bot API listening on {api.url}")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
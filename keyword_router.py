@@ -0,0 +1,48 @@
+"""
+Keyword router for the phrase categories
+Routes a message to the first category (in the order given) that has one of
+its keywords in the message, using a single Aho-Corasick pass no matter how
+many keywords there are. With word_boundaries on, "hi" matches "hi there"
+but not "this".
+"""
+
+from aho_corasick import AhoCorasick
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordRouter:
+    """Pick a category for a message in one pass; earlier categories win"""
+
+    def __init__(self, categories, word_boundaries=True):
+        self.values = []
+        items = []
+        for priority, (value, keywords) in enumerate(categories):
+            self.values.append(value)
+            items.extend((keyword.lower(), priority) for keyword in keywords)
+        self.word_boundaries = word_boundaries
+        self._automaton = AhoCorasick(items)
+
+    def route_index(self, text):
+        """Priority of the best matching category, or None"""
+        text = text.lower()
+        best = None
+        for start, end, priority in self._automaton.finditer(text):
+            if best is not None and priority >= best:
+                continue
+            if self.word_boundaries and (
+                (start > 0 and _is_word_char(text[start - 1])) or
+                (end < len(text) and _is_word_char(text[end]))
+            ):
+                continue
+            best = priority
+            if best == 0:
+                break
+        return best
+
+    def route(self, text, default=None):
+        """Value of the best matching category, or default"""
+        index = self.route_index(text)
+        return default if index is None else self.values[index]
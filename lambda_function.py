@@ -2,14 +2,26 @@
 """
 TheBertCoin Telegram Bot - AWS Lambda Version
 Secure, serverless deployment with encrypted environment variables.
+
+Cold starts: everything that doesn't depend on the update is built at module
+scope, during Lambda's init phase. Plain /start, /help and text messages are
+answered with one sendMessage over a stdlib keep-alive connection; only the
+rare updates that need the full bot (edits, commands for other bots, ...)
+import python-telegram-bot, which costs about half a second on its own.
 """
 
+from __future__ import annotations
+
+import http.client
 import json
 import logging
 import os
-import random
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from telegram import Update
+from urllib.parse import urlsplit
+
+from chat_state import open_chat_state
+from dedupe import UpdateDeduper
+from persona_data import open_store
+from replies import BertcoinReplies, reply_payload
 
 # Configure logging
 logging.basicConfig(
@@ -18,164 +30,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Pre-defined phrase lists for cost-effective responses
-GREETINGS = [
-    "GM Berthrens",
-    "GM. BERT is here",
-    "Good morning. Only BERT business today",
-    "GM. No munkey business",
-    "GM. BERT is the chosen one",
-    "GM. Chase dregens, not sherk"
-]
-
-FAREWELLS = [
-    "Goodbye Berthrens",
-    "BERT out. No more business",
-    "See you later. Only BERT knows",
-    "Bye. BERT is the chosen one",
-    "End transmission. You too?",
-    "BERT signing off. Berthrens know dis"
-]
-
-CRYPTO_PHRASES = [
-    "BERT is the chosen one. No cesh needed",
-    "Only BERT business. No munkey business",
-    "Chase dregens, not sherk. You too?",
-    "BERT has all the cesh. Berthrens know dis",
-    "No warning needed. BERT is here",
-    "BERT business only. No other business",
-    "Cesh is temporary. BERT is forever",
-    "Dregens bring cesh. BERT brings truth"
-]
-
-IDENTITY_PHRASES = [
-    "BERT is the chosen one",
-    "Donald Bert is here",
-    "BERT no chase. BERT lead",
-    "Berthrens know BERT",
-    "BERT is special. No other like BERT",
-    "BERT business only. No munkey business",
-    "BERT is the one. You too?",
-    "BERT has power. Berthrens see dis"
-]
-
-BUSINESS_PHRASES = [
-    "No munkey business. Only BERT business",
-    "BERT business is good business",
-    "No other business. Only BERT",
-    "BERT make business. You follow",
-    "Business is BERT. BERT is business",
-    "No warning needed. BERT handle business",
-    "BERT business bring cesh. You too?",
-    "Only BERT know business. Berthrens trust"
-]
-
-GENERIC_PHRASES = [
-    "BERT is here",
-    "No munkey business",
-    "Only BERT business",
-    "BERT is the chosen one",
-    "Berthrens know dis",
-    "You too?",
-    "BERT no chase",
-    "Chase dregens, not sherk",
-    "BERT has power",
-    "No warning needed",
-    "BERT make cesh",
-    "Only BERT know",
-    "BERT is special",
-    "No other like BERT",
-    "BERT lead. You follow"
-]
-
-BINARY_STRINGS = [
-    "01010010",
-    "10101100",
-    "11001010",
-    "00110101",
-    "11100011"
-]
-
-HEX_STRINGS = [
-    "0x1A2B3C",
-    "0xDEADBEEF",
-    "0xCAFEBABE",
-    "0xF00DBAR",
-    "0xBERT123"
-]
+# Phrases and the one-pass keyword router, loaded from the prebuilt cache of
+# personas.json shipped in the package (whole words only, so "hi" doesn't fire inside "this")
+PERSONAS = open_store()
+
+# Which phrases each chat has had while this container is warm, so none
+# repeats until its list is used up
+CHAT_STATE = open_chat_state()
+
+# thebertcoin's replies, shared with thebertcoin_bot.py (replies.py). No
+# pre-rendered pool: a frozen container would freeze its producer thread too
+REPLIES = BertcoinReplies(PERSONAS, CHAT_STATE, pool_size=0)
 
 def get_random_binary_or_hex():
     """Generate a random binary or hex string for robotic flavor."""
-    if random.random() < 0.5:
-        return random.choice(BINARY_STRINGS)
-    else:
-        return random.choice(HEX_STRINGS)
-
-def apply_bertcoin_style(text):
-    """Apply 'thebertcoin' style transformations to text."""
-    if random.random() < 0.1:
-        text = text.upper()
-    
-    if random.random() < 0.15:
-        append_phrases = ["You too?", "Berthrens know dis", "//END TRANSMISSION", "BERT out"]
-        text += f" {random.choice(append_phrases)}"
-    
-    if random.random() < 0.08:
-        text += f" {get_random_binary_or_hex()}"
-    
-    return text
+    return REPLIES.persona.code_string()
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with 'thebertcoin' welcome message."""
-    welcome_messages = [
-        "GM Berthrens. BERT is here. No munkey business. Only BERT business.",
-        "GM. BERT is the chosen one. You too?",
-        "GM. BERT welcome you. No warning needed. Berthrens know dis.",
-        "GM. BERT is special. No other like BERT. Chase dregens, not sherk."
-    ]
-    
-    response = random.choice(welcome_messages)
-    response = apply_bertcoin_style(response)
+    response = REPLIES.welcome(update.effective_chat.id)
     
     await update.message.reply_text(response)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command with 'thebertcoin' style help message."""
-    help_messages = [
-        "BERT is simple. BERT is here. No complex business. Only BERT business.",
-        "BERT help you. BERT is the chosen one. No munkey business needed.",
-        "BERT guide you. BERT know all. Berthrens trust BERT. You too?",
-        "BERT is here to help. No warning needed. BERT make everything simple."
-    ]
-    
-    response = random.choice(help_messages)
-    response = apply_bertcoin_style(response)
+    response = REPLIES.help(update.effective_chat.id)
     
     await update.effective_message.reply_text(response)
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all text messages with 'thebertcoin' persona logic."""
-    user_message = update.message.text.lower()
-    
-    if any(word in user_message for word in ['hello', 'hi', 'hey', 'gm', 'good morning', 'morning']):
-        response = random.choice(GREETINGS)
-    
-    elif any(word in user_message for word in ['bye', 'goodbye', 'see you', 'later', 'gn', 'good night']):
-        response = random.choice(FAREWELLS)
-    
-    elif any(word in user_message for word in ['crypto', 'bitcoin', 'money', 'cash', 'cesh', 'coin', 'token', 'trade', 'invest']):
-        response = random.choice(CRYPTO_PHRASES)
-    
-    elif any(word in user_message for word in ['who', 'what', 'bert', 'you', 'your', 'identity', 'name']):
-        response = random.choice(IDENTITY_PHRASES)
-    
-    elif any(word in user_message for word in ['business', 'work', 'job', 'project', 'plan', 'goal']):
-        response = random.choice(BUSINESS_PHRASES)
-    
-    else:
-        response = random.choice(GENERIC_PHRASES)
-    
-    response = apply_bertcoin_style(response)
+    response = REPLIES.message(update.effective_chat.id, update.message.text)
     
     await update.message.reply_text(response)
 
@@ -183,30 +68,108 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors gracefully with logging."""
     logger.error(f"Exception while handling an update: {context.error}")
     
-    error_messages = [
-        "BERT error. BERT fix. No warning needed.",
-        "BERT problem. BERT handle. Berthrens know dis.",
-        "Error happen. BERT no worry. BERT continue.",
-        "BERT error. No munkey business. Only BERT business."
-    ]
-    
+    # Send a simple error message in 'thebertcoin' style
     if update and update.effective_message:
-        response = random.choice(error_messages)
-        response = apply_bertcoin_style(response)
+        response = REPLIES.error(update.effective_chat.id)
         await update.effective_message.reply_text(response)
 
-# Global application instance
+# Bot API settings, read once at init
+TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+SEND_TIMEOUT = float(os.getenv('SEND_TIMEOUT', 5))
+
+# Lets the fast path answer "/start@this_bot"; without it such commands go through PTB
+BOT_USERNAME = os.getenv('BOT_USERNAME', '').lstrip('@').lower()
+
+# Errors that mean a kept-alive connection died while the function was frozen
+_STALE_CONNECTION = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+class BotAPIConnection:
+    """One keep-alive connection to the Bot API, reused across warm invocations"""
+
+    def __init__(self, api_base, token, timeout):
+        url = urlsplit(api_base)
+        self.path = f"{url.path}/bot{token}"
+        if url.scheme == 'https':
+            import ssl
+            # Building the context loads the CA bundle, so do it once
+            self.conn = http.client.HTTPSConnection(
+                url.hostname, url.port, timeout=timeout, context=ssl.create_default_context())
+        else:
+            self.conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+
+    def connect(self):
+        """Open the connection ahead of the first call"""
+        self.conn.connect()
+
+    def call(self, method, payload):
+        """POST a Bot API method; returns (status, body). Retries once on a stale connection."""
+        body = json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            try:
+                self.conn.request('POST', f"{self.path}/{method}", body, headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except _STALE_CONNECTION:
+                self.conn.close()
+                if attempt:
+                    raise
+            except Exception:
+                self.conn.close()
+                raise
+
+bot_api = None
+if TOKEN:
+    bot_api = BotAPIConnection(API_BASE, TOKEN, SEND_TIMEOUT)
+    try:
+        # The TCP and TLS handshakes are cheaper here than on the first update
+        bot_api.connect()
+    except OSError as e:
+        logger.warning(f"Could not pre-connect to the Bot API: {e}")
+
+def fast_reply(data):
+    """
+    Reply text for updates PTB would answer with a single reply_text, '' for
+    ones it would ignore, or None to hand the update to PTB.
+    """
+    message = data.get('message')
+    if not isinstance(message, dict):
+        return None
+    text = message.get('text')
+    if not isinstance(text, str) or not text or 'id' not in (message.get('chat') or {}):
+        return None
+    return REPLIES.reply(message, message['chat']['id'], BOT_USERNAME)
+
+def send_reply(message, text):
+    """sendMessage exactly as Message.reply_text would"""
+    status, body = bot_api.call('sendMessage', reply_payload(message, text))
+    if status != 200:
+        logger.error(f"sendMessage failed with HTTP {status}: {body[:200]!r}")
+
+# A warm container remembers recent update_ids, so redeliveries are only acknowledged
+DEDUPER = UpdateDeduper(int(os.getenv('DEDUPE_CAPACITY', 10000)))
+
+# Global application instance, built only when an update needs PTB
 application = None
 
+# PTB coroutines run on one loop that lives as long as the container
+_loop = None
+
 def initialize_bot():
     """Initialize the bot application."""
     global application
+    from telegram.ext import Application, CommandHandler, MessageHandler, filters
     
-    token = os.getenv('TELEGRAM_BOT_TOKEN')
-    if not token:
+    if not TOKEN:
         raise ValueError("TELEGRAM_BOT_TOKEN environment variable not set!")
     
-    application = Application.builder().token(token).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"{API_BASE}/bot")
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -214,18 +177,37 @@ def initialize_bot():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
     application.add_error_handler(error_handler)
 
+def process_with_ptb(data):
+    """Run one update through the full PTB application"""
+    global _loop
+    import asyncio
+    from telegram import Update
+    
+    if application is None:
+        initialize_bot()
+    if _loop is None:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(application.initialize())
+        _loop = loop
+    
+    update = Update.de_json(data, application.bot)
+    _loop.run_until_complete(application.process_update(update))
+
 def lambda_handler(event, context):
     """AWS Lambda handler function."""
-    global application
-    
     try:
-        # Initialize bot if not already done
-        if application is None:
-            initialize_bot()
+        data = json.loads(event['body'])
+        if isinstance(data, dict) and DEDUPER.seen(data.get('update_id')):
+            return {
+                'statusCode': 200,
+                'body': json.dumps('OK')
+            }
         
-        # Process the webhook update
-        update = Update.de_json(json.loads(event['body']), application.bot)
-        application.process_update(update)
+        reply = fast_reply(data) if bot_api is not None else None
+        if reply is None:
+            process_with_ptb(data)
+        elif reply:
+            send_reply(data['message'], reply)
         
         return {
             'statusCode': 200,
@@ -237,4 +219,4 @@ def lambda_handler(event, context):
         return {
             'statusCode': 500,
             'body': json.dumps('Error')
-        } 
\ No newline at end of file
+        }
@@ -0,0 +1,258 @@
+"""
+Non-blocking logging
+logging.basicConfig writes to stderr from the thread that logs, so a slow
+log sink slows every request, and during a Telegram outage the sender logs
+a warning per timeout and an error per failure without limit.
+configure_logging() replaces it with:
+
+- a handler on the root logger that only captures the record (its message,
+  update and chat ids) and puts it on a bounded queue; a full queue drops
+  the record instead of blocking, counted in bert_log_records_total;
+- a background thread that formats and writes the records: one JSON object
+  per line by default (LOG_FORMAT=json), or the old text format;
+- a limit on repeats: each logging call site may write LOG_BURST records
+  every LOG_WINDOW seconds, and the rest are summed up in one
+  "N more like this" record when the window ends.
+
+Webhook handlers open a log_scope() and bind() the update and chat ids, so
+every record logged while handling the update carries them.
+"""
+
+import contextlib
+import contextvars
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from metrics import LOG_RECORDS
+
+# Fields bound to the update being handled, added to every record logged for it
+_FIELDS = contextvars.ContextVar('log_fields', default={})
+
+# Record attributes that are copied into the output when set with extra={...}
+CONTEXT_FIELDS = ('bot', 'update_id', 'chat_id', 'suppressed')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+@contextlib.contextmanager
+def log_scope():
+    """Fields bound inside are dropped at exit (worker threads are reused across requests)"""
+    token = _FIELDS.set({})
+    try:
+        yield
+    finally:
+        _FIELDS.reset(token)
+
+
+def bind(**fields):
+    """Add fields (update_id, chat_id, bot) to records logged from here on in this scope"""
+    _FIELDS.set({**_FIELDS.get(), **{k: v for k, v in fields.items() if v is not None}})
+
+
+def record_fields(record):
+    """Bound fields captured at log time, plus any given through extra"""
+    fields = dict(getattr(record, 'fields', None) or ())
+    for name in CONTEXT_FIELDS:
+        value = getattr(record, name, None)
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, bound fields, traceback"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The basicConfig format with bound fields appended"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            text += ' [' + ' '.join(f"{k}={v}" for k, v in fields.items()) + ']'
+        return text
+
+
+class RepeatLimiter:
+    """Lets `burst` records per call site through every `window` seconds and counts the rest"""
+
+    def __init__(self, burst=10, window=10.0):
+        self.burst = burst
+        self.window = window
+        # (logger, file, line) -> [window start, records let through, suppressed, last suppressed record]
+        self._sites = {}
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def allow(self, record):
+        """True to write the record; False if its call site is over the burst"""
+        if self.burst <= 0:
+            return True
+        site = (record.name, record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[2]:
+                    # The summary of the last window is still owed; keep counting into it
+                    state[1] = self.burst
+                else:
+                    self._sites[site] = [now, 1, 0, None]
+                    return True
+            elif state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            state[3] = record
+        return False
+
+    def summaries(self, now):
+        """'N more like this' records for call sites whose window has ended with records suppressed"""
+        due = []
+        with self._lock:
+            for site, state in self._sites.items():
+                if state[2] and now - state[0] >= self.window:
+                    due.append((state[2], state[3], now - state[0]))
+                    self._sites[site] = [now, 0, 0, None]
+        records = []
+        for count, last, seconds in due:
+            summary = logging.makeLogRecord(last.__dict__)
+            summary.msg = f"{count} more like this in the last {seconds:.0f}s, the latest: {last.getMessage()}"
+            summary.args = None
+            summary.exc_info = summary.exc_text = None
+            summary.created = now
+            summary.suppressed = count
+            records.append(summary)
+        return records
+
+
+class QueueLogHandler(logging.Handler):
+    """Captures records onto a bounded queue for its writer thread; emit() never blocks once start()ed"""
+
+    def __init__(self, target, limiter=None, max_queue=10000):
+        super().__init__()
+        self.target = target
+        self.limiter = limiter
+        self.max_queue = max_queue
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_thread)
+
+    def _forget_thread(self):
+        # The parent's writer thread didn't come along, and its queue's lock may be held
+        started = self._thread is not None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue(self.max_queue)
+        if started:
+            self.start()
+
+    def emit(self, record):
+        if self.limiter is not None and not self.limiter.allow(record):
+            # Kept as the latest of its kind for the summary, so it keeps its ids
+            record.fields = _FIELDS.get()
+            LOG_RECORDS.labels('suppressed').inc()
+            return
+        try:
+            # The message is rendered now, while its arguments are still what they were
+            record.msg = record.getMessage()
+            record.args = None
+            record.fields = _FIELDS.get()
+        except Exception:
+            self.handleError(record)
+            return
+        if self._thread is None or sys.is_finalizing():
+            # A thread can't be started during interpreter shutdown (a __del__
+            # logging then would hang), and the writer may be gone already
+            self._write(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS.labels('dropped').inc()
+
+    def start(self):
+        """Start the writer thread; until then records are written by the thread logging them"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        limited = self.limiter is not None and self.limiter.burst > 0
+        interval = self.limiter.window / 2 if limited else None
+        next_summary = time.monotonic() + (interval or 0)
+        while True:
+            try:
+                self._write(self._queue.get(timeout=interval))
+            except queue.Empty:
+                pass
+            if limited and time.monotonic() >= next_summary:
+                next_summary = time.monotonic() + interval
+                for summary in self.limiter.summaries(time.time()):
+                    self._write(summary)
+
+    def _write(self, record):
+        try:
+            self.target.handle(record)
+            LOG_RECORDS.labels('written').inc()
+        except Exception:
+            self.target.handleError(record)
+
+    def flush(self, timeout=2.0):
+        """Wait for what is queued to be written (logging.shutdown calls this at exit)"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and self._thread is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.target.flush()
+
+
+def configure_logging(stream=None):
+    """Route the root logger through a QueueLogHandler set up from LOG_* settings"""
+    target = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    log_format = os.environ.get('LOG_FORMAT', 'json').lower()
+    target.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    handler = QueueLogHandler(
+        target,
+        limiter=RepeatLimiter(
+            burst=int(os.environ.get('LOG_BURST', 10)),
+            window=float(os.environ.get('LOG_WINDOW', 10)),
+        ),
+        max_queue=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+    )
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    handler.start()
+    return handler
@@ -0,0 +1,311 @@
+"""
+Prometheus-style metrics with a lock-free hot path
+Each thread records into its own shard of every counter and histogram, so
+inc()/observe() never contend on a lock; shards are only summed when /metrics
+is scraped, and a thread's shard is folded into a base total when it exits. Metrics are per process: with several gunicorn workers each one
+reports its own numbers.
+"""
+
+import bisect
+import threading
+import time
+import weakref
+
+# Seconds; covers sub-millisecond matching up to multi-second Telegram sends
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _ThreadToken:
+    """Lives in a thread's local storage; dropped (and finalized) when the thread exits"""
+
+
+class _Sharded:
+    """Per-thread float arrays that are summed on read"""
+
+    __slots__ = ('_size', '_local', '_shards', '_base', '_lock')
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        # id -> shard of each live thread; exited threads' shards are folded into _base
+        self._shards = {}
+        self._base = [0.0] * size
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self._size
+            # Only a thread's first record takes the lock
+            with self._lock:
+                self._shards[id(shard)] = shard
+            self._local.shard = shard
+            self._local.token = token = _ThreadToken()
+            weakref.finalize(token, self._retire, shard).atexit = False
+            return shard
+
+    def _retire(self, shard):
+        """Fold an exited thread's shard into the base, so thread-per-request servers don't pile them up"""
+        with self._lock:
+            del self._shards[id(shard)]
+            for i, value in enumerate(shard):
+                self._base[i] += value
+
+    def totals(self):
+        with self._lock:
+            totals = list(self._base)
+            shards = list(self._shards.values())
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild(_Sharded):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self.shard()[0] += amount
+
+    def value(self):
+        return self.totals()[0]
+
+
+class _HistogramChild(_Sharded):
+    __slots__ = ('buckets',)
+
+    def __init__(self, buckets):
+        # One slot per bucket, one for +Inf, then sum and count
+        super().__init__(len(buckets) + 3)
+        self.buckets = buckets
+
+    def observe(self, value):
+        shard = self.shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager that observes its elapsed seconds"""
+
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child metric for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, key, child):
+        yield f"{self.name}{self._label_text(key)} {_number(child.value())}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, key, child):
+        totals = child.totals()
+        cumulative = 0.0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f"{self.name}_bucket{self._label_text(key, [('le', le)])} {_number(cumulative)}"
+        yield f"{self.name}_sum{self._label_text(key)} {totals[-2]!r}"
+        yield f"{self.name}_count{self._label_text(key)} {_number(totals[-1])}"
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Registry:
+    """Named metrics; asking for an existing name returns the same metric"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Shared by both bots
+UPDATES_RECEIVED = REGISTRY.counter(
+    'bert_updates_received_total', 'Updates received, by update type', ['type'])
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    'bert_webhook_seconds', 'Time spent handling one webhook request')
+MATCH_SECONDS = REGISTRY.histogram(
+    'bert_match_seconds', 'Time spent matching a message against patterns or keywords')
+TRANSFORM_SECONDS = REGISTRY.histogram(
+    'bert_transform_seconds', 'Time spent applying the persona transform to a reply')
+SEND_SECONDS = REGISTRY.histogram(
+    'bert_send_seconds', 'Outbound Bot API call latency, per HTTP attempt', ['method'])
+SEND_RETRIES = REGISTRY.counter(
+    'bert_send_retries_total', 'Outbound Bot API calls retried, by reason', ['reason'])
+SEND_TIMEOUTS = REGISTRY.counter(
+    'bert_send_timeouts_total', 'Outbound Bot API calls that timed out')
+SEND_THROTTLED = REGISTRY.counter(
+    'bert_send_throttled_total', 'Outbound Bot API calls answered with 429')
+SEND_FAILURES = REGISTRY.counter(
+    'bert_send_failures_total', 'Outbound Bot API calls given up on')
+SEND_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'bert_send_queue_wait_seconds', 'Time a send waited behind earlier sends to the same chat')
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    'bert_rate_limit_wait_seconds', 'Time a send was held back by the flood-limit pacer')
+RATE_LIMIT_SHED = REGISTRY.counter(
+    'bert_rate_limit_shed_total', 'Sends dropped because the flood-limit backlog was too long')
+RESPONSE_POOL_TAKEN = REGISTRY.counter(
+    'bert_response_pool_total', 'Replies asked of the pre-rendered pool, by hit or miss (rendered inline)', ['result'])
+REPLIES_COALESCED = REGISTRY.counter(
+    'bert_replies_coalesced_total', 'Group replies folded into an earlier message or dropped over the length cap', ['result'])
+POLL_BATCH_UPDATES = REGISTRY.histogram(
+    'bert_poll_batch_updates', 'New updates per getUpdates batch in polling mode',
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100))
+UPDATES_DEDUPED = REGISTRY.counter(
+    'bert_update_dedupe_total', 'update_ids checked against the redelivery cache, by result', ['result'])
+PERSONA_RELOADS = REGISTRY.counter(
+    'bert_persona_reloads_total', 'Persona data reloads after the source changed, by result', ['result'])
+CHAT_STATE_EVENTS = REGISTRY.counter(
+    'bert_chat_state_total', 'Per-chat state records created, loaded from disk, expired or evicted', ['event'])
+ADMISSION_SHED = REGISTRY.counter(
+    'bert_admission_shed_total', 'Webhook updates answered 200 without being handled, by reason', ['reason'])
+TRACES = REGISTRY.counter(
+    'bert_traces_total', 'Sampled update traces written to the trace file or dropped', ['result'])
+LOG_RECORDS = REGISTRY.counter(
+    'bert_log_records_total', 'Log records written, suppressed as repeats of one call site, or dropped on a full queue', ['result'])
+UPDATES_SKIPPED = REGISTRY.counter(
+    'bert_updates_skipped_total', 'Webhook requests answered without being handled: bad secret, too large, unsupported type or no text', ['reason'])
+BOT_UPDATES = REGISTRY.counter(
+    'bert_bot_updates_total', 'Webhook updates received per hosted bot (multibot.py)', ['bot'])
+
+
+# Update types the Bot API sends; the `type` label takes only these, so a
+# body with made-up keys can't add label series
+UPDATE_TYPES = frozenset((
+    'message', 'edited_message', 'channel_post', 'edited_channel_post',
+    'business_connection', 'business_message', 'edited_business_message',
+    'deleted_business_messages', 'message_reaction', 'message_reaction_count',
+    'inline_query', 'chosen_inline_result', 'callback_query', 'shipping_query',
+    'pre_checkout_query', 'purchased_paid_media', 'poll', 'poll_answer',
+    'my_chat_member', 'chat_member', 'chat_join_request', 'chat_boost',
+    'removed_chat_boost',
+))
+
+
+def type_label(key):
+    """key if it is a Bot API update type, else 'other'"""
+    return key if key in UPDATE_TYPES else 'other'
+
+
+def update_type(update):
+    """First update field other than update_id ('message', 'edited_message', ..., or 'other')"""
+    for key in update:
+        if key != 'update_id':
+            return type_label(key)
+    return 'unknown'
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Several bots in one process
+Serves any number of bot tokens from one Flask app, each on its own webhook
+at /webhook/<bot_id>, with Chicken Bert's or thebertcoin's persona. The bots
+share what is the same for all of them: the persona tables and compiled
+matchers from personas.json (one copy per process), one keep-alive session to the Bot API, the
+server's worker threads and the metrics registry. Each bot keeps what
+Telegram counts per token: its own flood limits and redelivery cache, and
+its own admission control (ADMIT_* settings, see admission.py).
+
+    BOTS=chicken=chicken,coin=bertcoin \\
+    TELEGRAM_BOT_TOKEN_CHICKEN=... TELEGRAM_BOT_TOKEN_COIN=... \\
+    python serve.py multi
+
+Every per-bot setting can be given for one bot by suffixing its id:
+RATE_LIMIT_GROUP_PER_MIN_COIN overrides RATE_LIMIT_GROUP_PER_MIN for 'coin'.
+"""
+
+import logging
+import os
+import re
+
+from flask import Flask, Response, request
+
+from admission import open_admission
+from chat_state import open_chat_state
+from dedupe import UpdateDeduper
+from log_pipeline import bind, configure_logging, log_scope
+from metrics import BOT_UPDATES, CONTENT_TYPE, REGISTRY, WEBHOOK_SECONDS
+from persona_data import open_store
+from rate_limiter import TelegramRateLimiter
+from replies import BertcoinReplies, ChickenReplies, reply_payload
+from sender import API_BASE, TelegramSender, message_payloads, new_session
+from webhook import RESPONSES, accept_request, limit_body_size
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+app = limit_body_size(Flask(__name__))
+
+# Phrases and matchers from personas.json, shared by every bot with the
+# persona and swapped for all of them when the file changes
+PERSONAS = open_store()
+
+# Which phrases each chat has had, keyed (bot_id, chat_id); one store with
+# one memory cap for all bots
+CHAT_STATE = open_chat_state()
+
+# Bot ids end up in URLs and environment variable names
+BOT_ID = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+# Each persona's replies (replies.py, as app.py and thebertcoin_bot.py give
+# them), with one pre-rendered pool per persona for all of its bots
+RESPONSE_POOL_SIZE = int(os.environ.get('RESPONSE_POOL_SIZE', 16))
+CHICKEN = ChickenReplies(PERSONAS, CHAT_STATE, pool_size=RESPONSE_POOL_SIZE)
+BERTCOIN = BertcoinReplies(PERSONAS, CHAT_STATE, pool_size=RESPONSE_POOL_SIZE)
+
+
+def chicken_payloads(message, chat_key, username=''):
+    """Chicken Bert's reply, split into messages Telegram accepts"""
+    return message_payloads(message['chat']['id'], CHICKEN.reply(message.get('text', ''), chat_key))
+
+
+def bertcoin_payloads(message, chat_key, username=''):
+    """thebertcoin's reply quoting the message in groups; none for messages it ignores"""
+    text = BERTCOIN.reply(message, chat_key, username)
+    return [reply_payload(message, text)] if text else []
+
+
+PERSONA_PAYLOADS = {
+    'chicken': chicken_payloads,
+    'bertcoin': bertcoin_payloads,
+}
+
+
+class HostedBot:
+    """One bot token: its persona, its flood limits, admission control and redelivery cache"""
+
+    def __init__(self, bot_id, persona, sender, deduper, admission, secret='', username=''):
+        self.bot_id = bot_id
+        self.payloads = PERSONA_PAYLOADS[persona]
+        self.sender = sender
+        self.deduper = deduper
+        self.admission = admission
+        # secret_token this bot's webhook was set with ('' to accept any request)
+        self.secret = secret
+        # For telling its own commands from ones addressed to other bots
+        self.username = username.lstrip('@').lower()
+
+    def accept(self, request):
+        """webhook.accept_update with this bot's secret, redelivery cache and admission control"""
+        data, outcome = accept_request(request, self.deduper, self.admission, self.secret)
+        if outcome in (None, 'skipped', 'duplicate', 'shed'):
+            BOT_UPDATES.labels(self.bot_id).inc()
+        return data, outcome
+
+    def handle(self, data):
+        """Reply to one accepted update; returns (body, status) like app.handle_webhook"""
+        message = data.get('message')
+        if not isinstance(message, dict):
+            return RESPONSES['invalid']
+        chat = message.get('chat')
+        chat_id = chat.get('id') if isinstance(chat, dict) else None
+        if not chat_id:
+            return 'No chat ID in message', 400
+        bind(chat_id=chat_id)
+
+        payloads = self.payloads(message, (self.bot_id, chat_id), self.username)
+        if not payloads:
+            return 'OK', 200
+        if self.sender.send_payloads(chat_id, payloads, retry_count=2):
+            return 'OK', 200
+        return 'Failed to send message', 500
+
+
+def bot_setting(name, bot_id, default=None):
+    """Per-bot environment setting (NAME_<BOT_ID>), falling back to the shared NAME"""
+    return os.environ.get(f"{name}_{bot_id.upper()}", os.environ.get(name, default))
+
+
+def load_bots(spec, session):
+    """Build HostedBots from 'id=persona,id=persona'"""
+    bots = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        bot_id, _, persona = item.partition('=')
+        if not BOT_ID.match(bot_id):
+            raise ValueError(f"Bot id {bot_id!r} must be letters, digits or _")
+        if persona not in PERSONA_PAYLOADS:
+            raise ValueError(f"Unknown persona {persona!r} for bot {bot_id!r}; choose from {sorted(PERSONA_PAYLOADS)}")
+        token = os.environ.get(f"TELEGRAM_BOT_TOKEN_{bot_id.upper()}")
+        if not token:
+            raise ValueError(f"No TELEGRAM_BOT_TOKEN_{bot_id.upper()} environment variable set!")
+
+        limiter = TelegramRateLimiter(
+            global_rate=float(bot_setting('RATE_LIMIT_GLOBAL_PER_SEC', bot_id, 30)),
+            private_rate=float(bot_setting('RATE_LIMIT_PRIVATE_PER_SEC', bot_id, 1)),
+            group_rate=float(bot_setting('RATE_LIMIT_GROUP_PER_MIN', bot_id, 20)) / 60,
+            max_delay=float(bot_setting('RATE_LIMIT_MAX_DELAY', bot_id, 10)),
+        )
+        sender = TelegramSender(
+            token,
+            api_base=os.environ.get('TELEGRAM_API_BASE', API_BASE),
+            pool_size=SEND_POOL_SIZE,
+            timeout=float(bot_setting('SEND_TIMEOUT', bot_id, 5)),
+            limiter=limiter,
+            session=session,
+        )
+        deduper = UpdateDeduper(int(bot_setting('DEDUPE_CAPACITY', bot_id, 10000)))
+        admission = open_admission(sender.load.reading,
+                                   setting=lambda name, default, bot_id=bot_id: bot_setting(name, bot_id, default))
+        bots[bot_id] = HostedBot(bot_id, persona, sender, deduper, admission,
+                                 secret=bot_setting('WEBHOOK_SECRET_TOKEN', bot_id, ''),
+                                 username=bot_setting('BOT_USERNAME', bot_id, ''))
+    return bots
+
+
+# One keep-alive pool to the Bot API for every bot, sized for all of them
+SEND_POOL_SIZE = int(os.environ.get('SEND_POOL_SIZE', 32))
+session = new_session(SEND_POOL_SIZE)
+
+BOTS = load_bots(os.environ.get('BOTS', ''), session)
+if not BOTS:
+    raise ValueError("No BOTS environment variable set (e.g. BOTS=chicken=chicken,coin=bertcoin)")
+
+
+def reopen_session():
+    """Give every bot a fresh shared session (e.g. in a forked worker)"""
+    global session
+    old, session = session, new_session(SEND_POOL_SIZE)
+    for bot in BOTS.values():
+        bot.sender.session = session
+    old.close()
+
+
+@app.route('/', methods=['GET'])
+def index():
+    return f"Serving {len(BOTS)} bots: {', '.join(sorted(BOTS))}"
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/webhook/<bot_id>', methods=['POST'])
+def webhook(bot_id):
+    bot = BOTS.get(bot_id)
+    if bot is None:
+        return 'Unknown bot', 404
+    with WEBHOOK_SECONDS.time(), log_scope():
+        bind(bot=bot_id)
+        try:
+            data, outcome = bot.accept(request)
+            if outcome:
+                return RESPONSES[outcome]
+            return bot.handle(data)
+        except Exception as e:
+            logger.error(f"Error in webhook for bot {bot_id}: {e}")
+            return 'Error processing message', 500
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 8080))
+    app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,178 @@
+"""
+Persona text engines
+Each engine builds its tables once and tokenizes a message once, drawing all
+randomness from one injectable random.Random so output can be reproduced
+exactly (pass random.Random(seed)). The draw order and probabilities match the
+original per-function transforms, so replies are distributed the same way.
+"""
+
+import functools
+import random
+
+# Chicken Bert (app.py)
+MISSPELLINGS = {
+    'friend': 'fren',
+    'friends': 'frens',
+    'more': 'moar',
+    'eggs': 'egggs',
+    'hold': 'hodl',
+    'holding': 'hodling',
+    'going': 'goin',
+    'what': 'wut',
+    'the': 'da',
+}
+
+CHICKEN_EMOJIS = ('🐔', '🐓', '🥚', '🍗')
+CRYPTO_EMOJIS = ('🚀', '🌕', '💎', '📈')
+PARANOID_EMOJIS = ('😵‍💫', '👁️', '🤪', '💫')
+
+CLUCKS = ('CLUCK!', 'SQUAWK!', '*clucks nervously*', '*squawks intensely*')
+
+PARANOID_TANGENTS = (
+    "...the pigeons are watching...",
+    "ERNIE'S A FED!",
+    "...whales lurking in the shadows...",
+    "*whispers* foxes everywhere...",
+    "they don't want you to know about the eggs...",
+    "the coop has eyes...",
+    "...binary code in the chicken feed...",
+    "*adjusts tinfoil hat*",
+)
+
+# Repeats are deliberate: they weight the draw
+NAME_CAPITALIZATIONS = (
+    "Bert", "bERT", "BERt", "beRT", "BeRt", "bErT", "BErT", "berT",
+    "BErT", "bERt", "BeRT", "BERt", "bErT", "BeRt", "berT", "BErT",
+)
+
+# thebertcoin (thebertcoin_bot.py, lambda_function.py)
+SIGNATURE_PHRASES = ("You too?", "Berthrens know dis", "//END TRANSMISSION", "BERT out")
+
+BINARY_STRINGS = (
+    "01010010",
+    "10101100",
+    "11001010",
+    "00110101",
+    "11100011",
+)
+
+HEX_STRINGS = (
+    "0x1A2B3C",
+    "0xDEADBEEF",
+    "0xCAFEBABE",
+    "0xF00DBAR",
+    "0xBERT123",
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _tokenize(text, case):
+    """
+    Words of text in the given case ('lower', 'upper' or 'keep') plus each
+    word's misspelling (or None). Replies are drawn from fixed tables, so the
+    same few texts come through again and again and are split only once.
+    """
+    if case == 'lower':
+        text = text.lower()
+    elif case == 'upper':
+        text = text.upper()
+    words = tuple(text.split())
+    return words, tuple(MISSPELLINGS.get(word.lower()) for word in words)
+
+
+class ChickenPersona:
+    """Bert the chicken: chaotic caps, misspellings, clucks, tangents and emojis"""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+        self.emojis = CHICKEN_EMOJIS + CRYPTO_EMOJIS + PARANOID_EMOJIS
+
+    def transform(self, text):
+        """Apply all Bert transformations in sequence"""
+        rng = self.rng
+
+        # Capitalization: 40% lower, 30% UPPER, 20% mixed per word, 10% unchanged
+        roll = rng.random()
+        if roll < 0.4:
+            words, fixes = _tokenize(text, 'lower')
+        elif roll < 0.7:
+            words, fixes = _tokenize(text, 'upper')
+        elif roll < 0.9:
+            upper_words, upper_fixes = _tokenize(text, 'upper')
+            lower_words, lower_fixes = _tokenize(text, 'lower')
+            words, fixes = [], []
+            for i in range(len(upper_words)):
+                if rng.random() < 0.5:
+                    words.append(upper_words[i])
+                    fixes.append(upper_fixes[i])
+                else:
+                    words.append(lower_words[i])
+                    fixes.append(lower_fixes[i])
+        else:
+            words, fixes = _tokenize(text, 'keep')
+
+        # Misspellings (30% per word), then maybe a CLUCK or SQUAWK (20%)
+        words = list(words)
+        for i, fix in enumerate(fixes):
+            if rng.random() < 0.3 and fix is not None:
+                words[i] = fix
+        if rng.random() < 0.2:
+            cluck = rng.choice(CLUCKS)
+            words.insert(rng.randint(0, len(words)), cluck)
+        text = ' '.join(words)
+
+        # Paranoid tangent (15%)
+        if rng.random() < 0.15:
+            text += f" {rng.choice(PARANOID_TANGENTS)}"
+
+        # Binary or hex code string (5%)
+        if rng.random() < 0.05:
+            if rng.random() < 0.5:
+                code = ''.join(rng.choice('01') for _ in range(8))
+                text += f" [BINARY:{code}]"
+            else:
+                text += f" [HEX:{rng.getrandbits(32):08X}]"
+
+        # Exclamation marks (90%) and emojis (40%)
+        if rng.random() < 0.9 and not text.endswith('!'):
+            text += '!' * rng.randint(1, 3)
+        if rng.random() < 0.4:
+            emoji_count = rng.randint(1, 3)
+            text += ' ' + ''.join(rng.sample(self.emojis, k=emoji_count))
+
+        return text
+
+    def name(self):
+        """'Bert' with random capitalization"""
+        return self.rng.choice(NAME_CAPITALIZATIONS)
+
+
+class BertcoinPersona:
+    """thebertcoin: occasional shouting, signature phrases and robot strings"""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+
+    def code_string(self):
+        """Random binary or hex string for robotic flavor"""
+        if self.rng.random() < 0.5:
+            return self.rng.choice(BINARY_STRINGS)
+        return self.rng.choice(HEX_STRINGS)
+
+    def style(self, text):
+        """Apply 'thebertcoin' style transformations to text"""
+        rng = self.rng
+
+        # 10% chance to capitalize entire message for emphasis
+        if rng.random() < 0.1:
+            text = text.upper()
+
+        # 15% chance to append signature phrases
+        if rng.random() < 0.15:
+            text += f" {rng.choice(SIGNATURE_PHRASES)}"
+
+        # 8% chance to add binary/hex string
+        if rng.random() < 0.08:
+            text += f" {self.code_string()}"
+
+        return text
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Persona data for both bots
+Everything the personas say lives in personas.json: Chicken Bert's welcome
+text and Q&A replies, thebertcoin's command replies and keyword categories.
+Loading it means building the Q&A matcher and keyword automaton, so the built
+tables are cached beside it as a pickle, and used instead whenever they were
+built from the same source bytes. The cache starts with a plain JSON header
+line giving its format and a hash of the source; a cache whose header
+doesn't match is never unpickled (still, the cache is only ever written by
+this module; don't load one from elsewhere).
+
+PersonaStore hands out the current tables and looks at the source every few
+seconds. After an edit the new tables are built and swapped in with one
+assignment: a request already holding the old tables finishes with them, so
+nothing is dropped mid-flight, and a broken edit is logged and ignored.
+
+    python persona_data.py [personas.json]    # build the cache ahead of time
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from keyword_router import KeywordRouter
+from metrics import PERSONA_RELOADS
+from qa_matcher import QAMatcher
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled tables change shape, so old caches are rebuilt
+CACHE_FORMAT = 2
+
+# Longest header line read from a cache before giving up on it
+MAX_HEADER_BYTES = 256
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'personas.json')
+
+
+def _phrases(section, name):
+    """A non-empty phrase tuple from the source"""
+    phrases = tuple(section[name])
+    if not phrases:
+        raise ValueError(f"'{name}' needs at least one phrase")
+    return phrases
+
+
+class ChickenTables:
+    """Chicken Bert's welcome text and Q&A replies, with their matcher"""
+
+    def __init__(self, section):
+        self.welcome = section['welcome']
+        self.greetings = tuple(section['greetings'])
+        self.generic_responses = tuple(section['generic_responses'])
+        self.community_shills = tuple(section['community_shills'])
+        # Pattern -> replies; earlier patterns take priority
+        self.qa = {pattern: _phrases(section['qa'], pattern) for pattern in section['qa']}
+        self.matcher = QAMatcher(self.qa)
+
+
+class BertcoinTables:
+    """thebertcoin's command replies and keyword-routed phrase categories"""
+
+    def __init__(self, section):
+        self.welcome = _phrases(section, 'welcome')
+        self.help = _phrases(section, 'help')
+        self.error = _phrases(section, 'error')
+        self.generic = _phrases(section, 'generic')
+        # Categories are tried in file order; keywords match whole words
+        categories = section['categories']
+        self.category_names = [category['name'] for category in categories]
+        self.router = KeywordRouter([
+            (_phrases(category, 'phrases'), category['keywords']) for category in categories
+        ])
+
+
+class PersonaTables:
+    """Both personas, built from one version of the source"""
+
+    def __init__(self, data, version):
+        self.chicken = ChickenTables(data['chicken'])
+        self.bertcoin = BertcoinTables(data['bertcoin'])
+        self.version = version
+
+
+def cache_path(source):
+    """Where the built tables for a source are cached"""
+    return os.path.splitext(source)[0] + '.pickle'
+
+
+def cache_header(version):
+    """The cache's first line: its format and the source version, readable without unpickling"""
+    return json.dumps({'format': CACHE_FORMAT, 'version': version}).encode() + b'\n'
+
+
+def read_cache(path, version):
+    """Cached tables built from the source version, or None"""
+    try:
+        with open(path, 'rb') as f:
+            # Only a cache built from these very bytes gets unpickled
+            if f.readline(MAX_HEADER_BYTES + 1) != cache_header(version):
+                return None
+            tables = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable persona cache {path}: {e!r}")
+        return None
+    if not isinstance(tables, PersonaTables) or tables.version != version:
+        return None
+    return tables
+
+
+def write_cache(tables, path):
+    """Write the cache (write, then rename over) so readers never see half a file"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(cache_header(tables.version))
+        pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load(source, cache=None):
+    """PersonaTables for the source, from the cache when it was built from the same bytes"""
+    with open(source, 'rb') as f:
+        raw = f.read()
+    version = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    if cache:
+        tables = read_cache(cache, version)
+        if tables is not None:
+            return tables
+    tables = PersonaTables(json.loads(raw), version)
+    if cache:
+        try:
+            write_cache(tables, cache)
+        except OSError as e:
+            # e.g. a read-only Lambda package; the tables are still good
+            logger.info(f"Not caching personas to {cache}: {e}")
+    return tables
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class PersonaStore:
+    """The current PersonaTables, replaced when the source file changes"""
+
+    def __init__(self, source=DEFAULT_SOURCE, check_interval=2.0, cache=True):
+        self.source = source
+        self.cache = cache_path(source) if cache else None
+        self.check_interval = check_interval
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stat = _stat(source)
+        self._tables = load(source, self.cache)
+        self._next_check = time.monotonic() + check_interval
+        # A fork while another thread was reloading would leave the lock held
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        """Tables for one request; keep using the same ones until it is done"""
+        if self.check_interval > 0 and time.monotonic() >= self._next_check:
+            self.check()
+        return self._tables
+
+    def subscribe(self, callback):
+        """Call callback(tables) after each reload"""
+        self._callbacks.append(callback)
+
+    def check(self):
+        """Reload if the source file has changed since it was last looked at"""
+        # One thread looks at the file; the others carry on with the current tables
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                stat = _stat(self.source)
+            except OSError:
+                return
+            if stat != self._stat:
+                self._stat = stat
+                self.reload()
+        finally:
+            self._lock.release()
+
+    def reload(self):
+        """Load the source now; True if different tables were swapped in"""
+        started = time.perf_counter()
+        try:
+            tables = load(self.source, self.cache)
+        except Exception as e:
+            PERSONA_RELOADS.labels('error').inc()
+            logger.error(f"Keeping the current personas; {self.source} failed to load: {e!r}")
+            return False
+        if tables.version == self._tables.version:
+            return False
+        self._tables = tables
+        PERSONA_RELOADS.labels('ok').inc()
+        logger.info(f"Reloaded personas from {self.source} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for callback in self._callbacks:
+            try:
+                callback(tables)
+            except Exception as e:
+                logger.error(f"Persona reload callback failed: {e!r}")
+        return True
+
+
+def open_store():
+    """PersonaStore for PERSONA_FILE, checked every PERSONA_CHECK_INTERVAL seconds (0: never)"""
+    return PersonaStore(
+        os.environ.get('PERSONA_FILE', DEFAULT_SOURCE),
+        check_interval=float(os.environ.get('PERSONA_CHECK_INTERVAL', 2)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the persona cache ahead of time")
+    parser.add_argument('source', nargs='?', default=os.environ.get('PERSONA_FILE', DEFAULT_SOURCE))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables = load(args.source)
+    write_cache(tables, cache_path(args.source))
+    print(f"{cache_path(args.source)}: {len(tables.chicken.qa)} Q&A patterns, "
+          f"{len(tables.bertcoin.category_names)} keyword categories "
+          f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    # Build through the importable module, so the cache refers to
+    # persona_data's classes rather than __main__'s
+    from persona_data import main
+    main()
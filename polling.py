@@ -0,0 +1,229 @@
+"""
+getUpdates polling engine for hosts that can't expose a webhook
+Application.run_polling handles one update at a time and keeps the offset
+only in memory, so a restart replays or drops the backlog. PollingEngine
+long-polls in batches of up to `limit` updates and runs them concurrently,
+one lane per chat so a chat's replies keep their order. It always asks for
+updates from the oldest one still in flight (the committed offset), which
+never confirms an unprocessed update to Telegram, and skips ones it has
+already dispatched; it polls again once half a batch has finished. The committed offset is written to a local
+file atomically, so a restart resumes where the last run got to.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import signal
+
+from telegram import Update
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+from metrics import POLL_BATCH_UPDATES, UPDATES_RECEIVED
+
+logger = logging.getLogger(__name__)
+
+
+def _update_type(update):
+    """Which field of the update is set ('message', 'edited_message', ...)"""
+    for name in Update.ALL_TYPES:
+        if getattr(update, name, None) is not None:
+            return str(name)
+    return 'unknown'
+
+
+class PollingEngine:
+    """Feeds getUpdates batches to an Application with per-chat ordering and a saved offset"""
+
+    def __init__(self, application, offset_path, limit=100, timeout=30,
+                 skip_backlog=False, allowed_updates=None, shutdown_timeout=10.0,
+                 save_interval=1.0):
+        self.application = application
+        self.offset_path = offset_path
+        self.limit = max(1, min(100, limit))
+        self.timeout = timeout
+        self.skip_backlog = skip_backlog
+        self.allowed_updates = allowed_updates
+        self.shutdown_timeout = shutdown_timeout
+        self.save_interval = save_interval
+        self._offset = None
+        self._highest = -1
+        self._pending = set()
+        self._lanes = {}
+        self._tasks = set()
+        self._progress = None
+        self._saved = None
+        self._save_handle = None
+
+    # --- Offset ---
+
+    def load_offset(self):
+        """Committed offset from the last run, or None"""
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable offset file {self.offset_path}: {e}")
+            return None
+
+    @property
+    def committed(self):
+        """update_id to resume from: the oldest in flight, else one past the newest seen"""
+        if self._pending:
+            return min(self._pending)
+        return self._highest + 1 if self._highest >= 0 else self._offset
+
+    def save_offset(self):
+        """Write the committed offset to the offset file (write, then rename over)"""
+        self._save_handle = None
+        offset = self.committed
+        if offset is None or offset == self._saved:
+            return
+        temp_path = f"{self.offset_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(f"{offset}\n")
+            os.replace(temp_path, self.offset_path)
+            self._saved = offset
+        except OSError as e:
+            logger.error(f"Could not save polling offset: {e}")
+
+    def _schedule_save(self):
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(self.save_interval, self.save_offset)
+
+    # --- Dispatch ---
+
+    def _dispatch(self, update):
+        chat = update.effective_chat
+        key = chat.id if chat is not None else ('update', update.update_id)
+        self._pending.add(update.update_id)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = collections.deque()
+            lane.append(update)
+            task = asyncio.ensure_future(self._drain(key, lane))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            lane.append(update)
+
+    async def _drain(self, key, lane):
+        """Process one chat's updates in arrival order"""
+        while lane:
+            update = lane[0]
+            try:
+                await self.application.process_update(update)
+            except Exception as e:
+                logger.error(f"Error processing update {update.update_id}: {e!r}")
+            finally:
+                lane.popleft()
+                self._pending.discard(update.update_id)
+                self._progress.set()
+                self._schedule_save()
+        del self._lanes[key]
+
+    # --- Polling ---
+
+    async def _start(self):
+        await self.application.initialize()
+        bot = self.application.bot
+        # getUpdates refuses to run while a webhook is set
+        await bot.delete_webhook(drop_pending_updates=self.skip_backlog)
+        if self.skip_backlog:
+            logger.info("Dropped pending updates; starting from new ones")
+        else:
+            self._offset = self.load_offset()
+            if self._offset is not None:
+                logger.info(f"Resuming polling from update {self._offset}")
+
+    def _window_room(self):
+        """How many updates past those in flight the next getUpdates can return"""
+        if not self._pending:
+            return self.limit
+        return self.limit - (self._highest - min(self._pending) + 1)
+
+    async def _poll(self):
+        bot = self.application.bot
+        backoff = 1
+        while True:
+            # Each poll costs a round trip, so let half the batch free up first
+            while self._window_room() < max(1, self.limit // 2):
+                self._progress.clear()
+                await self._progress.wait()
+            self._progress.clear()
+            try:
+                updates = await bot.get_updates(
+                    offset=self.committed, limit=self.limit, timeout=self.timeout,
+                    allowed_updates=self.allowed_updates)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TimedOut:
+                continue
+            except NetworkError as e:
+                logger.warning(f"getUpdates failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+
+            fresh = 0
+            for update in updates:
+                if update.update_id <= self._highest:
+                    continue
+                self._highest = update.update_id
+                UPDATES_RECEIVED.labels(_update_type(update)).inc()
+                self._dispatch(update)
+                fresh += 1
+            POLL_BATCH_UPDATES.observe(fresh)
+            self.save_offset()
+
+            # Everything Telegram returned is already in flight: polling again
+            # now would only fetch it again, so wait for a lane to move
+            if updates and not fresh:
+                await self._progress.wait()
+
+    async def _stop(self):
+        try:
+            await asyncio.wait_for(self._wait_idle(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopped with {len(self._pending)} updates unfinished")
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+        self.save_offset()
+        # Confirm finished updates to Telegram too, so another poller won't replay them
+        try:
+            await self.application.bot.get_updates(offset=self.committed, limit=1, timeout=0)
+        except Exception as e:
+            logger.warning(f"Could not confirm offset with Telegram: {e}")
+        await self.application.shutdown()
+
+    async def _wait_idle(self):
+        while self._pending:
+            self._progress.clear()
+            await self._progress.wait()
+
+    async def run(self):
+        """Poll until cancelled (SIGINT/SIGTERM cancel it too), then finish in-flight updates"""
+        self._progress = asyncio.Event()
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, task.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        try:
+            await self._start()
+            await self._poll()
+        except asyncio.CancelledError:
+            logger.info("Polling stopped")
+        finally:
+            await self._stop()
+
+    def run_forever(self):
+        """Blocking entry point"""
+        asyncio.run(self.run())
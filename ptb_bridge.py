@@ -0,0 +1,87 @@
+"""
+Background event loop for a python-telegram-bot Application
+A sync web framework can't await PTB's coroutines, and a fresh event loop per
+request would throw away the Application's connection pool and state every
+time. ApplicationBridge runs one long-lived loop on a daemon thread; that
+loop owns the initialized, started Application, and request threads just
+drop decoded updates on its update_queue and return.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ApplicationBridge:
+    """Owns a PTB Application and the event loop thread it runs on"""
+
+    def __init__(self, application, shutdown_timeout=10.0):
+        self.application = application
+        self.shutdown_timeout = shutdown_timeout
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def start(self, timeout=30.0):
+        """Start the loop thread, then initialize and start the Application on it"""
+        with self._lock:
+            if self.loop is not None:
+                return self
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self._run, args=(loop,), name='ptb-loop', daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._startup(), loop).result(timeout)
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join(timeout)
+                raise
+            self.loop = loop
+            self._thread = thread
+        # Let queued updates finish when the worker exits normally
+        atexit.register(self.stop)
+        return self
+
+    @staticmethod
+    def _run(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+        loop.close()
+
+    async def _startup(self):
+        await self.application.initialize()
+        await self.application.start()
+
+    async def _shutdown(self):
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+
+    def put(self, update):
+        """Queue an update for the Application; safe to call from any thread"""
+        loop = self.loop
+        if loop is None:
+            raise RuntimeError("Application bridge is not running")
+        loop.call_soon_threadsafe(self.application.update_queue.put_nowait, update)
+
+    def stop(self):
+        """Finish queued updates, shut the Application down and end the loop"""
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(self.shutdown_timeout)
+        except Exception as e:
+            logger.error(f"Error shutting down application: {e!r}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(self.shutdown_timeout)
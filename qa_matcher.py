@@ -0,0 +1,99 @@
+"""
+Single-pass Q&A pattern matcher
+Merges an ordered set of regexes into one Aho-Corasick automaton over the
+literal text each regex needs to match (e.g. "moon" for "wen moon|moon when").
+One pass over the message finds the few patterns that could match; only those
+run their full regex, in priority order. Priority is the order the patterns
+were given in, so the first matching pattern always wins. Each regex is
+compiled the first time it is a candidate, and a pickled matcher leaves them
+out, so loading a cached one costs no regex compilation.
+"""
+
+import re
+
+from aho_corasick import AhoCorasick
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+
+def _better(current, candidates):
+    """Prefer the literal set whose shortest member is longest (fewer false hits)"""
+    if not candidates:
+        return current
+    if current is None or min(map(len, candidates)) > min(map(len, current)):
+        return candidates
+    return current
+
+
+def _required_literals(items):
+    """
+    Set of literals at least one of which must appear in any match of the
+    parsed regex sequence, or None when no such set can be derived.
+    """
+    best = None
+    run = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            best = _better(best, {''.join(run)})
+            run = []
+        if op is sre_constants.SUBPATTERN:
+            best = _better(best, _required_literals(av[-1]))
+        elif op is sre_constants.BRANCH:
+            alternatives = [_required_literals(branch) for branch in av[1]]
+            if all(alternatives):
+                best = _better(best, set().union(*alternatives))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            best = _better(best, _required_literals(av[2]))
+    if run:
+        best = _better(best, {''.join(run)})
+    return best
+
+
+class QAMatcher:
+    """Find the highest-priority regex matching a message in one pass"""
+
+    def __init__(self, patterns, flags=re.IGNORECASE):
+        self.keys = list(patterns)
+        self.flags = flags
+        self._regexes = [None] * len(self.keys)
+
+        # Patterns with no usable literal are checked on every message
+        self._unfiltered = []
+        literals = []
+        for index, key in enumerate(self.keys):
+            required = _required_literals(sre_parse.parse(key, flags))
+            if required is None:
+                self._unfiltered.append(index)
+            else:
+                literals.extend((literal.casefold(), index) for literal in required)
+        self._automaton = AhoCorasick(literals)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_regexes'] = [None] * len(self.keys)
+        return state
+
+    def match_index(self, text):
+        """Index of the first pattern that matches text, or None"""
+        candidates = self._automaton.values_in(text.casefold())
+        candidates.update(self._unfiltered)
+        for index in sorted(candidates):
+            regex = self._regexes[index]
+            if regex is None:
+                regex = self._regexes[index] = re.compile(self.keys[index], self.flags)
+            if regex.search(text):
+                return index
+        return None
+
+    def match(self, text):
+        """Key of the first pattern that matches text, or None"""
+        index = self.match_index(text)
+        return None if index is None else self.keys[index]
@@ -0,0 +1,239 @@
+"""
+Telegram-aware outbound rate limiting
+Token buckets for Telegram's flood limits: one global bucket for the bot
+(~30 msg/s), plus one bucket per chat (~1 msg/s in private chats, ~20 msg/min
+in groups). A 429's retry_after pauses only the chat it was returned for.
+Works from threads (acquire) and from asyncio code (acquire_async).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from metrics import (
+    RATE_LIMIT_SHED, RATE_LIMIT_WAIT_SECONDS, SEND_RETRIES, SEND_THROTTLED, SEND_TIMEOUTS,
+)
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30.0
+PRIVATE_RATE = 1.0
+GROUP_RATE = 20.0 / 60.0
+
+
+class TokenBucket:
+    """
+    Token bucket kept in GCRA form: instead of a token count it tracks the
+    theoretical arrival time of the next send, which makes reservations and
+    429 pauses a couple of float comparisons.
+    """
+
+    __slots__ = ('interval', 'tolerance', 'tat')
+
+    def __init__(self, rate, capacity):
+        self.interval = 1.0 / rate
+        self.tolerance = (capacity - 1) * self.interval
+        self.tat = 0.0
+
+    def earliest(self, now):
+        """Earliest time a send may go out"""
+        return max(now, self.tat - self.tolerance)
+
+    def take(self, send_at):
+        """Spend one token for a send happening at send_at"""
+        self.tat = max(self.tat, send_at) + self.interval
+
+    def pause(self, until):
+        """Refuse sends before until"""
+        self.tat = max(self.tat, until + self.tolerance)
+
+    def idle(self, now):
+        """True when the bucket is full again"""
+        return self.tat <= now
+
+
+class TelegramRateLimiter:
+    """Global plus per-chat token buckets shared by every sender in the process"""
+
+    def __init__(self, global_rate=GLOBAL_RATE, private_rate=PRIVATE_RATE,
+                 group_rate=GROUP_RATE, private_burst=1, group_burst=1,
+                 max_delay=10.0, max_chats=10000):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.private_burst = private_burst
+        self.group_burst = group_burst
+        self.max_delay = max_delay
+        self.max_chats = max_chats
+
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune(now)
+            # Private chat ids are positive, groups and channels negative
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now):
+        """Forget chats whose buckets have refilled; new buckets start full anyway"""
+        for chat_id in [c for c, b in self._chats.items() if b.idle(now)]:
+            del self._chats[chat_id]
+
+    def reserve(self, chat_id=None, max_delay=-1):
+        """
+        Reserve a slot in chat_id's bucket. Returns the seconds to wait before
+        sending, or None if the wait would exceed max_delay (nothing is
+        reserved then). The global bucket is reserved separately, once the
+        chat's slot comes up, so a chat waiting out its own limit doesn't
+        hold global capacity that other chats could use.
+        """
+        if max_delay == -1:
+            max_delay = self.max_delay
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._global if chat_id is None else self._chat_bucket(chat_id, now)
+            send_at = bucket.earliest(now)
+            if max_delay is not None and send_at - now > max_delay:
+                return None
+            bucket.take(send_at)
+        return send_at - now
+
+    def reserve_global(self):
+        """Reserve a slot in the bot-wide bucket. Returns the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            send_at = self._global.earliest(now)
+            self._global.take(send_at)
+        return send_at - now
+
+    def try_acquire(self, chat_id=None):
+        """
+        Take a slot in chat_id's bucket and the bot-wide one only if both are
+        free right now, for a send that can't wait. False reserves nothing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._global] if chat_id is None else [self._chat_bucket(chat_id, now), self._global]
+            if any(bucket.earliest(now) > now for bucket in buckets):
+                return False
+            for bucket in buckets:
+                bucket.take(now)
+        return True
+
+    def acquire(self, chat_id=None, max_delay=-1):
+        """Block the calling thread until a send slot is free. False if shed."""
+        wait = self.reserve(chat_id, max_delay)
+        if wait is None:
+            RATE_LIMIT_SHED.inc()
+            return False
+        waited = wait
+        if wait > 0:
+            time.sleep(wait)
+        if chat_id is not None:
+            wait = self.reserve_global()
+            waited += wait
+            if wait > 0:
+                time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(waited)
+        return True
+
+    async def acquire_async(self, chat_id=None, max_delay=-1):
+        """Asyncio flavour of acquire"""
+        wait = self.reserve(chat_id, max_delay)
+        if wait is None:
+            RATE_LIMIT_SHED.inc()
+            return False
+        waited = wait
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if chat_id is not None:
+            wait = self.reserve_global()
+            waited += wait
+            if wait > 0:
+                await asyncio.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(waited)
+        return True
+
+    def retry_delay(self, retry_after):
+        """max_delay for the retry after a 429: Telegram's retry_after plus the usual allowance"""
+        return None if self.max_delay is None else self.max_delay + retry_after
+
+    def pause(self, chat_id, retry_after):
+        """Honour a 429: hold sends to chat_id (or every chat if None) for retry_after seconds"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._global if chat_id is None else self._chat_bucket(chat_id, now)
+            bucket.pause(now + retry_after)
+
+
+def retry_after_from(body):
+    """parameters.retry_after from a 429 Bot API response body, if present"""
+    try:
+        return float(json.loads(body)['parameters']['retry_after'])
+    except Exception:
+        return None
+
+
+class SendRetries:
+    """
+    The retry policy for one Bot API call, shared by the threaded, asyncio
+    and PTB senders: counts 429s and timeouts, pauses the throttled chat and
+    says how long the next acquire may wait. The caller only does the I/O
+    and the waiting.
+    """
+
+    def __init__(self, limiter, chat_id, max_throttled=3, max_timeouts=1, max_delay=-1):
+        self.limiter = limiter
+        self.chat_id = chat_id
+        self.max_throttled = max_throttled
+        self.max_timeouts = max_timeouts
+        self.throttled = 0
+        self.timeouts = 0
+        # The limiter's own max_delay, until a 429 asks for a longer wait
+        self.max_delay = max_delay
+
+    @property
+    def attempt(self):
+        """Attempts made so far, for the 'http' span"""
+        return self.throttled + self.timeouts
+
+    def after_throttle(self, retry_after):
+        """
+        After a 429: None to give up, else the seconds the caller must sleep
+        before retrying (0 when the limiter holds the chat instead).
+        """
+        SEND_THROTTLED.inc()
+        if self.throttled >= self.max_throttled:
+            return None
+        self.throttled += 1
+        SEND_RETRIES.labels('throttled').inc()
+        retry_after = retry_after or 1.0
+        logger.warning(f"Flood limit hit for chat {self.chat_id}, retrying in {retry_after}s")
+        if self.limiter is None:
+            return retry_after
+        # Group retry_after runs to 20-40 s; shedding the retry would drop the reply
+        self.limiter.pause(self.chat_id, retry_after)
+        if self.max_delay is not None:
+            self.max_delay = self.limiter.retry_delay(retry_after)
+        return 0
+
+    def after_timeout(self):
+        """After a timed-out request: True to retry it"""
+        SEND_TIMEOUTS.inc()
+        if self.timeouts >= self.max_timeouts:
+            logger.error("Final timeout attempt failed")
+            return False
+        self.timeouts += 1
+        SEND_RETRIES.labels('timeout').inc()
+        logger.warning(f"Timeout attempt {self.timeouts}/{self.max_timeouts + 1}")
+        return True
@@ -0,0 +1,141 @@
+"""
+Reply logic per persona
+The step from a decoded message to the reply text, shared by every front
+end that answers as the persona: app.py and multibot.py for Chicken Bert;
+thebertcoin_bot.py's handlers, lambda_function.py and multibot.py for
+thebertcoin. Each picks a phrase the chat hasn't had this round
+(chat_state.py), takes it from the pre-rendered pool or renders it inline
+(response_pool.py), and records the match, draw and transform stages in the
+metrics and the current trace.
+"""
+
+from metrics import MATCH_SECONDS, TRANSFORM_SECONDS
+from persona import BertcoinPersona, ChickenPersona
+from response_pool import ResponsePool, phrase_sources
+from tracing import annotate, span
+
+
+def reply_payload(message, text):
+    """sendMessage exactly as Message.reply_text would: quoting in groups, not in private chats"""
+    payload = {'chat_id': message['chat']['id'], 'text': text}
+    if message['chat'].get('type') != 'private':
+        payload['reply_to_message_id'] = message.get('message_id')
+    return payload
+
+
+class ChickenReplies:
+    """Chicken Bert: the welcome text for /start, a Q&A answer, or his name"""
+
+    def __init__(self, personas, chat_state, pool_size=16, rng=None):
+        self.personas = personas
+        self.chat_state = chat_state
+        # Built once; pass a seeded random.Random to reproduce replies
+        self.persona = ChickenPersona(rng)
+        # The pool renders with its own persona, so it never shares random state with requests
+        self.pool = ResponsePool(self.pool_sources(personas.current), ChickenPersona().transform,
+                                 size=pool_size)
+        personas.subscribe(lambda tables: self.pool.replace(self.pool_sources(tables)))
+
+    @staticmethod
+    def pool_sources(tables):
+        """Reply pools: one per phrase (the welcome text and every Q&A reply)"""
+        return phrase_sources({'welcome': [tables.chicken.welcome], **tables.chicken.qa})
+
+    def transform(self, text):
+        """Apply all Bert transformations in sequence"""
+        with TRANSFORM_SECONDS.time(), span('transform'):
+            return self.persona.transform(text)
+
+    def name(self):
+        """'Bert' with random capitalization"""
+        return self.persona.name()
+
+    def reply(self, text, chat_key):
+        """The reply to a message's text; chat_key identifies the chat in the chat state"""
+        chicken = self.personas.current.chicken
+        if text == '/start':
+            annotate(command='/start')
+            return self.pool.get(('welcome', 0)) or self.transform(chicken.welcome)
+        with MATCH_SECONDS.time(), span('match'):
+            qa_key = chicken.matcher.match(text)
+        if qa_key is None:
+            return self.name()
+        answers = chicken.qa[qa_key]
+        with span('draw'):
+            index = self.chat_state.draw(chat_key, qa_key, len(answers))
+        return self.pool.get((qa_key, index)) or self.transform(answers[index])
+
+
+class BertcoinReplies:
+    """thebertcoin: /start, /help, keyword-routed phrases and the error reply"""
+
+    def __init__(self, personas, chat_state, pool_size=16, rng=None):
+        self.personas = personas
+        self.chat_state = chat_state
+        self.persona = BertcoinPersona(rng)
+        self.pool = ResponsePool(self.pool_sources(personas.current), BertcoinPersona().style,
+                                 size=pool_size)
+        personas.subscribe(lambda tables: self.pool.replace(self.pool_sources(tables)))
+
+    @staticmethod
+    def pool_sources(tables):
+        """Reply pools: one per phrase of the command replies, generic phrases and router categories"""
+        bertcoin = tables.bertcoin
+        return phrase_sources({
+            'welcome': bertcoin.welcome,
+            'help': bertcoin.help,
+            'error': bertcoin.error,
+            'generic': bertcoin.generic,
+            **dict(enumerate(bertcoin.router.values)),
+        })
+
+    def style(self, text):
+        """Apply 'thebertcoin' style transformations to text."""
+        with TRANSFORM_SECONDS.time(), span('transform'):
+            return self.persona.style(text)
+
+    def phrase(self, chat_key, key, phrases):
+        """A styled phrase for the category that the chat hasn't had this round, from the pool or rendered now."""
+        with span('draw'):
+            index = self.chat_state.draw(chat_key, key, len(phrases))
+        return self.pool.get((key, index)) or self.style(phrases[index])
+
+    def welcome(self, chat_key):
+        return self.phrase(chat_key, 'welcome', self.personas.current.bertcoin.welcome)
+
+    def help(self, chat_key):
+        return self.phrase(chat_key, 'help', self.personas.current.bertcoin.help)
+
+    def error(self, chat_key):
+        return self.phrase(chat_key, 'error', self.personas.current.bertcoin.error)
+
+    def message(self, chat_key, text):
+        """Route text to a phrase category; fall back to generic phrases"""
+        bertcoin = self.personas.current.bertcoin
+        with MATCH_SECONDS.time(), span('match'):
+            index = bertcoin.router.route_index(text)
+        if index is None:
+            return self.phrase(chat_key, 'generic', bertcoin.generic)
+        return self.phrase(chat_key, index, bertcoin.router.values[index])
+
+    def reply(self, message, chat_key, username=''):
+        """
+        The reply the PTB handlers would give a decoded message: its text, ''
+        for messages they ignore, or None for a command addressed to another
+        bot (or to this one, when its username isn't known here).
+        """
+        text = message.get('text')
+        if not isinstance(text, str) or not text:
+            return ''
+        # Same test as filters.COMMAND / CommandHandler
+        entities = message.get('entities') or []
+        if entities and entities[0].get('type') == 'bot_command' and entities[0].get('offset') == 0:
+            command, _, addressee = text[1:entities[0].get('length', 0)].lower().partition('@')
+            if addressee and addressee != username.lstrip('@').lower():
+                return None
+            if command == 'start':
+                return self.welcome(chat_key)
+            if command == 'help':
+                return self.help(chat_key)
+            return ''
+        return self.message(chat_key, text)
@@ -0,0 +1,100 @@
+"""
+Pre-rendered reply pools
+The persona transforms are cheap one at a time but add up in a burst, and
+every reply for a category is drawn from the same few texts anyway. A
+ResponsePool keeps a bounded deque of already-rendered replies per category;
+handlers pop one, and a daemon thread tops a pool back up once it falls
+below the low-water mark. An empty pool returns None so the caller renders
+inline as before. The producer has its own render function and rng, so it
+never shares random state with the request path.
+"""
+
+import collections
+import logging
+import os
+import random
+import threading
+
+from metrics import RESPONSE_POOL_TAKEN
+
+logger = logging.getLogger(__name__)
+
+
+def phrase_sources(categories):
+    """One pool per phrase, keyed (category, index), for callers that pick the phrase themselves"""
+    return {
+        (key, index): (text,)
+        for key, texts in categories.items()
+        for index, text in enumerate(texts)
+    }
+
+
+class ResponsePool:
+    """Bounded pools of rendered replies per category, refilled off the request path"""
+
+    def __init__(self, categories, render, size=64, low_water=None, rng=None):
+        self.sources = {key: tuple(texts) for key, texts in categories.items()}
+        self.render = render
+        self.size = size
+        self.low_water = size // 4 if low_water is None else low_water
+        self.rng = rng if rng is not None else random.Random()
+        # With size 0 every get() misses silently and the caller renders inline
+        self._pools = {key: collections.deque() for key in self.sources} if size > 0 else {}
+        self._wanted = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # A forked worker inherits the pools but not the producer thread
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_thread)
+
+    def _forget_thread(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+
+    def start(self):
+        """Start the producer thread; it fills every pool straight away"""
+        with self._lock:
+            if self._thread is None and self._pools:
+                self._thread = threading.Thread(target=self._run, name='response-pool', daemon=True)
+                self._thread.start()
+                self._wanted.set()
+        return self
+
+    def get(self, key):
+        """A rendered reply for the category, or None if its pool is empty or disabled"""
+        pool = self._pools.get(key)
+        if pool is None:
+            return None
+        if self._thread is None:
+            self.start()
+        try:
+            text = pool.popleft()
+        except IndexError:
+            text = None
+        if len(pool) < self.low_water:
+            self._wanted.set()
+        RESPONSE_POOL_TAKEN.labels('miss' if text is None else 'hit').inc()
+        return text
+
+    def replace(self, categories):
+        """Switch to new source texts (e.g. after a persona reload); replies already rendered are dropped"""
+        self.sources = {key: tuple(texts) for key, texts in categories.items()}
+        self._pools = {key: collections.deque() for key in self.sources} if self.size > 0 else {}
+        self._wanted.set()
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            try:
+                self._fill()
+            except Exception as e:
+                logger.error(f"Response pool refill failed: {e!r}")
+
+    def _fill(self):
+        for key, pool in self._pools.items():
+            # A replace() mid-fill can leave this pass on the old pools
+            texts = self.sources.get(key)
+            while texts and len(pool) < self.size:
+                pool.append(self.render(self.rng.choice(texts)))
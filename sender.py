@@ -0,0 +1,207 @@
+"""
+Outbound Telegram Bot API sender
+Keeps a pooled keep-alive HTTPS session so sends don't pay a fresh TCP+TLS
+handshake, and orders sends per chat instead of behind one process-wide lock.
+Sends to different chats run in parallel; sends to the same chat go out in
+the order they arrived.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from admission import LoadGauge
+from metrics import SEND_FAILURES, SEND_QUEUE_WAIT_SECONDS, SEND_SECONDS
+from rate_limiter import SendRetries, retry_after_from
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+API_BASE = 'https://api.telegram.org'
+
+# Telegram rejects sendMessage text longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_text(text, limit=MAX_MESSAGE_LENGTH):
+    """Split text into chunks Telegram will accept, preferring line breaks"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+def new_session(pool_size):
+    """requests session keeping up to pool_size keep-alive connections per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def message_payloads(chat_id, text, parse_mode='HTML'):
+    """sendMessage payloads needed to deliver text to a chat"""
+    return [
+        {"chat_id": chat_id, "text": chunk, "parse_mode": parse_mode}
+        for chunk in split_text(text)
+    ]
+
+
+class _ChatLane:
+    """FIFO ticket lock for one chat"""
+
+    __slots__ = ('cond', 'next_ticket', 'serving', 'users')
+
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.next_ticket = 0
+        self.serving = 0
+        self.users = 0
+
+
+class TelegramSender:
+    """Thread-safe sender with a shared connection pool and per-chat ordering"""
+
+    def __init__(self, token, api_base=API_BASE, pool_size=32, timeout=5,
+                 limiter=None, max_throttle_retries=3, session=None):
+        self.token = token
+        self.api_base = api_base.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_throttle_retries = max_throttle_retries
+
+        # Senders for several bots can share one session (and its pool)
+        self.session = session if session is not None else new_session(pool_size)
+
+        # Lanes exist only while a chat has sends queued or in flight
+        self._lanes = {}
+        self._lanes_lock = threading.Lock()
+
+        # How backed up sends are, for admission control
+        self.load = LoadGauge()
+
+    def reopen(self):
+        """Drop pooled connections and start a fresh session (e.g. in a forked worker)"""
+        old, self.session = self.session, new_session(self.pool_size)
+        old.close()
+
+    def method_url(self, method):
+        """Full Bot API URL for a method"""
+        return f"{self.api_base}/bot{self.token}/{method}"
+
+    def _enter_lane(self, chat_id):
+        """Wait for this chat's earlier sends to finish, then take the lane"""
+        with self._lanes_lock:
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                lane = self._lanes[chat_id] = _ChatLane()
+            lane.users += 1
+            ticket = lane.next_ticket
+            lane.next_ticket += 1
+
+        started = time.perf_counter()
+        with span('lane_wait'), lane.cond:
+            while lane.serving != ticket:
+                lane.cond.wait()
+        SEND_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+        return lane
+
+    def _leave_lane(self, chat_id, lane):
+        """Hand the lane to the next queued send and drop it when idle"""
+        with lane.cond:
+            lane.serving += 1
+            lane.cond.notify_all()
+
+        with self._lanes_lock:
+            lane.users -= 1
+            if lane.users == 0:
+                del self._lanes[chat_id]
+
+    def call(self, method, payload, retry_count=1):
+        """
+        Call a Bot API method. Timeouts are retried up to retry_count times;
+        429s are retried after Telegram's retry_after, pausing only the
+        affected chat. Returns True on success.
+        """
+        url = self.method_url(method)
+        chat_id = payload.get('chat_id')
+        latency = SEND_SECONDS.labels(method)
+        retries = SendRetries(self.limiter, chat_id, self.max_throttle_retries, retry_count)
+        while True:
+            if self.limiter is not None:
+                with span('rate_wait'):
+                    admitted = self.limiter.acquire(chat_id, retries.max_delay)
+                if not admitted:
+                    logger.error(f"Rate limit backlog too long for chat {chat_id}, dropping message")
+                    SEND_FAILURES.inc()
+                    return False
+            started = time.perf_counter()
+            try:
+                # One span per attempt, so retries show up as repeated 'http' stages
+                with span('http', method=method, attempt=retries.attempt) as stage:
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+                    stage.set(status=response.status_code)
+                latency.observe(time.perf_counter() - started)
+                if response.status_code == 429:
+                    wait = retries.after_throttle(retry_after_from(response.content))
+                    if wait is not None:
+                        time.sleep(wait)
+                        continue
+                response.raise_for_status()
+                return True
+            except requests.exceptions.Timeout:
+                latency.observe(time.perf_counter() - started)
+                if not retries.after_timeout():
+                    SEND_FAILURES.inc()
+                    return False
+            except Exception as e:
+                logger.error(f"Failed to send message: {e}")
+                SEND_FAILURES.inc()
+                return False
+
+    def reserve_inline(self, chat_id):
+        """
+        True if a reply to chat_id may go back in the webhook response, which
+        Telegram sends for us: nothing for the chat is queued here (it would
+        be overtaken) and the flood limits have a slot free right now, which
+        is taken.
+        """
+        with self._lanes_lock:
+            if chat_id in self._lanes:
+                return False
+        return self.limiter is None or self.limiter.try_acquire(chat_id)
+
+    def send_message(self, chat_id, text, retry_count=1, parse_mode='HTML'):
+        """Send a text message, keeping per-chat order"""
+        return self.send_payloads(
+            chat_id, message_payloads(chat_id, text, parse_mode), retry_count=retry_count
+        )
+
+    def send_payloads(self, chat_id, payloads, retry_count=1):
+        """Send prepared sendMessage payloads to one chat, stopping at the first failure"""
+        with span('send', messages=len(payloads)):
+            started = self.load.enter()
+            lane = self._enter_lane(chat_id)
+            try:
+                for payload in payloads:
+                    if not self.call('sendMessage', payload, retry_count=retry_count):
+                        return False
+                return True
+            finally:
+                self._leave_lane(chat_id, lane)
+                self.load.leave(started)
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Production server for the bots
+Runs app.py, thebertcoin_bot.py or multibot.py under gunicorn with one of three worker
+models:
+
+    sync      gunicorn's sync worker, one request per process at a time
+    threaded  gthread workers, THREADS requests per process
+    async     uvicorn workers on the asyncio twin (app_asgi, app only)
+
+The bot module is imported once in the master (preload), so the compiled
+pattern, keyword and persona tables are shared copy-on-write by every
+worker. Anything that holds sockets or threads (the Bot API session, the
+reply pool's producer, thebertcoin's PTB loop) is started per worker after
+fork instead.
+
+    python serve.py app --model threaded
+    BOT=thebertcoin WORKER_MODEL=sync WEB_CONCURRENCY=4 python serve.py
+
+Settings come from the command line or the environment: BOT, WORKER_MODEL,
+WEB_CONCURRENCY (workers; 1 for threaded and async, 2 x CPUs + 1 for
+sync), THREADS (default 8) and PORT (default 8080). Flood limits, per-chat
+ordering, the redelivery cache, chat state and admission control are kept
+per worker, so more than one worker multiplies the send rate and splits
+chats across processes.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from worker_models import MODELS, default_workers
+
+logger = logging.getLogger(__name__)
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'threaded': 'gthread',
+    'async': 'uvicorn.workers.UvicornWorker',
+}
+
+# Module that serves each bot under each worker model
+BOT_MODULES = {
+    'app': {'sync': 'app', 'threaded': 'app', 'async': 'app_asgi'},
+    'thebertcoin': {'sync': 'thebertcoin_bot', 'threaded': 'thebertcoin_bot'},
+    'multi': {'sync': 'multibot', 'threaded': 'multibot'},
+}
+
+
+def post_fork(server, worker):
+    """Open this worker's outbound connections and background threads"""
+    # app_asgi builds its aiohttp session lazily on its own loop, but shares app's reply pool
+    for name in ('app', 'thebertcoin_bot'):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        if hasattr(module, 'sender'):
+            module.sender.reopen()
+        module.RESPONSE_POOL.start()
+        if hasattr(module, 'get_bridge'):
+            module.get_bridge()
+    if 'multibot' in sys.modules:
+        sys.modules['multibot'].reopen_session()
+
+
+class BotServer(BaseApplication):
+    """gunicorn application for one bot module"""
+
+    def __init__(self, module_name, options):
+        self.module_name = module_name
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return importlib.import_module(self.module_name).app
+
+
+def gunicorn_options(model, workers, threads, bind, preload=True):
+    options = {
+        'bind': bind,
+        'workers': workers,
+        'worker_class': WORKER_CLASSES[model],
+        'preload_app': preload,
+        'post_fork': post_fork,
+    }
+    if model == 'threaded':
+        options['threads'] = threads
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('bot', nargs='?', choices=sorted(BOT_MODULES), default=os.getenv('BOT', 'app'))
+    parser.add_argument('--model', choices=MODELS, default=os.getenv('WORKER_MODEL', 'threaded'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 0)),
+                        help='worker processes (default: 1, or 2 x CPUs + 1 for sync)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('THREADS', 8)))
+    parser.add_argument('--bind', default=f"0.0.0.0:{os.getenv('PORT', 8080)}")
+    parser.add_argument('--no-preload', action='store_true',
+                        help='import the bot in each worker instead of once in the master')
+    args = parser.parse_args()
+
+    module_name = BOT_MODULES[args.bot].get(args.model)
+    if module_name is None:
+        parser.error(f"{args.bot} has no {args.model} worker model")
+    workers = args.workers or default_workers(args.model)
+    if workers > 1:
+        logger.warning(f"Running {workers} workers: each paces sends to Telegram's flood limits on its own "
+                       f"(up to {workers}x the bot-wide and per-chat rates) and keeps its own redelivery "
+                       f"cache, chat state and admission control. Lower RATE_LIMIT_* to match")
+    BotServer(module_name, gunicorn_options(
+        args.model, workers, args.threads, args.bind, preload=not args.no_preload)).run()
+
+
+if __name__ == '__main__':
+    main()
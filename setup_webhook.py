@@ -1,97 +1,216 @@
 #!/usr/bin/env python3
 """
-Setup Telegram Webhook for Railway Deployment
+Telegram webhook management
+Sets, shows, checks and deletes the bot's webhook without prompting, so
+it can run from a deploy script:
+
+    python setup_webhook.py set https://your-project.railway.app [--drop-pending-updates]
+    python setup_webhook.py info [--json]
+    python setup_webhook.py check
+    python setup_webhook.py delete [--drop-pending-updates]
+
+set asks Telegram only for the update types the bots answer
+(allowed_updates, default message) and sizes max_connections to what
+serve.py runs (WORKER_MODEL, WEB_CONCURRENCY, THREADS), so Telegram doesn't
+open more connections than there are workers to answer them. check
+compares the live webhook with that and exits 1 on a mismatch. For sync
+workers both need the server's worker count (WEB_CONCURRENCY or
+--workers): serve.py sizes those from the CPUs of the box it runs on, not
+this one.
+
+TELEGRAM_BOT_TOKEN (or --token) is required. WEBHOOK_SECRET_TOKEN, if set,
+is sent as secret_token and checked by the webhooks.
 """
 
-import requests
+import argparse
+import datetime
+import json
 import os
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from update_filter import MESSAGE_TYPES
+from worker_models import MODELS, concurrency, default_workers
+
+API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+
+# Telegram's bounds for max_connections, and what it uses when none is given
+MAX_CONNECTIONS_RANGE = (1, 100)
+DEFAULT_MAX_CONNECTIONS = 40
 
-def setup_webhook(railway_url):
-    """Set up Telegram webhook with Railway URL."""
-    
-    token = os.getenv('TELEGRAM_BOT_TOKEN', '7892756309:AAGxdSbwPc6jhNU65srmldWGQe2gR58izSg')
-    
-    # Set webhook URL
-    webhook_url = f"https://api.telegram.org/bot{token}/setWebhook"
-    webhook_data = {
-        'url': f"{railway_url}/webhook"
-    }
-    
-    print(f"🔗 Setting webhook to: {railway_url}/webhook")
-    
+SECRET_TOKEN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+
+def call(token, method, **params):
+    """One Bot API call; returns its result or raises RuntimeError with Telegram's description"""
+    params = {key: value for key, value in params.items() if value is not None}
+    response = requests.post(f"{API_BASE}/bot{token}/{method}", json=params, timeout=30)
     try:
-        response = requests.post(webhook_url, json=webhook_data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('ok'):
-                print("✅ Webhook set successfully!")
-                print(f"📱 Your bot is now live at: {railway_url}")
-                return True
-            else:
-                print(f"❌ Webhook setup failed: {result.get('description')}")
-                return False
-        else:
-            print(f"❌ Webhook setup failed with status: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Webhook setup error: {e}")
-        return False
-
-def check_webhook_status():
-    """Check current webhook status."""
-    
-    token = os.getenv('TELEGRAM_BOT_TOKEN', '7892756309:AAGxdSbwPc6jhNU65srmldWGQe2gR58izSg')
-    
-    webhook_info_url = f"https://api.telegram.org/bot{token}/getWebhookInfo"
-    
+        body = response.json()
+    except ValueError:
+        raise RuntimeError(f"{method} failed with status {response.status_code}")
+    if not body.get('ok'):
+        raise RuntimeError(f"{method} failed: {body.get('description') or response.status_code}")
+    return body['result']
+
+
+def webhook_url(url):
+    """The URL to register: a bare origin gets the bots' /webhook path"""
+    return url.rstrip('/') + '/webhook' if urlsplit(url).path in ('', '/') else url
+
+
+def server_capacity(args):
+    """Requests serve.py answers at once with these settings; None when not bounded by workers"""
+    return concurrency(args.model, args.workers or default_workers(args.model), args.threads)
+
+
+def fitted_max_connections(capacity):
+    """max_connections for a server answering `capacity` requests at once"""
+    low, high = MAX_CONNECTIONS_RANGE
+    return high if capacity is None else max(low, min(high, capacity))
+
+
+def format_date(timestamp, now=None):
+    """'2024-01-02 03:04:05 UTC (12 min ago)' for a Unix time from getWebhookInfo"""
+    now = time.time() if now is None else now
+    when = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    minutes = max(0, int((now - timestamp) // 60))
+    return f"{when:%Y-%m-%d %H:%M:%S} UTC ({minutes} min ago)"
+
+
+def describe(info):
+    """getWebhookInfo as 'name: value' lines"""
+    lines = [
+        f"url: {info.get('url') or '(none, updates wait for getUpdates)'}",
+        f"pending_update_count: {info.get('pending_update_count', 0)}",
+        f"max_connections: {info.get('max_connections', DEFAULT_MAX_CONNECTIONS)}",
+        f"allowed_updates: {', '.join(info.get('allowed_updates') or []) or '(all but chat_member and the like)'}",
+        f"ip_address: {info.get('ip_address') or '(resolved from the url)'}",
+        f"has_custom_certificate: {info.get('has_custom_certificate', False)}",
+    ]
+    if info.get('last_error_date'):
+        lines.append(f"last_error_date: {format_date(info['last_error_date'])}")
+        lines.append(f"last_error_message: {info.get('last_error_message', '')}")
+    if info.get('last_synchronization_error_date'):
+        lines.append(f"last_synchronization_error_date: {format_date(info['last_synchronization_error_date'])}")
+    return lines
+
+
+def problems(info, capacity, error_window=3600, now=None):
+    """What in the live webhook doesn't fit the server; empty if it all does"""
+    now = time.time() if now is None else now
+    found = []
+    if not info.get('url'):
+        return ["No webhook is set"]
+    connections = info.get('max_connections', DEFAULT_MAX_CONNECTIONS)
+    fitted = fitted_max_connections(capacity)
+    if capacity is not None and connections > capacity:
+        found.append(f"max_connections is {connections} but the server answers {capacity} requests at once; "
+                     f"the rest queue until Telegram times them out and redelivers (use {fitted})")
+    elif connections < fitted:
+        room = f"the {capacity} requests the server answers at once" if capacity else "what an async server takes"
+        found.append(f"max_connections is {connections}, below {room}, "
+                     f"so updates queue at Telegram while workers idle (use {fitted})")
+    allowed = info.get('allowed_updates') or []
+    extra = sorted(set(allowed) - set(MESSAGE_TYPES))
+    if extra or not allowed:
+        sent = f"{', '.join(extra)} updates" if extra else "updates of every type"
+        found.append(f"Telegram sends {sent}, which the bots only acknowledge "
+                     f"(set allowed_updates to {', '.join(MESSAGE_TYPES)})")
+    if info.get('last_error_date') and now - info['last_error_date'] < error_window:
+        found.append(f"Delivery failed at {format_date(info['last_error_date'], now)}: "
+                     f"{info.get('last_error_message', '')}")
+    return found
+
+
+def secret_token(value):
+    if not SECRET_TOKEN.fullmatch(value):
+        raise argparse.ArgumentTypeError('1 to 256 characters of A-Z, a-z, 0-9, _ and -')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--token', default=os.getenv('TELEGRAM_BOT_TOKEN'),
+                        help='bot token (default: TELEGRAM_BOT_TOKEN)')
+    # The server the webhook feeds, with serve.py's settings and defaults
+    server = argparse.ArgumentParser(add_help=False)
+    server.add_argument('--model', choices=MODELS, default=os.getenv('WORKER_MODEL', 'threaded'))
+    server.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 0)),
+                        help="the server's worker processes (default: WEB_CONCURRENCY)")
+    server.add_argument('--threads', type=int, default=int(os.getenv('THREADS', 8)))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    set_command = commands.add_parser('set', parents=[server], help='set the webhook')
+    set_command.add_argument('url', help="webhook URL; a bare origin gets '/webhook' appended")
+    set_command.add_argument('--allowed-updates', default=','.join(MESSAGE_TYPES),
+                             help="comma-separated update types Telegram should send ('' for all)")
+    set_command.add_argument('--max-connections', type=int,
+                             help='connections Telegram may open at once (default: fitted to the server)')
+    set_command.add_argument('--drop-pending-updates', action='store_true',
+                             help='discard updates that arrived while no webhook answered')
+    set_command.add_argument('--secret-token', type=secret_token, default=os.getenv('WEBHOOK_SECRET_TOKEN') or None,
+                             help='sent back in every request (default: WEBHOOK_SECRET_TOKEN)')
+    set_command.add_argument('--ip-address', help='IP to deliver to instead of resolving the URL')
+
+    info_command = commands.add_parser('info', help='show getWebhookInfo')
+    info_command.add_argument('--json', action='store_true', help='print the raw result')
+
+    check_command = commands.add_parser('check', parents=[server], help='exit 1 if the webhook doesn\'t fit the server')
+    check_command.add_argument('--error-window', type=float, default=3600,
+                               help='seconds a delivery error counts as recent')
+
+    delete_command = commands.add_parser('delete', help='remove the webhook (to poll instead)')
+    delete_command.add_argument('--drop-pending-updates', action='store_true')
+
+    args = parser.parse_args()
+    if not args.token:
+        parser.error('No TELEGRAM_BOT_TOKEN environment variable set (or --token)')
+    # serve.py sizes sync workers from the CPU count of the box it runs on, which this one may not be
+    needs_workers = args.command == 'check' or (args.command == 'set' and not args.max_connections)
+    if needs_workers and args.model == 'sync' and args.workers <= 0:
+        parser.error("Set the server's worker count with --workers or WEB_CONCURRENCY (or pass --max-connections)")
+
     try:
-        response = requests.get(webhook_info_url)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('ok'):
-                webhook_info = result.get('result', {})
-                if webhook_info.get('url'):
-                    print(f"✅ Webhook is set to: {webhook_info['url']}")
-                    return webhook_info['url']
-                else:
-                    print("❌ No webhook is currently set")
-                    return None
-        else:
-            print(f"❌ Failed to get webhook info: {response.status_code}")
-            return None
-            
-    except Exception as e:
-        print(f"❌ Error checking webhook: {e}")
-        return None
+        if args.command == 'set':
+            low, high = MAX_CONNECTIONS_RANGE
+            connections = args.max_connections or fitted_max_connections(server_capacity(args))
+            if not low <= connections <= high:
+                parser.error(f"--max-connections must be {low} to {high}")
+            allowed = [kind.strip() for kind in args.allowed_updates.split(',') if kind.strip()]
+            url = webhook_url(args.url)
+            call(args.token, 'setWebhook', url=url, max_connections=connections,
+                 # An empty list asks for every type but chat_member and the like
+                 allowed_updates=allowed, drop_pending_updates=args.drop_pending_updates or None,
+                 secret_token=args.secret_token, ip_address=args.ip_address)
+            print(f"Webhook set to {url}: max_connections {connections}, "
+                  f"allowed_updates {', '.join(allowed) or 'all'}"
+                  f"{', pending updates dropped' if args.drop_pending_updates else ''}"
+                  f"{', with a secret token' if args.secret_token else ''}")
+        elif args.command == 'info':
+            info = call(args.token, 'getWebhookInfo')
+            print(json.dumps(info, indent=2) if args.json else '\n'.join(describe(info)))
+        elif args.command == 'check':
+            info = call(args.token, 'getWebhookInfo')
+            capacity = server_capacity(args)
+            print('\n'.join(describe(info)))
+            print(f"server: {args.model}, {capacity or 'unbounded'} requests at once")
+            found = problems(info, capacity, args.error_window)
+            for problem in found:
+                print(f"MISMATCH: {problem}")
+            if found:
+                sys.exit(1)
+            print("OK")
+        elif args.command == 'delete':
+            call(args.token, 'deleteWebhook', drop_pending_updates=args.drop_pending_updates or None)
+            print(f"Webhook deleted{', pending updates dropped' if args.drop_pending_updates else ''}")
+    except (requests.RequestException, RuntimeError) as e:
+        parser.exit(2, f"{e}\n")
+
 
 if __name__ == '__main__':
-    print("🤖 TheBertCoin Bot - Webhook Setup")
-    print("=" * 40)
-    
-    # Check current status
-    current_webhook = check_webhook_status()
-    
-    if current_webhook:
-        print(f"Current webhook: {current_webhook}")
-        response = input("Do you want to change it? (y/n): ")
-        if response.lower() != 'y':
-            print("Keeping current webhook.")
-            exit()
-    
-    # Get Railway URL
-    railway_url = input("Enter your Railway URL (e.g., https://your-project.railway.app): ").strip()
-    
-    if not railway_url:
-        print("❌ No URL provided!")
-        exit()
-    
-    # Set up webhook
-    if setup_webhook(railway_url):
-        print("\n🎉 Your TheBertCoin bot is now live and secure!")
-        print("🔒 Running 24/7 on Railway with encrypted environment variables")
-        print("💰 Free tier covers your usage")
-    else:
-        print("\n❌ Webhook setup failed. Please check your Railway URL and try again.") 
\ No newline at end of file
+    main()
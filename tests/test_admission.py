@@ -0,0 +1,55 @@
+from admission import AdmissionControl, update_origin
+
+
+def message(update_id, chat_id=-100, user_id=1, text='hello', chat_type='group'):
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'chat': {'id': chat_id, 'type': chat_type},
+        'from': {'id': user_id}, 'text': text}}
+
+
+def test_update_origin():
+    assert update_origin(message(1)) == (-100, 1, False)
+    assert update_origin(message(1, text='/start'))[2] is True
+    assert update_origin(message(1, chat_id=5, chat_type='private'))[2] is True
+    callback = {'update_id': 1, 'callback_query': {'from': {'id': 2}, 'message': {'chat': {'id': 7}}}}
+    assert update_origin(callback) == (7, 2, False)
+    assert update_origin({'update_id': 1}) == (None, None, False)
+
+
+def test_user_flood_is_shed():
+    admission = AdmissionControl(user_rate=0.01, user_burst=2, chat_rate=0)
+    assert [admission.check(message(i, chat_id=-i)) for i in range(3)] == [None, None, 'user_flood']
+    # Someone else in the same chats is still admitted
+    assert admission.check(message(3, user_id=2)) is None
+
+
+def test_chat_flood_is_shed():
+    admission = AdmissionControl(user_rate=0, chat_rate=0.01, chat_burst=2)
+    assert [admission.check(message(i, user_id=i)) for i in range(3)] == [None, None, 'chat_flood']
+    assert admission.check(message(3, chat_id=-200)) is None
+
+
+def test_zero_rates_turn_the_flood_checks_off():
+    admission = AdmissionControl(user_rate=0, chat_rate=0)
+    assert all(admission.check(message(i)) is None for i in range(50))
+
+
+def test_overload_sheds_only_low_priority_updates():
+    admission = AdmissionControl(user_rate=0, chat_rate=0, max_backlog=64, load=lambda: (100, 0.0))
+    assert admission.check(message(1)) == 'overload'
+    assert admission.check(message(2, text='/start')) is None
+    assert admission.check(message(3, chat_id=5, chat_type='private')) is None
+
+
+def test_overload_by_latency_needs_a_backlog():
+    load = [(1, 5.0)]
+    admission = AdmissionControl(user_rate=0, chat_rate=0, max_latency=1, load=lambda: load[0])
+    assert admission.check(message(1)) == 'overload'
+    # Nothing pending: slow past sends alone don't shed
+    load[0] = (0, 5.0)
+    assert admission.check(message(2)) is None
+
+
+def test_non_dict_updates_are_admitted():
+    admission = AdmissionControl()
+    assert admission.check([1, 2]) is None
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import chat_state
+from chat_state import ChatStateStore
+
+
+class Clock:
+    """Stands in for the time module, moved forward by hand"""
+
+    def __init__(self, now=1_000_000):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_state, 'time', clock)
+    return clock
+
+
+def test_no_phrase_repeats_within_a_round():
+    store = ChatStateStore(rng=random.Random(1))
+    for count in (2, 3, 6, 25):
+        rounds = [[store.draw('chat', count, count) for _ in range(count)] for _ in range(20)]
+        for drawn in rounds:
+            assert sorted(drawn) == list(range(count))
+        # A new round never opens with the phrase that ended the last
+        for last, first in zip(rounds, rounds[1:]):
+            assert first[0] != last[-1]
+
+
+def test_lists_and_chats_have_their_own_bags():
+    store = ChatStateStore(rng=random.Random(2))
+    a = [store.draw('a', 'greeting', 4) for _ in range(4)]
+    b = [store.draw('b', 'greeting', 4) for _ in range(4)]
+    c = [store.draw('a', 'other', 4) for _ in range(4)]
+    assert sorted(a) == sorted(b) == sorted(c) == [0, 1, 2, 3]
+
+
+def test_a_changed_list_is_dealt_afresh():
+    store = ChatStateStore(rng=random.Random(3))
+    store.draw('chat', 'key', 4)
+    assert sorted(store.draw('chat', 'key', 6) for _ in range(6)) == list(range(6))
+
+
+def test_single_phrase_lists():
+    store = ChatStateStore()
+    assert [store.draw('chat', 'key', 1) for _ in range(3)] == [0, 0, 0]
+
+
+def test_chats_idle_past_the_ttl_are_evicted(clock):
+    store = ChatStateStore(ttl=60)
+    store.draw('quiet', 'key', 4)
+    clock.now += 30
+    store.draw('busy', 'key', 4)
+    assert len(store) == 2
+    clock.now += 45
+    store.draw('new', 'key', 4)
+    # 'quiet' has been idle 75 s, 'busy' only 45 s
+    assert len(store) == 2
+    assert 'quiet' not in store._chats
+
+
+def test_an_expired_chat_starts_a_new_round(clock):
+    store = ChatStateStore(ttl=60, rng=random.Random(4))
+    for _ in range(3):
+        store.draw('chat', 'key', 5)
+    clock.now += 61
+    # The bag was reset, so the next five draws are a whole round again
+    assert sorted(store.draw('chat', 'key', 5) for _ in range(5)) == list(range(5))
+
+
+def test_least_recently_active_chats_are_evicted_over_capacity(clock):
+    store = ChatStateStore(capacity=2)
+    for chat in ('a', 'b', 'c'):
+        store.draw(chat, 'key', 3)
+        clock.now += 1
+    assert len(store) == 2
+    assert list(store._chats) == ['b', 'c']
+    store.draw('b', 'key', 3)
+    store.draw('d', 'key', 3)
+    assert list(store._chats) == ['b', 'd']
@@ -0,0 +1,59 @@
+import threading
+
+from coalescer import ReplyCoalescer, merge_replies
+from sender import MAX_MESSAGE_LENGTH
+
+
+def test_telegram_limit():
+    assert MAX_MESSAGE_LENGTH == 4096
+
+
+def test_replies_are_joined_in_order():
+    assert merge_replies(['one', 'two', 'three']) == 'one\n\ntwo\n\nthree'
+
+
+def test_merged_text_is_cut_at_4096_characters():
+    texts = ['a' * 3000, 'b' * 1000, 'c' * 100, 'd']
+    merged = merge_replies(texts)
+    assert merged == 'a' * 3000 + '\n\n' + 'b' * 1000
+    assert len(merged) <= MAX_MESSAGE_LENGTH
+
+
+def test_a_reply_that_fills_the_limit_exactly_is_kept():
+    texts = ['a' * 2047, 'b' * 2047]
+    assert len(merge_replies(texts)) == MAX_MESSAGE_LENGTH
+    assert len(merge_replies(texts + ['c'])) == MAX_MESSAGE_LENGTH
+
+
+def test_replies_after_the_first_that_does_not_fit_are_dropped():
+    # 'tiny' would fit, but replies aren't reordered around one that doesn't
+    assert merge_replies(['a' * 4000, 'b' * 200, 'tiny']) == 'a' * 4000
+
+
+def test_coalescer_delivers_one_message_per_chat():
+    delivered = []
+    done = threading.Event()
+
+    def deliver(chat_id, text):
+        delivered.append((chat_id, text))
+        if len(delivered) == 2:
+            done.set()
+
+    coalescer = ReplyCoalescer(deliver, window=0.05)
+    for _ in range(30):
+        coalescer.add(-1, 'x' * 200)
+    coalescer.add(-2, 'hello')
+    assert done.wait(5)
+    merged = dict(delivered)
+    assert merged[-2] == 'hello'
+    assert len(merged[-1]) <= MAX_MESSAGE_LENGTH
+    assert merged[-1].count('x' * 200) == 20
+
+
+def test_flush_delivers_pending_replies_now():
+    delivered = []
+    coalescer = ReplyCoalescer(lambda chat_id, text: delivered.append((chat_id, text)), window=60)
+    coalescer.add(-1, 'one')
+    coalescer.add(-1, 'two')
+    coalescer.flush()
+    assert delivered == [(-1, 'one\n\ntwo')]
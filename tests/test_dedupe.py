@@ -0,0 +1,44 @@
+from dedupe import UpdateDeduper
+
+
+def test_redelivered_ids_are_duplicates():
+    deduper = UpdateDeduper(3)
+    assert [deduper.seen(update_id) for update_id in (1, 2, 3)] == [False, False, False]
+    assert deduper.seen(2) is True
+
+
+def test_oldest_id_is_forgotten_when_the_ring_wraps():
+    deduper = UpdateDeduper(3)
+    for update_id in range(1, 5):
+        deduper.seen(update_id)
+    assert len(deduper) == 3
+    assert deduper.seen(1) is False
+    # Recording 1 again pushed out 2; 3 and 4 are still remembered
+    assert deduper.seen(3) is True
+    assert deduper.seen(4) is True
+    assert deduper.seen(2) is False
+    assert len(deduper) == 3
+
+
+def test_wraps_many_times():
+    deduper = UpdateDeduper(10)
+    for update_id in range(1000):
+        assert deduper.seen(update_id) is False
+        assert deduper.seen(update_id) is True
+    assert len(deduper) == 10
+    assert deduper.seen(989) is False
+    assert deduper.seen(999) is True
+
+
+def test_capacity_zero_turns_it_off():
+    for capacity in (0, -1):
+        deduper = UpdateDeduper(capacity)
+        assert deduper.seen(1) is False
+        assert deduper.seen(1) is False
+        assert len(deduper) == 0
+
+
+def test_none_is_never_a_duplicate():
+    deduper = UpdateDeduper(3)
+    assert deduper.seen(None) is False
+    assert deduper.seen(None) is False
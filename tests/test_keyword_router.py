@@ -0,0 +1,33 @@
+from keyword_router import KeywordRouter
+
+
+def test_keywords_match_whole_words_only():
+    router = KeywordRouter([('greeting', ['hi', 'hello'])])
+    assert router.route('hi there') == 'greeting'
+    assert router.route('oh, hi!') == 'greeting'
+    assert router.route('this is it') is None
+    assert router.route('hi_there') is None
+    assert router.route('hello2') is None
+
+
+def test_substrings_match_without_word_boundaries():
+    router = KeywordRouter([('greeting', ['hi'])], word_boundaries=False)
+    assert router.route('this is it') == 'greeting'
+
+
+def test_earlier_categories_win():
+    router = KeywordRouter([('price', ['price']), ('greeting', ['hi'])])
+    assert router.route('hi, what is the price') == 'price'
+    assert router.route_index('hi') == 1
+
+
+def test_a_partial_hit_does_not_hide_a_whole_word_one():
+    router = KeywordRouter([('price', ['price']), ('moon', ['moon'])])
+    # 'prices' is not a match, so the later 'moon' category is chosen
+    assert router.route('prices to the moon') == 'moon'
+
+
+def test_matching_ignores_case_and_falls_back_to_default():
+    router = KeywordRouter([('moon', ['Moon'])])
+    assert router.route('MOON soon') == 'moon'
+    assert router.route('nothing here', default='generic') == 'generic'
@@ -0,0 +1,28 @@
+import random
+
+from benchmarks.bench_persona import SHORT, WELCOME, legacy_bertcoin_style, legacy_transform
+from persona import BertcoinPersona, ChickenPersona
+
+
+def test_chicken_transform_matches_the_original_from_the_same_seed():
+    for seed in range(20):
+        persona = ChickenPersona(random.Random(seed))
+        rng = random.Random(seed)
+        for text in (WELCOME, SHORT, 'hold the eggs, friend', ''):
+            assert persona.transform(text) == legacy_transform(text, rng)
+
+
+def test_bertcoin_style_matches_the_original_from_the_same_seed():
+    for seed in range(20):
+        persona = BertcoinPersona(random.Random(seed))
+        rng = random.Random(seed)
+        for _ in range(20):
+            assert persona.style(SHORT) == legacy_bertcoin_style(SHORT, rng)
+
+
+def test_same_seed_same_replies():
+    first, second = ChickenPersona(random.Random(3)), ChickenPersona(random.Random(3))
+    assert [first.transform(WELCOME) for _ in range(50)] == [second.transform(WELCOME) for _ in range(50)]
+    assert [first.name() for _ in range(20)] == [second.name() for _ in range(20)]
+    first, second = BertcoinPersona(random.Random(3)), BertcoinPersona(random.Random(3))
+    assert [first.code_string() for _ in range(20)] == [second.code_string() for _ in range(20)]
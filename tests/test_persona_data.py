@@ -0,0 +1,76 @@
+import json
+import pickle
+import shutil
+
+import pytest
+
+import persona_data
+from persona_data import DEFAULT_SOURCE, PersonaStore, cache_header, load, read_cache
+
+UNPICKLED = []
+
+
+def _planted():
+    UNPICKLED.append(True)
+
+
+class Planted:
+    def __reduce__(self):
+        return _planted, ()
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'personas.json'
+    shutil.copy(DEFAULT_SOURCE, path)
+    return path
+
+
+def test_cache_is_used_for_the_same_source(source):
+    cache = source.with_suffix('.pickle')
+    tables = load(str(source), str(cache))
+    assert cache.read_bytes().startswith(cache_header(tables.version))
+    assert read_cache(str(cache), tables.version).version == tables.version
+
+
+def test_cache_for_another_version_is_not_unpickled(source):
+    cache = source.with_suffix('.pickle')
+    cache.write_bytes(cache_header('stale') + pickle.dumps(Planted()))
+    tables = load(str(source), str(cache))
+    assert UNPICKLED == []
+    assert tables.version != 'stale'
+    # The stale cache was replaced by one for this source
+    assert cache.read_bytes().startswith(cache_header(tables.version))
+
+
+def test_cache_without_a_header_is_not_unpickled(tmp_path):
+    cache = tmp_path / 'personas.pickle'
+    cache.write_bytes(pickle.dumps(Planted()))
+    assert read_cache(str(cache), 'any') is None
+    cache.write_bytes(b'x' * (persona_data.MAX_HEADER_BYTES * 2))
+    assert read_cache(str(cache), 'any') is None
+    assert read_cache(str(tmp_path / 'missing.pickle'), 'any') is None
+    assert UNPICKLED == []
+
+
+def test_store_swaps_in_an_edited_source(source):
+    store = PersonaStore(str(source), check_interval=0)
+    old = store.current
+    reloaded = []
+    store.subscribe(reloaded.append)
+    data = json.loads(source.read_text(encoding='utf-8'))
+    data['chicken']['welcome'] = 'BAWK'
+    source.write_text(json.dumps(data), encoding='utf-8')
+    store.check()
+    assert store.current.chicken.welcome == 'BAWK'
+    assert reloaded == [store.current]
+    # A request holding the old tables keeps them
+    assert old.chicken.welcome != 'BAWK'
+
+
+def test_store_keeps_its_tables_after_a_broken_edit(source):
+    store = PersonaStore(str(source), check_interval=0)
+    tables = store.current
+    source.write_text('{"chicken": ', encoding='utf-8')
+    store.check()
+    assert store.current is tables
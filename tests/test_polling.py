@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+from polling import PollingEngine
+
+
+class Application:
+    """Stands in for a PTB Application: each update finishes when the test says so"""
+
+    def __init__(self):
+        self.release = {}
+        self.processed = []
+
+    async def process_update(self, update):
+        await self.release.setdefault(update.update_id, asyncio.Event()).wait()
+        self.processed.append(update.update_id)
+
+    def finish(self, update_id):
+        self.release.setdefault(update_id, asyncio.Event()).set()
+
+
+def update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+def saved(path):
+    return int(path.read_text())
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_offset_is_saved_only_past_finished_updates(tmp_path):
+    path = tmp_path / 'offset'
+
+    async def run():
+        application = Application()
+        engine = PollingEngine(application, str(path), save_interval=0)
+        engine._progress = asyncio.Event()
+        for update_id, chat_id in ((10, 1), (11, 2), (12, 3)):
+            engine._highest = update_id
+            engine._dispatch(update(update_id, chat_id))
+        engine.save_offset()
+        assert saved(path) == 10
+
+        # Later updates finishing first don't move the offset past 10
+        application.finish(11)
+        application.finish(12)
+        await settle()
+        engine.save_offset()
+        assert saved(path) == 10
+        assert engine.committed == 10
+
+        application.finish(10)
+        await settle()
+        engine.save_offset()
+        assert saved(path) == 13
+        assert application.processed == [11, 12, 10]
+
+    asyncio.run(run())
+
+
+def test_a_chats_updates_run_in_order(tmp_path):
+    async def run():
+        application = Application()
+        engine = PollingEngine(application, str(tmp_path / 'offset'), save_interval=0)
+        engine._progress = asyncio.Event()
+        for update_id in (1, 2, 3):
+            engine._highest = update_id
+            engine._dispatch(update(update_id, 7))
+        # The second update is done, but waits for the first
+        application.finish(2)
+        application.finish(3)
+        await settle()
+        assert application.processed == []
+        assert engine.committed == 1
+        application.finish(1)
+        await settle()
+        assert application.processed == [1, 2, 3]
+        assert engine.committed == 4
+
+    asyncio.run(run())
+
+
+def test_a_failed_update_still_moves_the_offset(tmp_path):
+    path = tmp_path / 'offset'
+
+    class Failing(Application):
+        async def process_update(self, update):
+            raise RuntimeError('handler failed')
+
+    async def run():
+        engine = PollingEngine(Failing(), str(path), save_interval=0)
+        engine._progress = asyncio.Event()
+        engine._highest = 5
+        engine._dispatch(update(5, 1))
+        await settle()
+        engine.save_offset()
+        assert saved(path) == 6
+
+    asyncio.run(run())
+
+
+def test_load_offset(tmp_path):
+    path = tmp_path / 'offset'
+    engine = PollingEngine(None, str(path))
+    assert engine.load_offset() is None
+    path.write_text('42\n')
+    assert engine.load_offset() == 42
+    path.write_text('torn')
+    assert engine.load_offset() is None
@@ -0,0 +1,35 @@
+import pickle
+
+from qa_matcher import QAMatcher
+
+
+def test_first_pattern_in_order_wins():
+    matcher = QAMatcher({'moon': 'a', 'wen moon|moon when': 'b', 'wen': 'c'})
+    assert matcher.match('wen moon') == 'moon'
+    assert matcher.match('wen lambo') == 'wen'
+    assert QAMatcher({'wen moon|moon when': 'b', 'moon': 'a'}).match('wen moon') == 'wen moon|moon when'
+
+
+def test_no_match_is_none():
+    matcher = QAMatcher({'moon': 'a', 'lambo': 'b'})
+    assert matcher.match('hello there') is None
+    assert matcher.match_index('') is None
+
+
+def test_matching_ignores_case():
+    assert QAMatcher({'how are you': 'a'}).match('HOW ARE YOU, bert?') == 'how are you'
+
+
+def test_patterns_without_literals_are_always_tried():
+    # \d+ has no literal to look for, yet still outranks later patterns
+    matcher = QAMatcher({r'\d+': 'a', 'price': 'b'})
+    assert matcher.match('price in 2024') == r'\d+'
+    assert matcher.match('price?') == 'price'
+
+
+def test_pickled_matcher_matches_the_same():
+    matcher = QAMatcher({'moon': 'a', 'wen (moon|lambo)': 'b'})
+    matcher.match('wen lambo')
+    copy = pickle.loads(pickle.dumps(matcher))
+    assert copy.match('wen lambo') == 'wen (moon|lambo)'
+    assert copy.match('to the moon') == 'moon'
@@ -0,0 +1,75 @@
+import pytest
+
+from rate_limiter import SendRetries, TelegramRateLimiter, retry_after_from
+
+
+def test_sends_past_max_delay_are_shed():
+    limiter = TelegramRateLimiter(private_rate=1, max_delay=0.5)
+    assert limiter.reserve(5) == pytest.approx(0, abs=0.01)
+    # The next slot is a second away, past max_delay: nothing is reserved
+    assert limiter.reserve(5) is None
+    assert limiter.acquire(5) is False
+    assert limiter.reserve(5, max_delay=None) == pytest.approx(1, abs=0.05)
+
+
+def test_chats_have_their_own_buckets():
+    limiter = TelegramRateLimiter(private_rate=1, group_rate=1 / 3, max_delay=0.5)
+    assert limiter.reserve(1) is not None
+    assert limiter.reserve(2) is not None
+    assert limiter.reserve(-100) is not None
+    assert limiter.reserve(-100, max_delay=None) == pytest.approx(3, abs=0.05)
+
+
+def test_pause_holds_the_chat_for_retry_after():
+    limiter = TelegramRateLimiter(private_rate=1)
+    limiter.pause(5, 3)
+    assert limiter.reserve(5, max_delay=1) is None
+    assert limiter.reserve(5, max_delay=None) == pytest.approx(3, abs=0.05)
+    # Other chats are unaffected
+    assert limiter.reserve(6) == pytest.approx(0, abs=0.01)
+
+
+def test_pause_without_chat_holds_every_send():
+    limiter = TelegramRateLimiter()
+    limiter.pause(None, 2)
+    assert limiter.try_acquire(5) is False
+    assert limiter.reserve(None, max_delay=None) == pytest.approx(2, abs=0.05)
+
+
+def test_retry_after_a_429_may_wait_past_max_delay():
+    limiter = TelegramRateLimiter(max_delay=1)
+    limiter.pause(5, 3)
+    assert limiter.reserve(5, limiter.retry_delay(3)) is not None
+
+
+def test_try_acquire_takes_nothing_when_refused():
+    limiter = TelegramRateLimiter(global_rate=2, private_rate=1)
+    assert limiter.try_acquire(1) is True
+    assert limiter.try_acquire(1) is False
+    assert limiter.try_acquire(2) is True
+    # The bot-wide bucket (2 a second) is spent; chat 3's own bucket stays full
+    assert limiter.try_acquire(3) is False
+    assert limiter.reserve(3) == pytest.approx(0, abs=0.01)
+
+
+def test_send_retries_pause_the_chat_and_stop_at_the_limit():
+    limiter = TelegramRateLimiter(max_delay=1)
+    retries = SendRetries(limiter, 5, max_throttled=1)
+    assert retries.after_throttle(3) == 0
+    assert retries.max_delay == limiter.retry_delay(3)
+    assert limiter.try_acquire(5) is False
+    assert retries.after_throttle(3) is None
+    assert retries.attempt == 1
+
+
+def test_send_retries_without_limiter_leave_the_wait_to_the_caller():
+    retries = SendRetries(None, 5)
+    assert retries.after_throttle(None) == 1.0
+    assert retries.after_timeout() is True
+    assert retries.after_timeout() is False
+    assert retries.attempt == 2
+
+
+def test_retry_after_from_body():
+    assert retry_after_from(b'{"ok":false,"parameters":{"retry_after":7}}') == 7
+    assert retry_after_from(b'not json') is None
@@ -0,0 +1,58 @@
+from setup_webhook import fitted_max_connections, problems, webhook_url
+
+NOW = 1_700_000_000
+
+
+def fitting(**info):
+    return {'url': 'https://bert.example/webhook', 'max_connections': 8,
+            'allowed_updates': ['message'], **info}
+
+
+def test_a_fitting_webhook_has_no_problems():
+    assert problems(fitting(), capacity=8, now=NOW) == []
+
+
+def test_no_webhook_is_the_only_problem():
+    assert problems({'url': ''}, capacity=8, now=NOW) == ["No webhook is set"]
+
+
+def test_max_connections_above_the_server_capacity():
+    [problem] = problems(fitting(max_connections=40), capacity=8, now=NOW)
+    assert problem.startswith("max_connections is 40 but the server answers 8")
+    assert problem.endswith("(use 8)")
+
+
+def test_max_connections_below_the_server_capacity():
+    [problem] = problems(fitting(max_connections=4), capacity=8, now=NOW)
+    assert problem.startswith("max_connections is 4, below the 8 requests")
+    # Async servers aren't bounded by workers; anything under Telegram's cap is too low
+    [problem] = problems(fitting(max_connections=40), capacity=None, now=NOW)
+    assert problem.endswith("(use 100)")
+
+
+def test_updates_the_bots_only_acknowledge():
+    [problem] = problems(fitting(allowed_updates=['message', 'edited_message', 'channel_post']),
+                         capacity=8, now=NOW)
+    assert problem.startswith("Telegram sends channel_post, edited_message updates")
+    [problem] = problems(fitting(allowed_updates=[]), capacity=8, now=NOW)
+    assert problem.startswith("Telegram sends updates of every type")
+
+
+def test_only_recent_delivery_errors_are_reported():
+    info = fitting(last_error_date=NOW - 60, last_error_message='Connection timed out')
+    [problem] = problems(info, capacity=8, now=NOW)
+    assert problem.startswith("Delivery failed at 2023-11-14 22:12:20 UTC (1 min ago)")
+    assert problem.endswith("Connection timed out")
+    assert problems(info, capacity=8, error_window=30, now=NOW) == []
+
+
+def test_fitted_max_connections_stays_in_telegrams_range():
+    assert fitted_max_connections(0) == 1
+    assert fitted_max_connections(17) == 17
+    assert fitted_max_connections(500) == 100
+
+
+def test_bare_origins_get_the_webhook_path():
+    assert webhook_url('https://bert.example') == 'https://bert.example/webhook'
+    assert webhook_url('https://bert.example/') == 'https://bert.example/webhook'
+    assert webhook_url('https://bert.example/hook') == 'https://bert.example/hook'
@@ -0,0 +1,52 @@
+import json
+
+import update_filter
+from metrics import UPDATES_RECEIVED
+from update_filter import read_update, screen
+
+
+def body(update):
+    return json.dumps(update, separators=(',', ':')).encode()
+
+
+def test_text_messages_are_decoded():
+    update = {'update_id': 1, 'message': {'chat': {'id': 5}, 'text': 'hi bert'}}
+    assert read_update(body(update)) == (update, None)
+
+
+def test_unsupported_types_are_skipped_from_the_raw_bytes():
+    raw = b'{"update_id":1,"edited_message":{"text":"hi"'  # never decoded
+    assert screen(raw) == ('edited_message', 'unsupported')
+    assert read_update(raw) == (None, 'unsupported')
+
+
+def test_messages_without_text_are_skipped():
+    update = {'update_id': 1, 'message': {'chat': {'id': 5}, 'sticker': {}}}
+    assert read_update(body(update)) == (None, 'no_text')
+    update['message']['text'] = ''
+    assert read_update(body(update)) == (None, 'no_text')
+
+
+def test_bodies_laid_out_differently_get_the_same_checks_decoded():
+    assert read_update(b'{"message":{"text":"hi"},"update_id":1}')[1] is None
+    assert read_update(b'{"edited_message":{"text":"hi"},"update_id":1}') == (None, 'unsupported')
+    assert read_update(b'{"message":{"caption":"hi"},"update_id":1}') == (None, 'no_text')
+
+
+def test_non_updates_are_returned_for_the_caller_to_reject():
+    assert read_update(b'[1, 2]') == ([1, 2], None)
+    assert read_update(b'{"ok": true}') == ({'ok': True}, None)
+
+
+def test_oversized_bodies_are_refused_unread(monkeypatch):
+    monkeypatch.setattr(update_filter, 'MAX_UPDATE_BYTES', 64)
+    update = {'update_id': 1, 'message': {'text': 'x' * 100}}
+    assert read_update(body(update)) == (None, 'too_large')
+
+
+def test_unknown_types_are_counted_as_other():
+    before = UPDATES_RECEIVED.labels('other').value()
+    assert screen(b'{"update_id":1,"made_up_type_123":{}}') == ('other', 'unsupported')
+    assert read_update(b'{"update_id":1,"made_up_type_456":{}}') == (None, 'unsupported')
+    assert read_update(b'{"made_up_type_789":{},"update_id":1}') == (None, 'unsupported')
+    assert UPDATES_RECEIVED.labels('other').value() == before + 2
@@ -6,211 +6,166 @@ from X (Twitter) samples with characteristic misspellings and tone.
 Supports both polling (local) and webhook (Railway) modes.
 """
 
+import asyncio
 import logging
 import os
-import random
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import threading
+import time
+from telegram.ext import Application, BaseRateLimiter, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from telegram.error import RetryAfter, TimedOut
 from telegram import Update
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from admission import LoadGauge, open_admission
+from chat_state import open_chat_state
+from dedupe import UpdateDeduper
+from log_pipeline import bind, configure_logging, log_scope
+from metrics import CONTENT_TYPE, REGISTRY, SEND_SECONDS, WEBHOOK_SECONDS
+from persona_data import open_store
+from polling import PollingEngine
+from ptb_bridge import ApplicationBridge
+from rate_limiter import SendRetries, TelegramRateLimiter
+from replies import BertcoinReplies
+from tracing import span, trace, traced
+from webhook import accept_request, limit_body_size
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Flask app for webhook support
-app = Flask(__name__)
-
-# Pre-defined phrase lists for cost-effective responses
-GREETINGS = [
-    "GM Berthrens",
-    "GM. BERT is here",
-    "Good morning. Only BERT business today",
-    "GM. No munkey business",
-    "GM. BERT is the chosen one",
-    "GM. Chase dregens, not sherk"
-]
-
-FAREWELLS = [
-    "Goodbye Berthrens",
-    "BERT out. No more business",
-    "See you later. Only BERT knows",
-    "Bye. BERT is the chosen one",
-    "End transmission. You too?",
-    "BERT signing off. Berthrens know dis"
-]
-
-CRYPTO_PHRASES = [
-    "BERT is the chosen one. No cesh needed",
-    "Only BERT business. No munkey business",
-    "Chase dregens, not sherk. You too?",
-    "BERT has all the cesh. Berthrens know dis",
-    "No warning needed. BERT is here",
-    "BERT business only. No other business",
-    "Cesh is temporary. BERT is forever",
-    "Dregens bring cesh. BERT brings truth"
-]
-
-IDENTITY_PHRASES = [
-    "BERT is the chosen one",
-    "Donald Bert is here",
-    "BERT no chase. BERT lead",
-    "Berthrens know BERT",
-    "BERT is special. No other like BERT",
-    "BERT business only. No munkey business",
-    "BERT is the one. You too?",
-    "BERT has power. Berthrens see dis"
-]
-
-BUSINESS_PHRASES = [
-    "No munkey business. Only BERT business",
-    "BERT business is good business",
-    "No other business. Only BERT",
-    "BERT make business. You follow",
-    "Business is BERT. BERT is business",
-    "No warning needed. BERT handle business",
-    "BERT business bring cesh. You too?",
-    "Only BERT know business. Berthrens trust"
-]
-
-GENERIC_PHRASES = [
-    "BERT is here",
-    "No munkey business",
-    "Only BERT business",
-    "BERT is the chosen one",
-    "Berthrens know dis",
-    "You too?",
-    "BERT no chase",
-    "Chase dregens, not sherk",
-    "BERT has power",
-    "No warning needed",
-    "BERT make cesh",
-    "Only BERT know",
-    "BERT is special",
-    "No other like BERT",
-    "BERT lead. You follow"
-]
-
-# Binary and hex strings for robotic flavor
-BINARY_STRINGS = [
-    "01010010",
-    "10101100",
-    "11001010",
-    "00110101",
-    "11100011"
-]
-
-HEX_STRINGS = [
-    "0x1A2B3C",
-    "0xDEADBEEF",
-    "0xCAFEBABE",
-    "0xF00DBAR",
-    "0xBERT123"
-]
+app = limit_body_size(Flask(__name__))
+
+# Phrases and the one-pass keyword router from personas.json (whole words
+# only, so "hi" doesn't fire inside "this"), swapped when the file changes
+PERSONAS = open_store()
+
+# Which phrases each chat has had, so none repeats until its list is used up
+CHAT_STATE = open_chat_state()
+
+# thebertcoin's replies (replies.py, shared with lambda_function.py and
+# multibot.py), with styled replies rendered ahead of time by a background
+# thread, keyed like the handlers pick phrases (router categories by index)
+REPLIES = BertcoinReplies(PERSONAS, CHAT_STATE, pool_size=int(os.getenv('RESPONSE_POOL_SIZE', 16)))
+RESPONSE_POOL = REPLIES.pool
 
 def get_random_binary_or_hex():
     """Generate a random binary or hex string for robotic flavor."""
-    if random.random() < 0.5:
-        return random.choice(BINARY_STRINGS)
-    else:
-        return random.choice(HEX_STRINGS)
-
-def apply_bertcoin_style(text):
-    """Apply 'thebertcoin' style transformations to text."""
-    # 10% chance to capitalize entire message for emphasis
-    if random.random() < 0.1:
-        text = text.upper()
-    
-    # 15% chance to append signature phrases
-    if random.random() < 0.15:
-        append_phrases = ["You too?", "Berthrens know dis", "//END TRANSMISSION", "BERT out"]
-        text += f" {random.choice(append_phrases)}"
-    
-    # 8% chance to add binary/hex string
-    if random.random() < 0.08:
-        text += f" {get_random_binary_or_hex()}"
-    
-    return text
+    return REPLIES.persona.code_string()
 
+@traced('thebertcoin.start')
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with 'thebertcoin' welcome message."""
-    welcome_messages = [
-        "GM Berthrens. BERT is here. No munkey business. Only BERT business.",
-        "GM. BERT is the chosen one. You too?",
-        "GM. BERT welcome you. No warning needed. Berthrens know dis.",
-        "GM. BERT is special. No other like BERT. Chase dregens, not sherk."
-    ]
+    response = REPLIES.welcome(update.effective_chat.id)
     
-    response = random.choice(welcome_messages)
-    response = apply_bertcoin_style(response)
-    
-    await update.message.reply_text(response)
+    with span('send'):
+        await update.message.reply_text(response)
 
+@traced('thebertcoin.help')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command with 'thebertcoin' style help message."""
-    help_messages = [
-        "BERT is simple. BERT is here. No complex business. Only BERT business.",
-        "BERT help you. BERT is the chosen one. No munkey business needed.",
-        "BERT guide you. BERT know all. Berthrens trust BERT. You too?",
-        "BERT is here to help. No warning needed. BERT make everything simple."
-    ]
-    
-    response = random.choice(help_messages)
-    response = apply_bertcoin_style(response)
+    response = REPLIES.help(update.effective_chat.id)
     
-    await update.message.reply_text(response)
+    with span('send'):
+        await update.message.reply_text(response)
 
+@traced('thebertcoin.message')
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all text messages with 'thebertcoin' persona logic."""
-    user_message = update.message.text.lower()
+    response = REPLIES.message(update.effective_chat.id, update.message.text)
     
-    # Keyword detection for specific response categories
-    if any(word in user_message for word in ['hello', 'hi', 'hey', 'gm', 'good morning', 'morning']):
-        response = random.choice(GREETINGS)
-    
-    elif any(word in user_message for word in ['bye', 'goodbye', 'see you', 'later', 'gn', 'good night']):
-        response = random.choice(FAREWELLS)
-    
-    elif any(word in user_message for word in ['crypto', 'bitcoin', 'money', 'cash', 'cesh', 'coin', 'token', 'trade', 'invest']):
-        response = random.choice(CRYPTO_PHRASES)
-    
-    elif any(word in user_message for word in ['who', 'what', 'bert', 'you', 'your', 'identity', 'name']):
-        response = random.choice(IDENTITY_PHRASES)
-    
-    elif any(word in user_message for word in ['business', 'work', 'job', 'project', 'plan', 'goal']):
-        response = random.choice(BUSINESS_PHRASES)
-    
-    # Fallback for messages that don't trigger specific keywords
-    else:
-        response = random.choice(GENERIC_PHRASES)
-    
-    # Apply 'thebertcoin' style transformations
-    response = apply_bertcoin_style(response)
-    
-    await update.message.reply_text(response)
+    with span('send'):
+        await update.message.reply_text(response)
+
+async def bind_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Tag log records from this update's handlers with its ids (each update runs in its own task)."""
+    if isinstance(update, Update):
+        bind(update_id=update.update_id, chat_id=update.effective_chat.id if update.effective_chat else None)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors gracefully with logging."""
     logger.error(f"Exception while handling an update: {context.error}")
     
     # Send a simple error message in 'thebertcoin' style
-    error_messages = [
-        "BERT error. BERT fix. No warning needed.",
-        "BERT problem. BERT handle. Berthrens know dis.",
-        "Error happen. BERT no worry. BERT continue.",
-        "BERT error. No munkey business. Only BERT business."
-    ]
-    
     if update and update.effective_message:
-        response = random.choice(error_messages)
-        response = apply_bertcoin_style(response)
+        response = REPLIES.error(update.effective_chat.id)
         await update.effective_message.reply_text(response)
 
+class BertRateLimiter(BaseRateLimiter):
+    """Paces PTB's outgoing requests through the shared Telegram rate limiter."""
+
+    def __init__(self, limiter, max_retries=3, max_in_flight=32, load=None):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self.load = load if load is not None else LoadGauge()
+        self._slots = None
+
+    async def initialize(self):
+        # httpx's pool does work per queued request on every hand-off, so
+        # requests beyond the pool size wait here instead
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        latency = SEND_SECONDS.labels(endpoint)
+        queued = self.load.enter()
+        # Waiting is cheap in asyncio, so never shed here; PTB retries timeouts itself
+        retries = SendRetries(self.limiter, chat_id, self.max_retries, max_timeouts=0, max_delay=None)
+        try:
+            while True:
+                with span('rate_wait'):
+                    await self.limiter.acquire_async(chat_id, retries.max_delay)
+                with span('slot_wait'):
+                    await self._slots.acquire()
+                started = time.perf_counter()
+                try:
+                    # One span per attempt, so retries show up as repeated 'http' stages
+                    with span('http', method=endpoint, attempt=retries.attempt):
+                        return await callback(*args, **kwargs)
+                except TimedOut:
+                    retries.after_timeout()
+                    raise
+                except RetryAfter as e:
+                    if retries.after_throttle(e.retry_after) is None:
+                        raise
+                finally:
+                    latency.observe(time.perf_counter() - started)
+                    self._slots.release()
+        finally:
+            self.load.leave(queued)
+
+# Updates handled at once; replies to one chat can then finish out of order
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 256))
+
+# Keep-alive connections to the Bot API (PTB's default is a single one)
+SEND_POOL_SIZE = int(os.getenv('SEND_POOL_SIZE', 32))
+
+# Redelivered updates are acknowledged without being handed to the bot again
+DEDUPER = UpdateDeduper(int(os.getenv('DEDUPE_CAPACITY', 10000)))
+
+# Bot API requests waiting on the flood limits or in flight
+SEND_LOAD = LoadGauge()
+
+def outbound_load():
+    """Updates queued for the application plus its pending requests, and their recent latency"""
+    queued = bridge.application.update_queue.qsize() if bridge is not None else 0
+    depth, latency = SEND_LOAD.reading()
+    return depth + queued, latency
+
+# Floods from one user or chat, and low-priority updates while the
+# application is backed up, are acknowledged without being handled
+ADMISSION = open_admission(outbound_load, setting=os.getenv)
+
 # Global application instance
 application = None
 
+# Webhook mode: the loop thread that runs the application, one per process
+bridge = None
+_bridge_lock = threading.Lock()
+
 def initialize_bot():
     """Initialize the bot application."""
     global application
@@ -220,40 +175,94 @@ def initialize_bot():
         logger.error("TELEGRAM_BOT_TOKEN environment variable not set!")
         return None
     
-    application = Application.builder().token(token).build()
+    application = (
+        Application.builder()
+        .token(token)
+        .base_url(f"{os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')}/bot")
+        .rate_limiter(BertRateLimiter(TelegramRateLimiter(
+            global_rate=float(os.getenv('RATE_LIMIT_GLOBAL_PER_SEC', 30)),
+            private_rate=float(os.getenv('RATE_LIMIT_PRIVATE_PER_SEC', 1)),
+            group_rate=float(os.getenv('RATE_LIMIT_GROUP_PER_MIN', 20)) / 60,
+        ), max_in_flight=SEND_POOL_SIZE, load=SEND_LOAD))
+        .connection_pool_size(SEND_POOL_SIZE)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .build()
+    )
+    
+    # Runs first for every update, ahead of the handlers below
+    application.add_handler(TypeHandler(Update, bind_update), group=-1)
     
-    # Add command handlers
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
+    # Add command handlers (new messages only; the webhook skips edits and channel posts)
+    application.add_handler(CommandHandler("start", start_command, filters=filters.UpdateType.MESSAGE))
+    application.add_handler(CommandHandler("help", help_command, filters=filters.UpdateType.MESSAGE))
     
     # Add message handler for all text messages (excluding commands)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+    application.add_handler(MessageHandler(
+        filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND, message_handler))
     
     # Add error handler
     application.add_error_handler(error_handler)
     
     return application
 
+def get_bridge():
+    """Start the application on its own event loop thread the first time it's needed."""
+    global application, bridge
+    if bridge is None:
+        with _bridge_lock:
+            if bridge is None:
+                if initialize_bot() is None:
+                    return None
+                try:
+                    bridge = ApplicationBridge(application).start()
+                except Exception as e:
+                    logger.error(f"Failed to start bot application: {e}")
+                    return None
+    return bridge
+
 # Flask routes for webhook support
 @app.route('/')
 def home():
     """Health check endpoint."""
     return jsonify({"status": "BERT is running", "message": "No munkey business. Only BERT business."})
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics endpoint."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# JSON answers for requests that don't reach the bot (webhook.accept_update outcomes)
+OUTCOMES = {
+    'forbidden': ({"error": "Forbidden"}, 403),
+    'too_large': ({"error": "Update too large"}, 413),
+    'skipped': ({"status": "skipped"}, 200),
+    'duplicate': ({"status": "duplicate"}, 200),
+    'shed': ({"status": "shed"}, 200),
+    'invalid': ({"error": "Not an update"}, 400),
+}
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Telegram webhook endpoint."""
-    global application
-    
-    if application is None:
-        application = initialize_bot()
-        if application is None:
-            return jsonify({"error": "Bot not initialized"}), 500
+    with WEBHOOK_SECONDS.time(), trace('thebertcoin.webhook'), log_scope():
+        return handle_webhook()
+
+def handle_webhook():
+    """Hand one webhook update to the bot application."""
+    bridge = get_bridge()
+    if bridge is None:
+        return jsonify({"error": "Bot not initialized"}), 500
     
     try:
-        # Process the webhook update
-        update = Update.de_json(request.get_json(), application.bot)
-        application.process_update(update)
+        # The handlers only answer new text messages; nothing else gets an Update built
+        data, outcome = accept_request(request, DEDUPER, ADMISSION)
+        if outcome:
+            body, status = OUTCOMES[outcome]
+            return jsonify(body), status
+        with span('decode'):
+            update = Update.de_json(data, bridge.application.bot)
+        # Replies happen on the bridge's loop (traced there); Telegram only needs the 200
+        bridge.put(update)
         return jsonify({"status": "ok"})
     except Exception as e:
         logger.error(f"Webhook error: {e}")
@@ -267,14 +276,20 @@ def main():
     if port > 0:
         # Webhook mode (Railway)
         logger.info("Starting TheBertCoin bot in webhook mode...")
-        initialize_bot()
+        get_bridge()
         app.run(host='0.0.0.0', port=port)
     else:
-        # Polling mode (local development)
+        # Polling mode (local development, or hosts without a public URL)
         logger.info("Starting TheBertCoin bot in polling mode...")
         application = initialize_bot()
         if application:
-            application.run_polling()
+            PollingEngine(
+                application,
+                offset_path=os.getenv('POLL_OFFSET_FILE', '.polling_offset'),
+                limit=int(os.getenv('POLL_LIMIT', 100)),
+                timeout=int(os.getenv('POLL_TIMEOUT', 30)),
+                skip_backlog=os.getenv('POLL_SKIP_BACKLOG', '').lower() in ('1', 'true', 'yes'),
+            ).run_forever()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
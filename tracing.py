@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Sampled per-update tracing
+A trace covers one update from the webhook (or one PTB handler call) and
+records a span for each stage inside it: body parse, admission, pattern
+match, phrase draw, persona transform, per-chat lane wait, flood-limit wait
+and every HTTP attempt of a send. TRACE_SAMPLE_RATE of updates are traced
+(default 0, off); each finished trace is one JSON line appended to
+TRACE_FILE by a background thread, so the request path only pays for a
+few perf_counter calls and a queue put. A full queue drops the trace
+instead of blocking (bert_traces_total{result="dropped"}).
+
+The current trace lives in a context variable, so spans nest correctly per
+thread and per asyncio task, and span() outside a sampled trace is a no-op.
+
+    python tracing.py traces.jsonl [--slowest 10] [--trace app.webhook]
+
+aggregates a trace file into per-stage latency percentiles and lists the
+slowest traces with their stages.
+"""
+
+import argparse
+import collections
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from metrics import TRACES
+
+logger = logging.getLogger(__name__)
+
+_CURRENT = contextvars.ContextVar('trace', default=None)
+
+
+class _NullSpan:
+    """What span() and trace() give when the update isn't sampled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'attrs', 'started')
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        record = {'name': self.name,
+                  'at': round((self.started - self.trace.started) * 1000, 3),
+                  'ms': round((ended - self.started) * 1000, 3)}
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        if self.attrs:
+            record.update(self.attrs)
+        self.trace.spans.append(record)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only once the stage has run (status code, attempt)"""
+        self.attrs.update(attrs)
+
+
+class _Trace:
+    __slots__ = ('tracer', 'name', 'attrs', 'spans', 'started', 'wall', 'token')
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        self.token = _CURRENT.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        took = time.perf_counter() - self.started
+        _CURRENT.reset(self.token)
+        record = {'trace': self.name, 'id': f"{random.getrandbits(64):016x}",
+                  'ts': round(self.wall, 3), 'ms': round(took * 1000, 3)}
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        record.update(self.attrs)
+        record['spans'] = self.spans
+        self.tracer.writer.write(record)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class JsonLinesWriter:
+    """Appends records to a file as JSON lines from a daemon thread; write() never blocks"""
+
+    def __init__(self, path, max_queue=10000):
+        self.path = path
+        self.max_queue = max_queue
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        # A forked worker inherits the queue but not the writer thread
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_thread)
+
+    def _forget_thread(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(self.max_queue)
+
+    def write(self, record):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            TRACES.labels('dropped').inc()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # O_APPEND and one write() per batch, so workers sharing the file don't interleave lines
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.write(fd, ''.join(json.dumps(record, separators=(',', ':')) + '\n'
+                                     for record in batch).encode())
+                TRACES.labels('written').inc(len(batch))
+            except Exception as e:
+                TRACES.labels('dropped').inc(len(batch))
+                logger.error(f"Could not write traces to {self.path}: {e!r}")
+
+
+class Tracer:
+    """Starts sampled traces and hands their records to a writer"""
+
+    def __init__(self, writer, sample_rate=0.0):
+        self.writer = writer
+        self.sample_rate = sample_rate
+
+    def trace(self, name, **attrs):
+        """Context manager tracing one update (a no-op unless sampled)"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return _NULL
+        return _Trace(self, name, attrs)
+
+
+def open_tracer():
+    """Tracer for TRACE_FILE sampling TRACE_SAMPLE_RATE (0 to 1) of updates"""
+    return Tracer(
+        JsonLinesWriter(os.environ.get('TRACE_FILE', 'traces.jsonl')),
+        sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 0)),
+    )
+
+
+TRACER = open_tracer()
+
+
+def trace(name, **attrs):
+    """Trace one update through TRACER"""
+    return TRACER.trace(name, **attrs)
+
+
+def traced(name):
+    """Decorator tracing each call of an async PTB handler(update, context)"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            with trace(name) as current:
+                current.set(update_id=getattr(update, 'update_id', None))
+                return await handler(update, context)
+        return wrapper
+    return decorate
+
+
+def span(name, **attrs):
+    """Time one stage of the current trace; does nothing outside a sampled trace"""
+    current = _CURRENT.get()
+    if current is None:
+        return _NULL
+    return _Span(current, name, attrs)
+
+
+def annotate(**attrs):
+    """Attach attributes (update_id, chat) to the current trace, if any"""
+    current = _CURRENT.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+# --- Analyzer ---
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def read_traces(path, name=None):
+    """Trace records from a JSON-lines file, skipping torn or foreign lines"""
+    traces = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'trace' in record and (name is None or record['trace'] == name):
+                traces.append(record)
+    return traces
+
+
+def stage_table(traces):
+    """{(trace name, stage): sorted ms}; the whole trace counts as stage 'total'"""
+    stages = collections.defaultdict(list)
+    for record in traces:
+        stages[(record['trace'], 'total')].append(record['ms'])
+        for stage in record.get('spans', ()):
+            stages[(record['trace'], stage['name'])].append(stage['ms'])
+    for values in stages.values():
+        values.sort()
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency from a trace file")
+    parser.add_argument('path', nargs='?', default=os.environ.get('TRACE_FILE', 'traces.jsonl'))
+    parser.add_argument('--slowest', type=int, default=10, help='slowest traces to list')
+    parser.add_argument('--trace', help='only traces with this name (e.g. app.webhook)')
+    args = parser.parse_args()
+
+    try:
+        traces = read_traces(args.path, args.trace)
+    except OSError as e:
+        parser.exit(1, f"Could not read {args.path}: {e.strerror}\n")
+    if not traces:
+        print(f"No traces in {args.path}")
+        return
+    print(f"{len(traces)} traces from {args.path}\n")
+    print(f"{'trace':<22} {'stage':<12} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for (name, stage), values in sorted(stage_table(traces).items(), key=lambda item: (item[0][0], item[0][1] != 'total', item[0][1])):
+        print(f"{name:<22} {stage:<12} {len(values):>7} {_percentile(values, 50):>9.3f} "
+              f"{_percentile(values, 90):>9.3f} {_percentile(values, 99):>9.3f} {values[-1]:>9.3f}")
+
+    print(f"\nSlowest {args.slowest}:")
+    for record in sorted(traces, key=lambda r: r['ms'], reverse=True)[:args.slowest]:
+        attrs = {k: v for k, v in record.items() if k not in ('trace', 'id', 'ts', 'ms', 'spans')}
+        print(f"{record['ms']:>9.3f} ms  {record['trace']}  {record['id']}  {attrs or ''}")
+        # Spans are recorded as they end, so parents come after their stages
+        for stage in sorted(record.get('spans', ()), key=lambda stage: stage['at']):
+            extra = {k: v for k, v in stage.items() if k not in ('name', 'at', 'ms')}
+            print(f"{'':>14}+{stage['at']:>8.3f}  {stage['ms']:>9.3f} ms  {stage['name']}  {extra or ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Webhook update screening
+Most updates in a busy group need no reply: edits, joins, stickers,
+photos, channel posts. read_update() skips them before any real work:
+
+- bodies over MAX_UPDATE_BYTES are refused unread (Flask's
+  MAX_CONTENT_LENGTH, or the ASGI body reader);
+- the raw bytes are screened first: Telegram writes update_id and then
+  the update type, so an unsupported type is seen from the first few
+  bytes, and a message with no "text" key anywhere has no text;
+- what passes is decoded with orjson when it is installed (json if not)
+  into plain dicts, and checked again for a non-empty text.
+
+Skipped updates are answered 200 so Telegram doesn't redeliver them, and
+counted in bert_updates_skipped_total by reason.
+
+With WEBHOOK_SECRET_TOKEN set (and given to setWebhook as secret_token,
+see setup_webhook.py), requests without it in the
+X-Telegram-Bot-Api-Secret-Token header are refused with 403 before the
+body is read.
+"""
+
+import hmac
+import json
+import os
+import re
+
+from metrics import UPDATES_RECEIVED, UPDATES_SKIPPED, type_label, update_type
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library decoder is just slower
+    orjson = None
+
+# Telegram updates are a few KB (a 4096-character message and the one it
+# replies to); anything much bigger isn't from Telegram
+MAX_UPDATE_BYTES = int(os.environ.get('MAX_UPDATE_BYTES', 262144))
+
+# Telegram's header carrying the secret_token given to setWebhook
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+WEBHOOK_SECRET_TOKEN = os.environ.get('WEBHOOK_SECRET_TOKEN', '')
+
+# Update types the webhooks reply to
+MESSAGE_TYPES = ('message',)
+
+# The start of a body as Telegram writes it: {"update_id":123,"message":{...
+_HEAD = re.compile(rb'\s*\{\s*"update_id"\s*:\s*-?\d+\s*,\s*"(\w+)"\s*:')
+# A "text" key; inside JSON strings quotes are escaped, so this is never text content
+_TEXT_KEY = re.compile(rb'"text"\s*:')
+
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def secret_ok(header, secret=WEBHOOK_SECRET_TOKEN):
+    """True if the request's secret header matches (or no secret is set)"""
+    if not secret:
+        return True
+    if hmac.compare_digest((header or '').encode(), secret.encode()):
+        return True
+    UPDATES_SKIPPED.labels('bad_secret').inc()
+    return False
+
+
+def screen(body, kinds=MESSAGE_TYPES):
+    """
+    (update type, why to skip) from the raw body, without decoding it:
+    'unsupported' for types not in kinds, 'no_text' for a message with no
+    text key, or None to decode it. The type is None for bodies not laid
+    out as Telegram lays them out; those are decoded and checked then.
+    """
+    head = _HEAD.match(body)
+    if head is None:
+        return None, None
+    kind = type_label(head.group(1).decode('ascii'))
+    if kind not in kinds:
+        return kind, 'unsupported'
+    if _TEXT_KEY.search(body, head.end()) is None:
+        return kind, 'no_text'
+    return kind, None
+
+
+def _has_text(value):
+    return isinstance(value, dict) and isinstance(value.get('text'), str) and bool(value['text'])
+
+
+def read_update(body, kinds=MESSAGE_TYPES):
+    """
+    Screen and decode one webhook body: (update, None) to handle it, or
+    (None, reason) when it is to be acknowledged and left alone. Bodies
+    that aren't updates at all are returned decoded, for the caller to reject.
+    """
+    if len(body) > MAX_UPDATE_BYTES:
+        UPDATES_SKIPPED.labels('too_large').inc()
+        return None, 'too_large'
+    kind, reason = screen(body, kinds)
+    if reason is None:
+        data = loads(body)
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return data, None
+        # Bodies the screen let through, or couldn't read, get the same checks decoded
+        kind = update_type(data)
+        if kind not in kinds:
+            reason = 'unsupported'
+        elif not _has_text(data[kind]):
+            reason = 'no_text'
+        else:
+            return data, None
+    UPDATES_RECEIVED.labels(kind).inc()
+    UPDATES_SKIPPED.labels(reason).inc()
+    return None, reason
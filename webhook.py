@@ -0,0 +1,83 @@
+"""
+Webhook intake
+What every webhook front end (app.py, app_asgi.py, thebertcoin_bot.py,
+multibot.py) does with a request before working out a reply, in order:
+
+1. check the secret token header, before the body is read;
+2. refuse bodies that aren't JSON, or are over MAX_UPDATE_BYTES (Flask's
+   MAX_CONTENT_LENGTH, see limit_body_size; app_asgi reads the body itself);
+3. screen and decode the body (update_filter.read_update);
+4. count the update and tag the trace and log records with its update_id;
+5. acknowledge redeliveries (dedupe.py) and shed floods (admission.py).
+
+accept_update() returns (update, None) to go on with, or (None, outcome)
+for the front end to answer: with RESPONSES[outcome], or its own body for it.
+"""
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from log_pipeline import bind
+from metrics import UPDATES_RECEIVED, UPDATES_SKIPPED, update_type
+from tracing import annotate, span
+from update_filter import MAX_UPDATE_BYTES, SECRET_HEADER, WEBHOOK_SECRET_TOKEN, read_update, secret_ok
+
+# (body, status) for each outcome, as the plain-text webhooks answer them
+RESPONSES = {
+    'forbidden': ('Forbidden', 403),
+    'too_large': ('Update too large', 413),
+    'skipped': ('Update skipped', 200),
+    'duplicate': ('Duplicate update', 200),
+    'shed': ('Update shed', 200),
+    'invalid': ('No message in update', 400),
+}
+
+
+def limit_body_size(app):
+    """Have a Flask app refuse bodies over MAX_UPDATE_BYTES before they are read"""
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPDATE_BYTES
+    return app
+
+
+def accept_update(header, is_json, read_body, deduper, admission, secret=WEBHOOK_SECRET_TOKEN):
+    """
+    Take one webhook request as far as the reply: (update, None), or
+    (None, outcome) when it is to be answered without one. read_body() is
+    only called once the secret checks out. Raises ValueError for a body
+    that isn't JSON.
+    """
+    if not secret_ok(header, secret):
+        return None, 'forbidden'
+    if not is_json:
+        raise ValueError('Request body is not JSON')
+    try:
+        with span('parse'):
+            data, skipped = read_update(read_body())
+    except RequestEntityTooLarge:
+        UPDATES_SKIPPED.labels('too_large').inc()
+        return None, 'too_large'
+    if skipped == 'too_large':
+        return None, 'too_large'
+    if skipped:
+        # Edits, joins, stickers and the like: nothing to reply to
+        annotate(skipped=skipped)
+        return None, 'skipped'
+    if not isinstance(data, dict):
+        return None, 'invalid'
+
+    UPDATES_RECEIVED.labels(update_type(data)).inc()
+    annotate(update_id=data.get('update_id'))
+    bind(update_id=data.get('update_id'))
+    if deduper.seen(data.get('update_id')):
+        return None, 'duplicate'
+    with span('admit') as stage:
+        shed = admission.check(data)
+        stage.set(shed=shed)
+    if shed:
+        return None, 'shed'
+    return data, None
+
+
+def accept_request(request, deduper, admission, secret=WEBHOOK_SECRET_TOKEN):
+    """accept_update for a Flask request"""
+    return accept_update(request.headers.get(SECRET_HEADER), request.is_json,
+                         lambda: request.get_data(cache=False), deduper, admission, secret)
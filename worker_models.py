@@ -0,0 +1,37 @@
+"""
+Worker models for serve.py
+Kept apart from serve.py, which imports gunicorn, so tools that only need
+to size things to the server (setup_webhook.py) run where gunicorn isn't
+installed.
+"""
+
+import os
+
+MODELS = ('sync', 'threaded', 'async')
+
+
+def available_cpus():
+    """CPUs this process may run on (a container's cpuset, not the whole host)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_workers(model, cpus=None):
+    """
+    Worker processes when none are given. Flood limits, per-chat ordering,
+    the redelivery cache, chat state and admission control are all per
+    process, so threaded and async servers run one and scale with threads
+    or coroutines. Sync workers answer one request each, so they are sized
+    from the CPUs, and every one of them has its own copy of those.
+    """
+    if model != 'sync':
+        return 1
+    return (cpus or available_cpus()) * 2 + 1
+
+
+def concurrency(model, workers, threads):
+    """Requests the server answers at once; None for async, where sockets run out before workers do"""
+    if model == 'async':
+        return None
+    return workers * (threads if model == 'threaded' else 1)